@@ -1,7 +1,33 @@
 #!/usr/bin/env python3
-"""Async programming benchmark for game servers."""
+"""Async programming benchmark for game servers.
+
+Runs real loopback traffic through the event loop while a probe task
+measures how late the loop wakes it (event-loop lag):
+
+    task overhead - create_task + await, and task-to-task switches
+    TCP echo      - N concurrent sessions doing framed request/response
+    UDP echo      - N concurrent sessions over one server socket
+
+Concurrency ramps through the given levels; each level reports round-trip
+p50/p99 and loop lag. With uvloop installed the suite runs on both loops.
+
+Usage:
+    python async_benchmark.py --levels 10 100 1000 --requests 50
+"""
+import argparse
 import asyncio
+import resource
+import socket
+import struct
 import time
+from typing import Callable, Dict, List
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+FRAME = struct.Struct("!I")  # TCP: payload length prefix; UDP: request id, echoed back
 
 async def handle_player(player_id: int):
     """Simulate player connection handling."""
@@ -9,14 +35,248 @@ async def handle_player(player_id: int):
     return f"Player {player_id} processed"
 
 async def benchmark(num_players: int = 1000):
-    """Benchmark async player handling."""
-    start = time.time()
+    """Benchmark async player handling (sleep-only baseline)."""
+    start = time.perf_counter()
     tasks = [handle_player(i) for i in range(num_players)]
     results = await asyncio.gather(*tasks)
-    elapsed = time.time() - start
+    elapsed = time.perf_counter() - start
     print(f"Processed {num_players} players in {elapsed:.3f}s")
     print(f"Throughput: {num_players/elapsed:.0f} players/sec")
     return results
 
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+def raise_fd_limit(wanted: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+class LagProbe:
+    """Task that sleeps `interval` repeatedly and records how late each wakeup is."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {'lag_p50_ms': percentile(self.samples, 50) * 1000,
+                'lag_p99_ms': percentile(self.samples, 99) * 1000,
+                'lag_max_ms': max(self.samples, default=0.0) * 1000}
+
+# ----- Task overhead -----
+
+async def bench_task_overhead(count: int = 100000) -> Dict[str, float]:
+    """ns per create_task+await, per gather'd coroutine, and per task switch."""
+    async def noop():
+        return None
+
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        await asyncio.create_task(noop())
+    create_ns = (time.perf_counter_ns() - start) / count
+
+    start = time.perf_counter_ns()
+    await asyncio.gather(*(noop() for _ in range(count)))
+    gather_ns = (time.perf_counter_ns() - start) / count
+
+    async def yielder(n):
+        for _ in range(n):
+            await asyncio.sleep(0)
+
+    switches = count // 2
+    start = time.perf_counter_ns()
+    await asyncio.gather(yielder(switches), yielder(switches))
+    switch_ns = (time.perf_counter_ns() - start) / (switches * 2)
+    return {'create_await_ns': create_ns, 'gather_ns': gather_ns, 'switch_ns': switch_ns}
+
+# ----- TCP echo -----
+
+async def _tcp_echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            header = await reader.readexactly(4)
+            (size,) = FRAME.unpack(header)
+            writer.write(header + await reader.readexactly(size))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def _tcp_session(port: int, requests: int, payload: bytes, think: float, rtts: List[float]):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    frame = FRAME.pack(len(payload)) + payload
+    clock = time.perf_counter
+    try:
+        for _ in range(requests):
+            start = clock()
+            writer.write(frame)
+            await reader.readexactly(len(frame))
+            rtts.append(clock() - start)
+            if think:
+                await asyncio.sleep(think)
+    finally:
+        writer.close()
+
+async def bench_tcp_echo(concurrency: int, requests: int, payload_size: int, think: float) -> Dict[str, float]:
+    server = await asyncio.start_server(_tcp_echo, '127.0.0.1', 0, backlog=4096)
+    port = server.sockets[0].getsockname()[1]
+    payload = b'x' * payload_size
+    rtts: List[float] = []
+    probe = LagProbe()
+    probe.start()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_tcp_session(port, requests, payload, think, rtts)
+                                     for _ in range(concurrency)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    lag = await probe.stop()
+    server.close()
+    await server.wait_closed()
+    return _summary(rtts, elapsed, lag, errors=sum(isinstance(r, Exception) for r in results))
+
+# ----- UDP echo -----
+
+class _UdpEcho(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+class _UdpClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiting: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data, addr):
+        future = self.waiting.pop(FRAME.unpack_from(data)[0], None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+async def _udp_session(port: int, requests: int, payload: bytes, think: float, timeout: float,
+                       rtts: List[float], stats: dict):
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(_UdpClient, remote_addr=('127.0.0.1', port))
+    clock = time.perf_counter
+    try:
+        for seq in range(requests):
+            future = loop.create_future()
+            client.waiting[seq] = future
+            start = clock()
+            transport.sendto(FRAME.pack(seq) + payload)
+            try:
+                await asyncio.wait_for(future, timeout)
+                rtts.append(clock() - start)
+            except asyncio.TimeoutError:
+                client.waiting.pop(seq, None)
+                stats['lost'] += 1
+            if think:
+                await asyncio.sleep(think)
+    finally:
+        transport.close()
+
+async def bench_udp_echo(concurrency: int, requests: int, payload_size: int, think: float,
+                         timeout: float = 0.5) -> Dict[str, float]:
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+    sock.bind(('127.0.0.1', 0))
+    transport, _ = await loop.create_datagram_endpoint(_UdpEcho, sock=sock)
+    port = sock.getsockname()[1]
+    payload = b'x' * payload_size
+    rtts: List[float] = []
+    stats = {'lost': 0}
+    probe = LagProbe()
+    probe.start()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_udp_session(port, requests, payload, think, timeout, rtts, stats)
+                                     for _ in range(concurrency)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    lag = await probe.stop()
+    transport.close()
+    summary = _summary(rtts, elapsed, lag, errors=sum(isinstance(r, Exception) for r in results))
+    summary['lost'] = stats['lost']
+    return summary
+
+def _summary(rtts: List[float], elapsed: float, lag: Dict[str, float], errors: int) -> Dict[str, float]:
+    summary = {
+        'requests': len(rtts),
+        'req_per_sec': len(rtts) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(rtts, 50) * 1000,
+        'p99_ms': percentile(rtts, 99) * 1000,
+        'errors': errors,
+    }
+    summary.update(lag)
+    return summary
+
+# ----- Driver -----
+
+async def run_suite(levels: List[int], requests: int, payload: int, think: float) -> dict:
+    report = {'overhead': await bench_task_overhead(), 'tcp': {}, 'udp': {}}
+    for level in levels:
+        report['tcp'][level] = await bench_tcp_echo(level, requests, payload, think)
+        report['udp'][level] = await bench_udp_echo(level, requests, payload, think)
+    return report
+
+def run_on_loop(factory: Callable[[], asyncio.AbstractEventLoop], coro):
+    loop = factory()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def print_report(name: str, report: dict):
+    o = report['overhead']
+    print("\n" + "=" * 86)
+    print(f"EVENT LOOP: {name}")
+    print("=" * 86)
+    print(f"create_task+await {o['create_await_ns']:7.0f} ns | gather {o['gather_ns']:7.0f} ns/coro | "
+          f"task switch {o['switch_ns']:7.0f} ns")
+    print(f"{'Proto':5} {'Conc':>6} | {'Req/s':>10} | {'RTT p50':>9} {'RTT p99':>9} | "
+          f"{'Lag p50':>9} {'Lag p99':>9} {'Lag max':>9} | {'Err/lost':>8}")
+    print("-" * 86)
+    for proto in ('tcp', 'udp'):
+        for level, r in report[proto].items():
+            failures = r['errors'] + r.get('lost', 0)
+            print(f"{proto:5} {level:>6} | {r['req_per_sec']:>10,.0f} | {r['p50_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms | "
+                  f"{r['lag_p50_ms']:>7.2f}ms {r['lag_p99_ms']:>7.2f}ms {r['lag_max_ms']:>7.2f}ms | {failures:>8}")
+    print("=" * 86)
+
 if __name__ == "__main__":
-    asyncio.run(benchmark())
+    parser = argparse.ArgumentParser(description="asyncio server-load benchmark")
+    parser.add_argument('--levels', type=int, nargs='+', default=[10, 100, 500, 1000],
+                        help="Concurrent sessions per step of the ramp")
+    parser.add_argument('--requests', type=int, default=50, help="Round trips per session")
+    parser.add_argument('--payload', type=int, default=64)
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Pause between a session's requests")
+    parser.add_argument('--no-uvloop', action='store_true')
+    args = parser.parse_args()
+
+    raise_fd_limit(max(args.levels) * 2 + 256)
+    loops = [('asyncio', asyncio.new_event_loop)]
+    if uvloop is None:
+        print("uvloop: Not installed (pip install uvloop)")
+    elif not args.no_uvloop:
+        loops.append(('uvloop', uvloop.new_event_loop))
+    for name, factory in loops:
+        report = run_on_loop(factory, run_suite(args.levels, args.requests, args.payload, args.think_ms / 1000))
+        print_report(name, report)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Asyncio player session manager: one task per player, bounded heavy work.
+
+    manager = SessionManager(handler, max_expensive=64, op_timeout=1.0)
+    session = manager.connect(player_id, transport)
+    session.deliver(message)          # from the network layer
+    await manager.broadcast(payload)  # fan-out write to every session
+
+Each session runs its own task that waits on a small inbox and calls
+`handler(session, message)`. A failing or slow handler only affects its own
+player: exceptions end that session and are counted, never propagated.
+
+Expensive operations (DB loads, pathfinding) go through
+`manager.expensive(fn, ...)`: a semaphore bounds how many run at once and a
+timeout cancels them cleanly (the semaphore slot is released on cancel).
+Broadcasts write into every transport without awaiting, then drain only the
+transports over their high-water mark, in gathered batches. Transports are
+asyncio StreamWriters: the buffer size and high-water mark come from
+writer.transport.get_write_buffer_size() / get_write_buffer_limits().
+
+Usage:
+    python session_manager.py --idle 50000 --active 5000 --seconds 10
+"""
+import asyncio
+import gc
+import resource
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+async def with_timeout(awaitable: Awaitable, timeout: Optional[float]):
+    """Await with a deadline; the awaited work is cancelled (not abandoned) on expiry."""
+    if timeout is None:
+        return await awaitable
+    if hasattr(asyncio, 'timeout'):  # Python 3.11+
+        async with asyncio.timeout(timeout):
+            return await awaitable
+    return await asyncio.wait_for(awaitable, timeout)
+
+class SimTransport:
+    """In-memory stand-in for an asyncio StreamWriter; drain() blocks past high water.
+
+    Acts as its own .transport, with the write-buffer queries broadcast() uses.
+    """
+    __slots__ = ('buffered', 'written', 'high_water', 'closed')
+
+    def __init__(self, high_water: int = 64 * 1024):
+        self.buffered = 0
+        self.written = 0
+        self.high_water = high_water
+        self.closed = False
+
+    @property
+    def transport(self) -> 'SimTransport':
+        return self
+
+    def get_write_buffer_size(self) -> int:
+        return self.buffered
+
+    def get_write_buffer_limits(self) -> tuple:
+        return self.high_water // 4, self.high_water
+
+    def write(self, data: bytes):
+        self.buffered += len(data)
+
+    async def drain(self):
+        if self.buffered > self.high_water:
+            await asyncio.sleep(0)  # The kernel takes the data on a later loop pass
+        self.written += self.buffered
+        self.buffered = 0
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+class PlayerSession:
+    """One connected player: inbox, transport and its task."""
+    __slots__ = ('player_id', 'transport', 'inbox', 'task', 'last_active', 'handled', '_waiter', '_dirty')
+
+    def __init__(self, player_id: int, transport, dirty: set):
+        self.player_id = player_id
+        self.transport = transport
+        self._dirty = dirty  # Manager's set of transports with unflushed writes
+        self.inbox = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.last_active = time.monotonic()
+        self.handled = 0
+        self._waiter: Optional[asyncio.Future] = None
+
+    def deliver(self, message):
+        """Queue a message for this player's task (called from the network layer)."""
+        self.inbox.append(message)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def next_message(self):
+        while not self.inbox:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self.inbox.popleft()
+
+    def send(self, data: bytes):
+        """Buffered write; the manager drains transports in batches."""
+        self.transport.write(data)
+        self._dirty.add(self.transport)
+
+class SessionManager:
+    """Owns every session task plus the shared limits and counters."""
+
+    def __init__(self, handler: Callable[[PlayerSession, object], Awaitable], max_expensive: int = 64,
+                 op_timeout: Optional[float] = 1.0, idle_timeout: Optional[float] = None,
+                 drain_batch: int = 512):
+        self.handler = handler
+        self.op_timeout = op_timeout
+        self.idle_timeout = idle_timeout
+        self.drain_batch = drain_batch
+        self.sessions: Dict[int, PlayerSession] = {}
+        self._dirty = set()
+        self._expensive = asyncio.Semaphore(max_expensive)
+        self.max_expensive = max_expensive
+        self.stats = {'connected': 0, 'disconnected': 0, 'handled': 0, 'errors': 0,
+                      'timeouts': 0, 'idle_kicks': 0, 'expensive_in_flight': 0, 'expensive_waiting': 0,
+                      'pending_writes': 0, 'broadcasts': 0, 'drains': 0,
+                      'peak_expensive_in_flight': 0, 'peak_expensive_waiting': 0, 'peak_pending_writes': 0}
+
+    def connect(self, player_id: int, transport) -> PlayerSession:
+        if player_id in self.sessions:
+            self.disconnect(player_id)
+        session = PlayerSession(player_id, transport, self._dirty)
+        self.sessions[player_id] = session
+        session.task = asyncio.get_running_loop().create_task(self._run(session), name=f"player-{player_id}")
+        session.task.add_done_callback(lambda t, s=session: self._finished(s, t))
+        self.stats['connected'] += 1
+        return session
+
+    def disconnect(self, player_id: int):
+        session = self.sessions.pop(player_id, None)
+        if session is not None and session.task is not None:
+            session.task.cancel()
+
+    async def _run(self, session: PlayerSession):
+        handler = self.handler
+        while True:
+            if self.idle_timeout is None:
+                message = await session.next_message()
+            else:
+                try:
+                    message = await with_timeout(session.next_message(), self.idle_timeout)
+                except (asyncio.TimeoutError, TimeoutError):
+                    self.stats['idle_kicks'] += 1
+                    return
+            session.last_active = time.monotonic()
+            await handler(session, message)
+            session.handled += 1
+            self.stats['handled'] += 1
+
+    def _finished(self, session: PlayerSession, task: asyncio.Task):
+        if self.sessions.get(session.player_id) is session:
+            del self.sessions[session.player_id]
+        self.stats['disconnected'] += 1
+        session.transport.close()
+        if not task.cancelled() and task.exception() is not None:
+            self.stats['errors'] += 1  # Isolated: only this player's session ends
+
+    async def expensive(self, fn: Callable[..., Awaitable], *args, timeout: Optional[float] = None):
+        """Run fn(*args) under the concurrency limit and timeout; re-raises TimeoutError."""
+        stats = self.stats
+        stats['expensive_waiting'] += 1
+        if stats['expensive_waiting'] > stats['peak_expensive_waiting']:
+            stats['peak_expensive_waiting'] = stats['expensive_waiting']
+        try:
+            await self._expensive.acquire()
+        finally:
+            stats['expensive_waiting'] -= 1
+        stats['expensive_in_flight'] += 1
+        if stats['expensive_in_flight'] > stats['peak_expensive_in_flight']:
+            stats['peak_expensive_in_flight'] = stats['expensive_in_flight']
+        try:
+            return await with_timeout(fn(*args), self.op_timeout if timeout is None else timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            stats['timeouts'] += 1
+            raise
+        finally:
+            stats['expensive_in_flight'] -= 1
+            self._expensive.release()
+
+    async def broadcast(self, data: bytes, player_ids: Optional[Iterable[int]] = None) -> int:
+        """Write data to many sessions; drain backed-up transports in batches. Returns recipients."""
+        sessions = self.sessions
+        targets = sessions.values() if player_ids is None else \
+            [sessions[p] for p in player_ids if p in sessions]
+        backed_up = []
+        sent = 0
+        for session in targets:
+            writer = session.transport
+            writer.write(data)
+            sent += 1
+            transport = writer.transport
+            if transport.get_write_buffer_size() > transport.get_write_buffer_limits()[1]:
+                backed_up.append(writer)
+            else:
+                self._dirty.add(writer)
+        self.stats['broadcasts'] += 1
+        self._add_pending(len(backed_up))
+        for i in range(0, len(backed_up), self.drain_batch):
+            batch = backed_up[i:i + self.drain_batch]
+            try:
+                await asyncio.gather(*(t.drain() for t in batch), return_exceptions=True)
+            finally:
+                self.stats['pending_writes'] -= len(batch)
+                self.stats['drains'] += len(batch)
+        return sent
+
+    async def flush(self):
+        """Drain every transport written since the last flush, in batches."""
+        pending = list(self._dirty)
+        self._dirty.clear()
+        self._add_pending(len(pending))
+        for i in range(0, len(pending), self.drain_batch):
+            batch = pending[i:i + self.drain_batch]
+            try:
+                await asyncio.gather(*(t.drain() for t in batch), return_exceptions=True)
+            finally:
+                self.stats['pending_writes'] -= len(batch)
+                self.stats['drains'] += len(batch)
+
+    def _add_pending(self, count: int):
+        stats = self.stats
+        stats['pending_writes'] += count
+        if stats['pending_writes'] > stats['peak_pending_writes']:
+            stats['peak_pending_writes'] = stats['pending_writes']
+
+    def snapshot(self) -> dict:
+        """Current counters plus live session / task counts."""
+        snap = dict(self.stats)
+        snap['live_sessions'] = len(self.sessions)
+        snap['live_tasks'] = len(asyncio.all_tasks())
+        return snap
+
+    async def close(self):
+        tasks = [s.task for s in self.sessions.values() if s.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# ----- Benchmark -----
+
+async def _simulated_db_load(player_id: int):
+    await asyncio.sleep(0.002)
+    return player_id
+
+async def run_benchmark(idle: int, active: int, seconds: float, rate: float, expensive_every: int,
+                        max_expensive: int, broadcast_hz: float) -> dict:
+    from async_benchmark import LagProbe, percentile
+
+    latencies: List[float] = []
+
+    async def handler(session: PlayerSession, message):
+        sent_at, seq = message
+        if seq % expensive_every == 0:
+            try:
+                await manager.expensive(_simulated_db_load, session.player_id)
+            except (asyncio.TimeoutError, TimeoutError):
+                pass
+        session.send(b'ack')
+        latencies.append(time.perf_counter() - sent_at)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    manager = SessionManager(handler, max_expensive=max_expensive, op_timeout=0.5)
+    start = time.perf_counter()
+    for pid in range(idle + active):
+        manager.connect(pid, SimTransport())
+    await asyncio.sleep(0)  # Let every session task reach its first await
+    # Long-lived session objects would otherwise be rescanned by every full collection
+    gc.collect()
+    gc.freeze()
+    try:
+        connect_s = time.perf_counter() - start
+        # ru_maxrss is KiB on Linux
+        memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+        probe = LagProbe()
+        probe.start()
+        active_ids = list(range(idle, idle + active))
+        tick = 1 / 60
+        per_tick = max(1, int(active * rate * tick))
+        payload = b'w' * 48
+        next_broadcast = 0.0
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        seq = 0
+        sent = 0
+        while loop.time() - begin < seconds:
+            tick_start = loop.time()
+            now = time.perf_counter()
+            for _ in range(per_tick):
+                session = manager.sessions.get(active_ids[seq % active])
+                if session is not None:
+                    session.deliver((now, seq))
+                    sent += 1
+                seq += 1
+            if tick_start - begin >= next_broadcast:
+                await manager.broadcast(payload, active_ids)
+                next_broadcast += 1 / broadcast_hz
+            await manager.flush()
+            await asyncio.sleep(max(0.0, tick - (loop.time() - tick_start)))
+        await asyncio.sleep(0.6)  # Let in-flight handlers finish (op timeout is 0.5s)
+        lag = await probe.stop()
+        snapshot = manager.snapshot()
+        await manager.close()
+        return {
+            'sessions': idle + active,
+            'connect_s': connect_s,
+            'bytes_per_session': memory / (idle + active),
+            'messages': sent,
+            'handled': len(latencies),
+            'msgs_per_sec': len(latencies) / seconds,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'snapshot': snapshot,
+            **lag,
+        }
+    finally:
+        gc.unfreeze()  # Also when the run fails
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Session manager at scale on one event loop")
+    parser.add_argument('--idle', type=int, default=50000)
+    parser.add_argument('--active', type=int, default=5000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--rate', type=float, default=10.0, help="Messages/sec per active player")
+    parser.add_argument('--expensive-every', type=int, default=20, help="Every Nth message does a DB load")
+    parser.add_argument('--max-expensive', type=int, default=64)
+    parser.add_argument('--broadcast-hz', type=float, default=10.0)
+    args = parser.parse_args()
+
+    r = asyncio.run(run_benchmark(args.idle, args.active, args.seconds, args.rate, args.expensive_every,
+                                  args.max_expensive, args.broadcast_hz))
+    print("\n" + "=" * 70)
+    print(f"SESSION MANAGER ({args.idle} idle + {args.active} active sessions, {args.seconds:.0f}s)")
+    print("=" * 70)
+    print(f"Connect all:        {r['connect_s']:8.2f} s   ~{r['bytes_per_session']:.0f} B/session")
+    print(f"Messages handled:   {r['handled']:>8} / {r['messages']}   ({r['msgs_per_sec']:,.0f} msg/s)")
+    print(f"Handle latency:     p50 {r['p50_ms']:7.2f} ms   p99 {r['p99_ms']:7.2f} ms")
+    print(f"Loop lag:           p50 {r['lag_p50_ms']:7.2f} ms   p99 {r['lag_p99_ms']:7.2f} ms   "
+          f"max {r['lag_max_ms']:7.2f} ms")
+    s = r['snapshot']
+    print(f"Peak expensive:     {s['peak_expensive_in_flight']} in flight, "
+          f"{s['peak_expensive_waiting']} waiting (limit {args.max_expensive})")
+    print(f"Peak pending writes:{s['peak_pending_writes']:>8}")
+    print(f"Live tasks:         {s['live_tasks']:>8}   sessions {s['live_sessions']}   "
+          f"errors {s['errors']}   timeouts {s['timeouts']}   drains {s['drains']}")
+    print("=" * 70)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Schema-compiled binary codec for game state snapshots.
+
+A schema is a list of (name, type) pairs. Types:
+    'u8' 'u16' 'u32' 'i16' 'i32' 'f32' 'f64' 'bool'  fixed width, little-endian
+    'varint'    unsigned LEB128
+    'svarint'   zigzag-encoded signed LEB128
+    'str'       varint length + UTF-8 bytes
+    Quantized(lo, hi, bits)   float mapped onto an 8/16/32-bit integer grid
+    ArrayOf(schema)           varint count + one packed column per field
+
+Arrays of records are written column by column: every fixed-width column is
+a single array.tobytes() call, varint columns are concatenated runs. This
+keeps per-player overhead at zero bytes and most work in C.
+
+compile_schema() generates specialised encode/decode functions as Python
+source (kept on the codec as .source) so there is no per-field dispatch at
+runtime.
+"""
+import struct
+import sys
+from array import array
+from operator import itemgetter
+from typing import Callable, List, Tuple
+
+FIXED_TYPES = {
+    # type: (struct code, array typecode)
+    'u8': ('B', 'B'),
+    'u16': ('H', 'H'),
+    'u32': ('I', 'I'),
+    'i16': ('h', 'h'),
+    'i32': ('i', 'i'),
+    'f32': ('f', 'f'),
+    'f64': ('d', 'd'),
+    'bool': ('?', 'B'),
+}
+
+_NEEDS_BYTESWAP = sys.byteorder == 'big'  # Wire format is little-endian
+
+
+class Quantized:
+    """Float in [lo, hi] stored as an unsigned integer with the given bits"""
+
+    def __init__(self, lo: float, hi: float, bits: int = 16):
+        if bits not in (8, 16, 32):
+            raise ValueError("Quantized bits must be 8, 16 or 32")
+        self.lo = lo
+        self.hi = hi
+        self.bits = bits
+        self.steps = (1 << bits) - 1
+        self.scale = self.steps / (hi - lo)
+        self.typecode = {8: 'B', 16: 'H', 32: 'I'}[bits]
+
+    @property
+    def precision(self) -> float:
+        return (self.hi - self.lo) / self.steps
+
+
+class ArrayOf:
+    """Variable-length array of records sharing one schema"""
+
+    def __init__(self, schema: List[Tuple[str, object]]):
+        self.schema = schema
+
+
+# ----- Runtime helpers used by generated code -----
+
+def write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_varints(out: bytearray, values):
+    for value in values:
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def read_varint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def read_varints(buf, pos: int, count: int) -> Tuple[list, int]:
+    values = []
+    append = values.append
+    for _ in range(count):
+        result = 0
+        shift = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(result)
+    return values, pos
+
+
+def zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def pack_column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if _NEEDS_BYTESWAP:
+        column.byteswap()
+    return column.tobytes()
+
+
+def unpack_column(typecode: str, buf, pos: int, count: int) -> Tuple[list, int]:
+    column = array(typecode)
+    end = pos + count * column.itemsize
+    column.frombytes(buf[pos:end])
+    if _NEEDS_BYTESWAP:
+        column.byteswap()
+    return column.tolist(), end
+
+
+def encode_values(out: bytearray, ftype, values: list):
+    """Append one column of scalar values (interpreted, no compile step)"""
+    if isinstance(ftype, str) and ftype in FIXED_TYPES:
+        out += pack_column(FIXED_TYPES[ftype][1], values)
+    elif ftype == 'varint':
+        write_varints(out, values)
+    elif ftype == 'svarint':
+        write_varints(out, [zigzag(v) for v in values])
+    elif isinstance(ftype, Quantized):
+        lo, hi, scale = ftype.lo, ftype.hi, ftype.scale
+        out += pack_column(ftype.typecode, [int((hi if v > hi else lo if v < lo else v) * scale + (0.5 - lo * scale))
+                                            for v in values])
+    elif ftype == 'str':
+        for v in values:
+            raw = v.encode()
+            write_varint(out, len(raw))
+            out += raw
+    else:
+        raise TypeError(f"Unsupported column type: {ftype!r}")
+
+
+def decode_values(buf, pos: int, ftype, count: int) -> Tuple[list, int]:
+    """Read one column written by encode_values()"""
+    if isinstance(ftype, str) and ftype in FIXED_TYPES:
+        values, pos = unpack_column(FIXED_TYPES[ftype][1], buf, pos, count)
+        if ftype == 'bool':
+            values = [v != 0 for v in values]
+        return values, pos
+    if ftype == 'varint':
+        return read_varints(buf, pos, count)
+    if ftype == 'svarint':
+        values, pos = read_varints(buf, pos, count)
+        return [unzigzag(v) for v in values], pos
+    if isinstance(ftype, Quantized):
+        values, pos = unpack_column(ftype.typecode, buf, pos, count)
+        step, lo = 1 / ftype.scale, ftype.lo
+        return [v * step + lo for v in values], pos
+    if ftype == 'str':
+        values = []
+        for _ in range(count):
+            length, pos = read_varint(buf, pos)
+            values.append(bytes(buf[pos:pos + length]).decode())
+            pos += length
+        return values, pos
+    raise TypeError(f"Unsupported column type: {ftype!r}")
+
+
+# ----- Code generation -----
+
+class _Emitter:
+    def __init__(self):
+        self.lines: List[str] = []
+        self.consts = {}
+        self.counter = 0
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    def const(self, value) -> str:
+        self.counter += 1
+        name = f"_c{self.counter}"
+        self.consts[name] = value
+        return name
+
+    def var(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+
+def _scalar_groups(schema):
+    """Split a record schema into runs of fixed-width scalars and other fields"""
+    groups = []
+    run = []
+    for name, ftype in schema:
+        if isinstance(ftype, str) and ftype in FIXED_TYPES:
+            run.append((name, ftype))
+            continue
+        if run:
+            groups.append(('fixed', run))
+            run = []
+        groups.append(('field', (name, ftype)))
+    if run:
+        groups.append(('fixed', run))
+    return groups
+
+
+def _gen_record_encode(em: _Emitter, schema, obj: str, indent: int):
+    for kind, item in _scalar_groups(schema):
+        if kind == 'fixed':
+            fmt = '<' + ''.join(FIXED_TYPES[t][0] for _, t in item)
+            packer = em.const(struct.Struct(fmt))
+            args = ", ".join(f"{obj}[{n!r}]" for n, _ in item)
+            em.emit(indent, f"out += {packer}.pack({args})")
+            continue
+        name, ftype = item
+        value = f"{obj}[{name!r}]"
+        if ftype == 'varint':
+            em.emit(indent, f"write_varint(out, {value})")
+        elif ftype == 'svarint':
+            em.emit(indent, f"write_varint(out, zigzag({value}))")
+        elif ftype == 'str':
+            raw = em.var('_s')
+            em.emit(indent, f"{raw} = {value}.encode()")
+            em.emit(indent, f"write_varint(out, len({raw}))")
+            em.emit(indent, f"out += {raw}")
+        elif isinstance(ftype, Quantized):
+            packer = em.const(struct.Struct('<' + ftype.typecode))
+            em.emit(indent, f"out += {packer}.pack({_quantize_expr(ftype, value)})")
+        elif isinstance(ftype, ArrayOf):
+            _gen_array_encode(em, ftype.schema, value, indent)
+        else:
+            raise TypeError(f"Unsupported field type for {name!r}: {ftype!r}")
+
+
+def _quantize_expr(q: Quantized, value: str) -> str:
+    # Clamp, then round to the nearest grid step: (v - lo) * scale + 0.5
+    offset = 0.5 - q.lo * q.scale
+    return (f"int(({q.hi!r} if {value} > {q.hi!r} else {q.lo!r} if {value} < {q.lo!r} else {value})"
+            f" * {q.scale!r} + {offset!r})")
+
+
+def _gen_array_encode(em: _Emitter, schema, value: str, indent: int):
+    items = em.var('_items')
+    em.emit(indent, f"{items} = {value}")
+    em.emit(indent, f"write_varint(out, len({items}))")
+    for name, ftype in schema:
+        col = f"[it[{name!r}] for it in {items}]"
+        if isinstance(ftype, str) and ftype in FIXED_TYPES:
+            em.emit(indent, f"out += pack_column({FIXED_TYPES[ftype][1]!r}, {col})")
+        elif ftype == 'varint':
+            em.emit(indent, f"write_varints(out, {col})")
+        elif ftype == 'svarint':
+            em.emit(indent, f"write_varints(out, [zigzag(it[{name!r}]) for it in {items}])")
+        elif isinstance(ftype, Quantized):
+            q = _quantize_expr(ftype, 'v')
+            getter = em.const(itemgetter(name))
+            em.emit(indent, f"out += pack_column({ftype.typecode!r}, [{q} for v in map({getter}, {items})])")
+        elif ftype == 'str':
+            em.emit(indent, f"for it in {items}:")
+            raw = em.var('_s')
+            em.emit(indent + 1, f"{raw} = it[{name!r}].encode()")
+            em.emit(indent + 1, f"write_varint(out, len({raw}))")
+            em.emit(indent + 1, f"out += {raw}")
+        else:
+            raise TypeError(f"Unsupported array column type for {name!r}: {ftype!r}")
+
+
+def _gen_record_decode(em: _Emitter, schema, indent: int) -> str:
+    """Emit decoding statements; returns the expression building the record"""
+    fields = []
+    for kind, item in _scalar_groups(schema):
+        if kind == 'fixed':
+            fmt = '<' + ''.join(FIXED_TYPES[t][0] for _, t in item)
+            unpacker = em.const(struct.Struct(fmt))
+            names = [em.var('_v') for _ in item]
+            em.emit(indent, f"{', '.join(names)}{',' if len(names) == 1 else ''} = {unpacker}.unpack_from(buf, pos)")
+            em.emit(indent, f"pos += {unpacker}.size")
+            fields.extend((n, v) for (n, _), v in zip(item, names))
+            continue
+        name, ftype = item
+        var = em.var('_v')
+        if ftype == 'varint':
+            em.emit(indent, f"{var}, pos = read_varint(buf, pos)")
+        elif ftype == 'svarint':
+            em.emit(indent, f"{var}, pos = read_varint(buf, pos)")
+            em.emit(indent, f"{var} = unzigzag({var})")
+        elif ftype == 'str':
+            length = em.var('_n')
+            em.emit(indent, f"{length}, pos = read_varint(buf, pos)")
+            em.emit(indent, f"{var} = bytes(buf[pos:pos + {length}]).decode()")
+            em.emit(indent, f"pos += {length}")
+        elif isinstance(ftype, Quantized):
+            unpacker = em.const(struct.Struct('<' + ftype.typecode))
+            em.emit(indent, f"{var} = {unpacker}.unpack_from(buf, pos)[0] * {1 / ftype.scale!r} + {ftype.lo!r}")
+            em.emit(indent, f"pos += {unpacker}.size")
+        elif isinstance(ftype, ArrayOf):
+            _gen_array_decode(em, ftype.schema, var, indent)
+        else:
+            raise TypeError(f"Unsupported field type for {name!r}: {ftype!r}")
+        fields.append((name, var))
+    return "{" + ", ".join(f"{n!r}: {v}" for n, v in fields) + "}"
+
+
+def _gen_array_decode(em: _Emitter, schema, target: str, indent: int):
+    count = em.var('_count')
+    em.emit(indent, f"{count}, pos = read_varint(buf, pos)")
+    columns = []
+    for name, ftype in schema:
+        col = em.var('_col')
+        if isinstance(ftype, str) and ftype in FIXED_TYPES:
+            em.emit(indent, f"{col}, pos = unpack_column({FIXED_TYPES[ftype][1]!r}, buf, pos, {count})")
+            if ftype == 'bool':
+                em.emit(indent, f"{col} = [v != 0 for v in {col}]")
+        elif ftype == 'varint':
+            em.emit(indent, f"{col}, pos = read_varints(buf, pos, {count})")
+        elif ftype == 'svarint':
+            em.emit(indent, f"{col}, pos = read_varints(buf, pos, {count})")
+            em.emit(indent, f"{col} = [unzigzag(v) for v in {col}]")
+        elif isinstance(ftype, Quantized):
+            em.emit(indent, f"{col}, pos = unpack_column({ftype.typecode!r}, buf, pos, {count})")
+            em.emit(indent, f"{col} = [v * {1 / ftype.scale!r} + {ftype.lo!r} for v in {col}]")
+        elif ftype == 'str':
+            em.emit(indent, f"{col} = []")
+            em.emit(indent, f"for _ in range({count}):")
+            length = em.var('_n')
+            em.emit(indent + 1, f"{length}, pos = read_varint(buf, pos)")
+            em.emit(indent + 1, f"{col}.append(bytes(buf[pos:pos + {length}]).decode())")
+            em.emit(indent + 1, f"pos += {length}")
+        else:
+            raise TypeError(f"Unsupported array column type for {name!r}: {ftype!r}")
+        columns.append((name, col))
+    row_vars = [em.var('_r') for _ in columns]
+    record = "{" + ", ".join(f"{n!r}: {r}" for (n, _), r in zip(columns, row_vars)) + "}"
+    em.emit(indent, f"{target} = [{record} for {', '.join(row_vars)}{',' if len(row_vars) == 1 else ''} "
+                    f"in zip({', '.join(c for _, c in columns)})]")
+
+
+class Codec:
+    """Compiled encoder/decoder pair for one schema"""
+
+    def __init__(self, name: str, encode: Callable, decode: Callable, source: str):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.source = source
+
+
+def compile_schema(schema, name: str = 'record') -> Codec:
+    """Generate and compile encode/decode functions for a record schema"""
+    enc = _Emitter()
+    enc.emit(0, "def encode(obj):")
+    enc.emit(1, "out = bytearray()")
+    _gen_record_encode(enc, schema, 'obj', 1)
+    enc.emit(1, "return bytes(out)")
+
+    dec = _Emitter()
+    dec.counter = enc.counter  # Keep generated names unique across both functions
+    dec.emit(0, "def decode(buf):")
+    dec.emit(1, "buf = memoryview(buf)")
+    dec.emit(1, "pos = 0")
+    record = _gen_record_decode(dec, schema, 1)
+    dec.emit(1, f"return {record}")
+
+    source = "\n".join(enc.lines + [""] + dec.lines) + "\n"
+    namespace = {
+        'write_varint': write_varint, 'write_varints': write_varints,
+        'read_varint': read_varint, 'read_varints': read_varints,
+        'zigzag': zigzag, 'unzigzag': unzigzag,
+        'pack_column': pack_column, 'unpack_column': unpack_column,
+    }
+    namespace.update(enc.consts)
+    namespace.update(dec.consts)
+    exec(compile(source, f"<schema_codec:{name}>", "exec"), namespace)
+    return Codec(name, namespace['encode'], namespace['decode'], source)
+
+
+# Snapshot schema matching GAME_STATE in serialize_benchmark.py
+PLAYER_SCHEMA = [
+    ('id', 'varint'),
+    ('x', Quantized(-4096.0, 4096.0, 16)),  # 0.125 unit precision
+    ('y', Quantized(-4096.0, 4096.0, 16)),
+    ('health', 'u8'),
+]
+
+GAME_STATE_SCHEMA = [
+    ('tick', 'varint'),
+    ('timestamp', 'f64'),
+    ('players', ArrayOf(PLAYER_SCHEMA)),
+]
+
+
+if __name__ == "__main__":
+    codec = compile_schema(GAME_STATE_SCHEMA, 'GameState')
+    print("Generated source:\n")
+    print(codec.source)
+    state = {
+        "players": [{"id": i, "x": 100.5 + i, "y": 200.3 + i, "health": 100} for i in range(3)],
+        "tick": 12345,
+        "timestamp": 1703779200.123,
+    }
+    data = codec.encode(state)
+    print(f"Encoded {len(state['players'])} players into {len(data)} bytes")
+    print(f"Decoded: {codec.decode(data)}")
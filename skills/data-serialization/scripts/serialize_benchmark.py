@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 """Benchmark different serialization formats for game data."""
+import functools
 import json
+import pickle
 import time
+import tracemalloc
+
+from schema_codec import GAME_STATE_SCHEMA, compile_schema
 
 # Sample game state
 GAME_STATE = {
@@ -13,31 +18,86 @@ GAME_STATE = {
     "timestamp": 1703779200.123
 }
 
+@functools.lru_cache(maxsize=None)
+def get_formats() -> dict:
+    """Available formats as name -> (encode, decode); built (and the schema compiled) once."""
+    formats = {
+        "JSON": (lambda obj: json.dumps(obj).encode(), json.loads),
+        "Pickle": (lambda obj: pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    }
+    try:
+        import msgpack
+        formats["MsgPack"] = (msgpack.packb, msgpack.unpackb)
+    except ImportError:
+        print("MsgPack: Not installed (pip install msgpack)")
+    codec = compile_schema(GAME_STATE_SCHEMA, "GameState")
+    formats["Schema"] = (codec.encode, codec.decode)
+    return formats
+
+def measure_allocations(encode, decode, state) -> int:
+    """Peak bytes allocated by one encode + decode round trip."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    decode(encode(state))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - baseline
+
+def benchmark_format(name: str, encode, decode, state=GAME_STATE, iterations: int = 10000) -> dict:
+    """Benchmark one format: size, encode/decode time per op and allocations."""
+    data = encode(state)
+    for _ in range(100):  # Warm up
+        decode(encode(state))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(state)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(data)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    return {
+        "name": name,
+        "size": len(data),
+        "encode_us": encode_us,
+        "decode_us": decode_us,
+        "peak_alloc": measure_allocations(encode, decode, state),
+    }
+
 def benchmark_json(iterations: int = 10000):
     """Benchmark JSON serialization."""
-    start = time.time()
-    for _ in range(iterations):
-        data = json.dumps(GAME_STATE)
-        json.loads(data)
-    elapsed = time.time() - start
-    size = len(json.dumps(GAME_STATE))
-    print(f"JSON: {elapsed:.3f}s, Size: {size} bytes")
+    encode, decode = get_formats()["JSON"]
+    return benchmark_format("JSON", encode, decode, iterations=iterations)
 
 def benchmark_msgpack(iterations: int = 10000):
     """Benchmark MessagePack serialization."""
-    try:
-        import msgpack
-        start = time.time()
-        for _ in range(iterations):
-            data = msgpack.packb(GAME_STATE)
-            msgpack.unpackb(data)
-        elapsed = time.time() - start
-        size = len(msgpack.packb(GAME_STATE))
-        print(f"MsgPack: {elapsed:.3f}s, Size: {size} bytes")
-    except ImportError:
-        print("MsgPack: Not installed (pip install msgpack)")
+    formats = get_formats()
+    if "MsgPack" not in formats:
+        return None
+    encode, decode = formats["MsgPack"]
+    return benchmark_format("MsgPack", encode, decode, iterations=iterations)
+
+def print_results(results: list):
+    """Print comparison table, relative to JSON."""
+    baseline = results[0]
+    print(f"{'Format':10} | {'Size':>7} | {'Encode':>10} | {'Decode':>10} | {'Peak alloc':>10} | vs JSON")
+    print("-" * 75)
+    for r in results:
+        total = r["encode_us"] + r["decode_us"]
+        speedup = (baseline["encode_us"] + baseline["decode_us"]) / total if total else 0.0
+        print(f"{r['name']:10} | {r['size']:>5} B | {r['encode_us']:>7.1f} µs | {r['decode_us']:>7.1f} µs | "
+              f"{r['peak_alloc'] / 1024:>7.1f} KiB | {speedup:.1f}x faster, "
+              f"{r['size'] / baseline['size']:.0%} size")
 
 if __name__ == "__main__":
     print("=== Serialization Benchmark ===")
-    benchmark_json()
-    benchmark_msgpack()
+    print(f"{len(GAME_STATE['players'])} players, 10000 iterations\n")
+    results = [
+        benchmark_format(name, encode, decode)
+        for name, (encode, decode) in get_formats().items()
+    ]
+    print_results(results)
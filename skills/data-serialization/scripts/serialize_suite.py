@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark suite for snapshot wire formats.
+
+Generates a stream of game ticks for every combination of entity count,
+field mix and change rate, then measures each format on:
+    full snapshots   - the whole world every tick
+    delta snapshots  - only the fields that changed since the previous tick
+
+Timing uses perf_counter_ns with warm-up and repeated runs (median, mean,
+stdev, min per operation); peak memory of one encode + decode comes from
+tracemalloc. Results can be written as JSON for comparison across runs.
+
+Usage:
+    python serialize_suite.py --entities 10 100 1000 --mix standard full \\
+        --change-rate 0.1 0.5 --json results.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from schema_codec import (ArrayOf, Quantized, compile_schema, decode_values, encode_values,
+                          read_varint, read_varints, write_varint, write_varints)
+from serialize_benchmark import get_formats, measure_allocations
+
+WORLD = Quantized(-4096.0, 4096.0, 16)
+VELOCITY = Quantized(-64.0, 64.0, 16)
+ANGLE = Quantized(0.0, 360.0, 8)
+
+# Field mixes: entity schema, with 'id' always first
+FIELD_MIXES = {
+    'minimal': [('id', 'varint'), ('x', WORLD), ('y', WORLD)],
+    'standard': [('id', 'varint'), ('x', WORLD), ('y', WORLD), ('health', 'u8')],
+    'full': [
+        ('id', 'varint'), ('x', WORLD), ('y', WORLD), ('z', WORLD),
+        ('vx', VELOCITY), ('vy', VELOCITY), ('vz', VELOCITY), ('yaw', ANGLE),
+        ('health', 'u8'), ('ammo', 'u16'), ('flags', 'u8'), ('name', 'str'),
+    ],
+}
+
+# Fields that change on most updates; the rest change ten times less often
+HOT_FIELDS = {'x', 'y', 'z', 'vx', 'vy', 'vz', 'yaw'}
+
+
+# ----- Workload generation -----
+
+def _initial_value(name: str, ftype, rng: random.Random, entity_id: int):
+    if name == 'id':
+        return entity_id
+    if name == 'name':
+        return f"player_{entity_id}"
+    if isinstance(ftype, Quantized):
+        return rng.uniform(ftype.lo / 4, ftype.hi / 4)
+    if name == 'health':
+        return 100
+    return rng.randint(0, 200)
+
+
+def _changed_value(name: str, ftype, old, rng: random.Random):
+    if isinstance(ftype, Quantized):
+        return min(ftype.hi, max(ftype.lo, old + rng.uniform(-2.0, 2.0)))
+    if name == 'name':
+        return old
+    return max(0, min(255, old + rng.randint(-10, 10)))
+
+
+def generate_ticks(entities: int, mix: str, change_rate: float, ticks: int, seed: int = 42) -> List[Dict]:
+    """Stream of ticks, each with a full snapshot and a delta against the previous one"""
+    rng = random.Random(seed)
+    schema = FIELD_MIXES[mix]
+    world = [{name: _initial_value(name, ftype, rng, i) for name, ftype in schema} for i in range(entities)]
+    stream = []
+    for tick in range(ticks):
+        changed = []
+        for entity in world:
+            if rng.random() >= change_rate:
+                continue
+            delta = {'id': entity['id']}
+            for name, ftype in schema[1:]:
+                chance = 1.0 if name in HOT_FIELDS else 0.1
+                if rng.random() < chance:
+                    value = _changed_value(name, ftype, entity[name], rng)
+                    if value != entity[name]:
+                        entity[name] = delta[name] = value
+            if len(delta) > 1:
+                changed.append(delta)
+        stream.append({
+            'full': {'tick': tick, 'timestamp': 1703779200.0 + tick / 60,
+                     'players': [dict(e) for e in world]},
+            'delta': {'tick': tick, 'base': tick - 1, 'players': changed},
+        })
+    return stream
+
+
+# ----- Schema codec for deltas -----
+
+class DeltaCodec:
+    """
+    Field-level delta encoding on top of the schema column helpers.
+
+    Layout: tick, base tick, count, id column, field-mask column, then for
+    each field one column holding only the entities whose mask has its bit.
+    """
+
+    def __init__(self, schema):
+        self.fields = schema[1:]
+
+    def encode(self, delta: dict) -> bytes:
+        out = bytearray()
+        write_varint(out, delta['tick'])
+        write_varint(out, delta['base'] + 1)  # +1 keeps the first tick's base (-1) unsigned
+        players = delta['players']
+        write_varint(out, len(players))
+        write_varints(out, [p['id'] for p in players])
+        masks = []
+        for p in players:
+            mask = 0
+            for bit, (name, _) in enumerate(self.fields):
+                if name in p:
+                    mask |= 1 << bit
+            masks.append(mask)
+        write_varints(out, masks)
+        for name, ftype in self.fields:
+            encode_values(out, ftype, [p[name] for p in players if name in p])
+        return bytes(out)
+
+    def decode(self, data: bytes) -> dict:
+        buf = memoryview(data)
+        tick, pos = read_varint(buf, 0)
+        base, pos = read_varint(buf, pos)
+        count, pos = read_varint(buf, pos)
+        ids, pos = read_varints(buf, pos, count)
+        masks, pos = read_varints(buf, pos, count)
+        players = [{'id': i} for i in ids]
+        for bit, (name, ftype) in enumerate(self.fields):
+            owners = [p for p, m in zip(players, masks) if m >> bit & 1]
+            values, pos = decode_values(buf, pos, ftype, len(owners))
+            for p, v in zip(owners, values):
+                p[name] = v
+        return {'tick': tick, 'base': base - 1, 'players': players}
+
+
+def build_formats(mix: str, names: List[str]) -> Dict[str, Dict[str, tuple]]:
+    """name -> {'full': (encode, decode), 'delta': (encode, decode)}"""
+    formats = {}
+    for name, (encode, decode) in get_formats().items():
+        if name != 'Schema':
+            formats[name] = {'full': (encode, decode), 'delta': (encode, decode)}
+    schema = FIELD_MIXES[mix]
+    snapshot = compile_schema([('tick', 'varint'), ('timestamp', 'f64'), ('players', ArrayOf(schema))],
+                              f"Snapshot_{mix}")
+    delta = DeltaCodec(schema)
+    formats['Schema'] = {'full': (snapshot.encode, snapshot.decode), 'delta': (delta.encode, delta.decode)}
+    if names:
+        formats = {k: v for k, v in formats.items() if k.lower() in names}
+    return formats
+
+
+# ----- Measurement -----
+
+def time_per_op(func, inputs: list, repeat: int, warmup: int) -> Dict[str, float]:
+    """Run func over every input, `repeat` times; ns per call statistics"""
+    for i in range(warmup):
+        func(inputs[i % len(inputs)])
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in inputs:
+            func(item)
+        samples.append((time.perf_counter_ns() - start) / len(inputs))
+    return {
+        'median_ns': statistics.median(samples),
+        'mean_ns': statistics.fmean(samples),
+        'stdev_ns': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'min_ns': min(samples),
+    }
+
+
+def measure(stream: List[Dict], kind: str, encode, decode, repeat: int, warmup: int) -> Dict:
+    items = [t[kind] for t in stream]
+    encoded = [encode(item) for item in items]
+    sizes = [len(e) for e in encoded]
+    return {
+        'bytes_mean': statistics.fmean(sizes),
+        'bytes_max': max(sizes),
+        'encode': time_per_op(encode, items, repeat, warmup),
+        'decode': time_per_op(decode, encoded, repeat, warmup),
+        'peak_bytes': measure_allocations(encode, decode, items[len(items) // 2]),
+    }
+
+
+def run_suite(entity_counts, mixes, change_rates, format_names, ticks, repeat, warmup) -> Dict:
+    results = []
+    for mix in mixes:
+        formats = build_formats(mix, format_names)
+        for entities in entity_counts:
+            for rate in change_rates:
+                stream = generate_ticks(entities, mix, rate, ticks)
+                for fmt, codecs in formats.items():
+                    for kind in ('full', 'delta'):
+                        encode, decode = codecs[kind]
+                        row = measure(stream, kind, encode, decode, repeat, warmup)
+                        row.update({'format': fmt, 'snapshot': kind, 'entities': entities,
+                                    'mix': mix, 'change_rate': rate})
+                        results.append(row)
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'ticks': ticks,
+            'repeat': repeat,
+            'warmup': warmup,
+        },
+        'results': results,
+    }
+
+
+def print_results(report: Dict):
+    print("\n" + "=" * 100)
+    print("SERIALIZATION SUITE (per snapshot; timings are median of repetitions)")
+    print("=" * 100)
+    header = (f"{'Mix':9} {'Ents':>5} {'Rate':>5} {'Format':8} {'Kind':6} | {'Bytes':>8} | "
+              f"{'Encode µs':>10} {'±':>6} | {'Decode µs':>10} {'±':>6} | {'Peak KiB':>8}")
+    print(header)
+    print("-" * 100)
+    for r in report['results']:
+        print(f"{r['mix']:9} {r['entities']:>5} {r['change_rate']:>5.2f} {r['format']:8} {r['snapshot']:6} | "
+              f"{r['bytes_mean']:>8.0f} | "
+              f"{r['encode']['median_ns'] / 1000:>10.1f} {r['encode']['stdev_ns'] / 1000:>6.1f} | "
+              f"{r['decode']['median_ns'] / 1000:>10.1f} {r['decode']['stdev_ns'] / 1000:>6.1f} | "
+              f"{r['peak_bytes'] / 1024:>8.1f}")
+    print("=" * 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot serialization benchmark suite")
+    parser.add_argument('--entities', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--mix', nargs='+', choices=sorted(FIELD_MIXES), default=['standard', 'full'])
+    parser.add_argument('--change-rate', type=float, nargs='+', default=[0.1, 0.5])
+    parser.add_argument('--formats', nargs='*', default=[], help="Subset, e.g. json schema")
+    parser.add_argument('--ticks', type=int, default=30, help="Snapshots per stream")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--json', metavar='PATH', help="Also write machine-readable results")
+    args = parser.parse_args()
+
+    report = run_suite(args.entities, args.mix, args.change_rate, [f.lower() for f in args.formats],
+                       args.ticks, args.repeat, args.warmup)
+    print_results(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
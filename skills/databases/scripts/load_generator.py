@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Concurrent open-loop load generator for the storage backends.
+
+N client threads each run a share of the target arrival rate. Every
+operation has an intended start time on a fixed schedule; latency is
+measured from that time, not from when the client got round to it, so a
+stalled backend shows up as queueing delay in the tail instead of being
+hidden by clients that simply slow down (coordinated omission).
+
+Workloads are weighted mixes of compound game operations:
+    login_burst      - profile reads, new-player writes, last-seen updates
+    match_end        - batched result updates for a whole match, leaderboard reads
+    inventory_trade  - read both inventories, write both in one batch
+
+Used by db_benchmark.py --load.
+"""
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+class LatencyHistogram:
+    """Log-linear latency histogram: 2**SUB_BITS sub-buckets per power of two (~3% error)."""
+    SUB_BITS = 5
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        ns = max(ns, 1)
+        shift = max(0, ns.bit_length() - 1 - self.SUB_BITS)
+        key = (shift, ns >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if self.count == 0 or ns < self.min:
+            self.min = ns
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def merge(self, other: 'LatencyHistogram'):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        if other.count and (self.count == 0 or other.min < self.min):
+            self.min = other.min
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket holding the q-th percentile, in ns."""
+        rank = q / 100 * self.count
+        seen = 0
+        for shift, sub in sorted(self.counts, key=lambda k: k[1] << k[0]):
+            seen += self.counts[(shift, sub)]
+            if seen >= rank:
+                return min(((sub + 1) << shift) - 1, self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+# ----- Game operations -----
+# Each takes (backend, rng, ctx) and performs one logical operation.
+
+def _row(rng: random.Random) -> Dict:
+    return {'x': rng.random() * 100, 'y': rng.random() * 100, 'health': rng.randint(1, 100),
+            'inventory': [{'item_id': i, 'quantity': rng.randint(1, 10)} for i in range(5)],
+            'updated_at': time.time()}
+
+def op_profile_read(backend, rng, ctx):
+    backend.read(rng.randrange(ctx['players']))
+
+def op_new_player(backend, rng, ctx):
+    with ctx['lock']:
+        player_id = ctx['next_id']
+        ctx['next_id'] += 1
+    backend.write(player_id, _row(rng))
+
+def op_last_seen(backend, rng, ctx):
+    backend.update(rng.randrange(ctx['players']), {'updated_at': time.time()})
+
+def op_match_results(backend, rng, ctx):
+    match = rng.sample(range(ctx['players']), ctx['match_size'])
+    backend.update_many([(pid, {'health': 100, 'x': rng.random() * 100, 'y': rng.random() * 100,
+                                'updated_at': time.time()}) for pid in match])
+
+def op_leaderboard_read(backend, rng, ctx):
+    backend.read_many(rng.sample(range(ctx['players']), ctx['match_size']))
+
+def op_trade(backend, rng, ctx):
+    a, b = rng.sample(range(ctx['players']), 2)
+    rows = backend.read_many([a, b])
+    if len(rows) == 2:
+        inv_a, inv_b = rows[a]['inventory'], rows[b]['inventory']
+        if inv_a and inv_b:
+            inv_a[0], inv_b[0] = inv_b[0], inv_a[0]
+        backend.update_many([(a, {'inventory': inv_a}), (b, {'inventory': inv_b})])
+
+WORKLOADS: Dict[str, List[Tuple[str, Callable, int]]] = {
+    'login_burst': [('profile_read', op_profile_read, 60), ('new_player', op_new_player, 10),
+                    ('last_seen', op_last_seen, 30)],
+    'match_end': [('match_results', op_match_results, 40), ('leaderboard_read', op_leaderboard_read, 40),
+                  ('profile_read', op_profile_read, 20)],
+    'inventory_trade': [('trade', op_trade, 50), ('profile_read', op_profile_read, 50)],
+}
+
+# ----- Driver -----
+
+def _client(backend, ops: Sequence[Tuple[str, Callable]], weights: Sequence[int], interval_ns: int,
+            start_ns: int, end_ns: int, seed: int, ctx: dict, out: dict):
+    rng = random.Random(seed)
+    clock = time.perf_counter_ns
+    latency = {name: LatencyHistogram() for name, _ in ops}
+    service = {name: LatencyHistogram() for name, _ in ops}
+    errors = 0
+    done = 0
+    max_behind = 0
+    intended = start_ns + rng.randrange(interval_ns)  # Spread clients across the first interval
+    while intended < end_ns:
+        now = clock()
+        if now < intended:
+            time.sleep((intended - now) / 1e9)
+            now = clock()
+        else:
+            max_behind = max(max_behind, now - intended)
+        name, func = rng.choices(ops, weights)[0]
+        try:
+            func(backend, rng, ctx)
+        except Exception:
+            errors += 1
+        finished = clock()
+        latency[name].record(finished - intended)
+        service[name].record(finished - now)
+        done += 1
+        intended += interval_ns
+    out.update(latency=latency, service=service, errors=errors, done=done, max_behind_ns=max_behind)
+
+def run_load(backend, workload: str, clients: int, rate: float, duration: float, players: int,
+             match_size: int = 10, seed: int = 1) -> Dict:
+    """Drive `rate` ops/sec of `workload` from `clients` threads for `duration` seconds."""
+    mix = WORKLOADS[workload]
+    ops = [(name, func) for name, func, _ in mix]
+    weights = [weight for _, _, weight in mix]
+    ctx = {'players': players, 'match_size': match_size, 'next_id': players, 'lock': threading.Lock()}
+    interval_ns = int(clients / rate * 1e9)
+    start_ns = time.perf_counter_ns() + 20_000_000  # Let every thread start before the schedule does
+    end_ns = start_ns + int(duration * 1e9)
+    outs = [{} for _ in range(clients)]
+    threads = [threading.Thread(target=_client, name=f"load-client-{i}",
+                                args=(backend, ops, weights, interval_ns, start_ns, end_ns, seed + i, ctx, outs[i]))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+
+    per_op = {}
+    overall = LatencyHistogram()
+    for name, _ in ops:
+        latency, service = LatencyHistogram(), LatencyHistogram()
+        for out in outs:
+            latency.merge(out['latency'][name])
+            service.merge(out['service'][name])
+        overall.merge(latency)
+        per_op[name] = {'latency': latency, 'service': service}
+    done = sum(out['done'] for out in outs)
+    return {'workload': workload, 'clients': clients, 'target_rate': rate, 'achieved_rate': done / elapsed,
+            'ops': done, 'errors': sum(out['errors'] for out in outs), 'overall': overall, 'per_op': per_op,
+            'max_behind_ms': max(out['max_behind_ns'] for out in outs) / 1e6}
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Write-behind player-state cache over a storage backend.
+
+Game code mutates player state in memory every tick; the database only sees
+what changed, once per flush interval:
+
+    per-field dirty bits  - set_fields() marks a bit only when a value changes
+    coalescing            - 20 position updates in a second become one write
+    changed-field batches - flush() sends {field: value} for dirty fields only,
+                            in update_many()/write_many() batches
+    LRU eviction          - offline players stay cached up to max_offline,
+                            least recently used are flushed and dropped
+    shutdown safety       - close() flushes; rows the backend refuses are
+                            spilled to a JSON-lines file and replayed by
+                            recover_spill() on the next start
+
+Works with any backend from storage_backends.py.
+
+Usage:
+    python player_cache.py --players 10000 --seconds 5 --backend sqlite
+"""
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from storage_backends import PLAYER_FIELDS
+
+FIELD_BITS = {name: 1 << i for i, name in enumerate(PLAYER_FIELDS)}
+ALL_FIELDS = (1 << len(PLAYER_FIELDS)) - 1
+
+class CachedPlayer:
+    """One player's row plus the fields changed since the last flush."""
+    __slots__ = ('player_id', 'row', 'dirty', 'new', 'online')
+
+    def __init__(self, player_id: int, row: Dict, new: bool):
+        self.player_id = player_id
+        self.row = row
+        self.dirty = ALL_FIELDS if new else 0
+        self.new = new  # Not in the database yet: flushed as a full write
+        self.online = False
+
+    def changed_fields(self) -> Dict:
+        return {name: self.row[name] for name, bit in FIELD_BITS.items() if self.dirty & bit}
+
+class PlayerStateCache:
+    """Write-behind cache: all reads and writes hit memory, flush() persists the deltas."""
+
+    def __init__(self, backend, flush_interval: float = 1.0, max_offline: int = 1000,
+                 flush_batch: int = 500, spill_path: Optional[str] = None, clock=time.monotonic):
+        self.backend = backend
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.max_offline = max_offline
+        self.flush_batch = flush_batch
+        self.spill_path = spill_path
+        self.players: Dict[int, CachedPlayer] = {}
+        self.offline: 'OrderedDict[int, None]' = OrderedDict()  # LRU order, oldest first
+        self.dirty: set = set()
+        self._in_flight: set = set()  # Taken by a flush that has not finished writing yet
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # One flush at a time; mutations continue meanwhile
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_flush = clock()
+        self._closed = False
+        self.stats = {'updates': 0, 'field_changes': 0, 'flushes': 0, 'rows_written': 0,
+                      'fields_written': 0, 'db_calls': 0, 'loads': 0, 'hits': 0, 'evictions': 0,
+                      'flush_errors': 0, 'spilled': 0}
+
+    # ----- Access -----
+
+    def _get(self, player_id: int) -> Optional[CachedPlayer]:
+        entry = self.players.get(player_id)
+        if entry is not None:
+            self.stats['hits'] += 1
+            if not entry.online:
+                self.offline.move_to_end(player_id)
+            return entry
+        row = self.backend.read(player_id)
+        self.stats['loads'] += 1
+        if row is None:
+            return None
+        entry = CachedPlayer(player_id, row, new=False)
+        self.players[player_id] = entry
+        self.offline[player_id] = None
+        self._evict(keep=player_id)  # The caller is about to use it
+        return entry
+
+    def get(self, player_id: int) -> Optional[Dict]:
+        """Current row (a copy) from cache, loading it on a miss."""
+        with self._lock:
+            entry = self._get(player_id)
+            return None if entry is None else dict(entry.row)
+
+    def login(self, player_id: int, default_row: Optional[Dict] = None) -> Dict:
+        """Mark a player online, loading their row or creating it from default_row."""
+        with self._lock:
+            entry = self._get(player_id)
+            if entry is None:
+                if default_row is None:
+                    raise KeyError(f"Unknown player {player_id} and no default row")
+                entry = CachedPlayer(player_id, dict(default_row), new=True)
+                self.players[player_id] = entry
+                self.dirty.add(player_id)
+            self.offline.pop(player_id, None)
+            entry.online = True
+            return dict(entry.row)
+
+    def logout(self, player_id: int):
+        """Player goes offline: stays cached (and dirty) until evicted."""
+        with self._lock:
+            entry = self.players.get(player_id)
+            if entry is None or not entry.online:
+                return
+            entry.online = False
+            self.offline[player_id] = None
+            self._evict()
+
+    def set_fields(self, player_id: int, **fields):
+        """Apply an update; only fields whose value changed are marked dirty."""
+        with self._lock:
+            entry = self.players.get(player_id) or self._get(player_id)
+            if entry is None:
+                raise KeyError(f"Unknown player {player_id}")
+            self.stats['updates'] += 1
+            row = entry.row
+            mask = 0
+            for name, value in fields.items():
+                if row.get(name) != value:
+                    row[name] = value
+                    mask |= FIELD_BITS[name]
+            if mask and self.players.get(player_id) is entry:
+                self.stats['field_changes'] += bin(mask).count('1')
+                if not entry.dirty:
+                    self.dirty.add(player_id)
+                entry.dirty |= mask
+
+    def _evict(self, keep: Optional[int] = None):
+        """Drop least recently used offline players beyond max_offline, flushing dirty ones first.
+
+        Players in a flush that is still writing are skipped: persisting them
+        here could land before that flush's older snapshot and be overwritten.
+        """
+        excess = len(self.offline) - self.max_offline
+        if excess <= 0:
+            return
+        victims = []
+        for player_id in self.offline:
+            if len(victims) == excess:
+                break
+            if player_id != keep and player_id not in self._in_flight:
+                victims.append(player_id)
+        dirty = [self.players[pid] for pid in victims if self.players[pid].dirty]
+        if dirty:
+            try:
+                self._persist(self._take(dirty))
+            except Exception:
+                return  # Bits restored; the players stay cached and are retried on the next eviction
+        for pid in victims:
+            del self.offline[pid]
+            del self.players[pid]
+            self.stats['evictions'] += 1
+
+    # ----- Flushing -----
+
+    def _take(self, entries: Iterable[CachedPlayer]) -> List[Tuple[CachedPlayer, int, Dict]]:
+        """Snapshot and clear dirty state; caller holds the lock."""
+        taken = []
+        now = time.time()
+        for entry in entries:
+            entry.row['updated_at'] = now
+            entry.dirty |= FIELD_BITS['updated_at']
+            fields = dict(entry.row) if entry.new else entry.changed_fields()
+            taken.append((entry, entry.dirty, fields))
+            entry.dirty = 0
+            self.dirty.discard(entry.player_id)
+        return taken
+
+    def _persist(self, taken: List[Tuple[CachedPlayer, int, Dict]]):
+        """Write a snapshot in batches; on failure put the bits back so nothing is lost."""
+        size = self.flush_batch
+        for i in range(0, len(taken), size):
+            chunk = taken[i:i + size]
+            new = [(e.player_id, fields) for e, _, fields in chunk if e.new]
+            changed = [(e.player_id, fields) for e, _, fields in chunk if not e.new]
+            try:
+                if new:
+                    self.backend.write_many(new)
+                    self.stats['db_calls'] += 1
+                if changed:
+                    self.backend.update_many(changed)
+                    self.stats['db_calls'] += 1
+            except Exception:
+                self.stats['flush_errors'] += 1
+                with self._lock:
+                    for entry, mask, _ in taken[i:]:
+                        if self.players.get(entry.player_id) is entry:
+                            entry.dirty |= mask
+                            self.dirty.add(entry.player_id)
+                raise
+            for entry, _, fields in chunk:
+                entry.new = False
+                self.stats['fields_written'] += len(fields)
+            self.stats['rows_written'] += len(chunk)
+
+    def flush(self) -> int:
+        """Persist every dirty player's changed fields. Returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                self.dirty &= self.players.keys()
+                taken = self._take([self.players[pid] for pid in self.dirty])
+                self._in_flight = {entry.player_id for entry, _, _ in taken}
+                self._last_flush = self.clock()
+            try:
+                if taken:
+                    self._persist(taken)
+                    self.stats['flushes'] += 1
+            finally:
+                with self._lock:
+                    self._in_flight = set()
+            return len(taken)
+
+    def maybe_flush(self) -> int:
+        """Call once per tick: flushes when flush_interval has passed on self.clock."""
+        if self.clock() - self._last_flush >= self.flush_interval:
+            return self.flush()
+        return 0
+
+    def start(self):
+        """Flush every flush_interval on a background thread."""
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    pass  # Dirty bits were restored; retried next interval
+        self._thread = threading.Thread(target=run, name="player-cache-flush", daemon=True)
+        self._thread.start()
+        return self
+
+    # ----- Shutdown -----
+
+    def close(self):
+        """Stop the flusher and persist everything; spill what the backend refuses."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception:
+            self._spill()
+            raise
+
+    def _spill(self):
+        if self.spill_path is None:
+            return
+        with self._lock:
+            entries = [self.players[pid] for pid in self.dirty if pid in self.players]
+            tmp = self.spill_path + ".tmp"
+            with open(tmp, 'w') as f:
+                for e in entries:
+                    f.write(json.dumps({'player_id': e.player_id, 'new': e.new,
+                                        'fields': dict(e.row) if e.new else e.changed_fields()}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.spill_path)
+            self.stats['spilled'] += len(entries)
+
+    def recover_spill(self) -> int:
+        """Replay a spill file left by an earlier close(); returns rows replayed."""
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return 0
+        with open(self.spill_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        new = [(r['player_id'], r['fields']) for r in records if r['new']]
+        changed = [(r['player_id'], r['fields']) for r in records if not r['new']]
+        if new:
+            self.backend.write_many(new)
+        if changed:
+            self.backend.update_many(changed)
+        os.remove(self.spill_path)
+        return len(records)
+
+    def install_shutdown_hooks(self):
+        """Flush on interpreter exit and on SIGTERM (main thread only)."""
+        atexit.register(self.close)
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_term(signum, frame):
+            self.close()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(128 + signum)
+        signal.signal(signal.SIGTERM, on_term)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ----- Benchmark -----
+
+def run_benchmark(backend_name: str = 'sqlite', players: int = 10000, seconds: int = 5, tick_hz: int = 20,
+                  flush_interval: float = 1.0, naive_ticks: int = 2) -> Dict:
+    """Same simulated game traffic, written through per update vs through the cache.
+
+    Game time is simulated (no sleeping), so results are DB writes per second
+    of game time plus the wall time those writes cost.
+    """
+    import random
+    from db_benchmark import GameDataBenchmark
+    from storage_backends import document_to_row
+
+    bench = GameDataBenchmark(players=players)
+    rng = random.Random(11)
+
+    def tick_updates(ids):
+        """One tick of gameplay: most players move, a few take damage, rarely inventory changes."""
+        for pid in ids:
+            r = rng.random()
+            if r < 0.6:
+                yield pid, {'x': rng.random() * 100, 'y': rng.random() * 100}
+            elif r < 0.62:
+                yield pid, {'health': rng.randint(1, 100)}
+            elif r < 0.621:
+                yield pid, {'inventory': [{'item_id': 9, 'quantity': rng.randint(1, 10)}]}
+            elif r < 0.8:
+                yield pid, {'x': 50.0}  # Repeated value: standing still, no change
+
+    results = {}
+    backend, server = bench.open_backend(backend_name)
+    try:
+        online = list(range(players))
+        backend.write_many([(pid, document_to_row(bench.player_document(pid))) for pid in online])
+
+        # Write-through: every update persists the whole row
+        rows = {pid: backend.read(pid) for pid in online}
+        writes = 0
+        start = time.perf_counter()
+        for _ in range(naive_ticks):
+            for pid, fields in tick_updates(online):
+                row = rows[pid]
+                row.update(fields)
+                backend.write(pid, row)
+                writes += 1
+        naive_s = time.perf_counter() - start
+        game_s = naive_ticks / tick_hz
+        results['write_through'] = {'row_writes_per_s': writes / game_s, 'db_calls_per_s': writes / game_s,
+                                    'db_seconds_per_game_second': naive_s / game_s}
+
+        # Write-behind
+        game_time = [0.0]
+        cache = PlayerStateCache(backend, flush_interval=flush_interval, max_offline=players // 50,
+                                 clock=lambda: game_time[0])
+        for pid in online:
+            cache.login(pid)
+        next_id = players
+        start = time.perf_counter()
+        db_s = 0.0
+        for tick in range(seconds * tick_hz):
+            for pid, fields in tick_updates(online):
+                cache.set_fields(pid, **fields)
+            if tick % tick_hz == 0:  # ~1% churn per second
+                for i in rng.sample(range(len(online)), players // 100):
+                    cache.logout(online[i])
+                    online[i] = next_id
+                    cache.login(next_id, document_to_row(bench.player_document(next_id)))
+                    next_id += 1
+            game_time[0] = (tick + 1) / tick_hz
+            flush_start = time.perf_counter()
+            cache.maybe_flush()
+            db_s += time.perf_counter() - flush_start
+        flush_start = time.perf_counter()
+        cache.close()
+        db_s += time.perf_counter() - flush_start
+        total_s = time.perf_counter() - start
+        s = cache.stats
+        results['write_behind'] = {'row_writes_per_s': s['rows_written'] / seconds,
+                                   'db_calls_per_s': s['db_calls'] / seconds,
+                                   'db_seconds_per_game_second': db_s / seconds,
+                                   'cpu_seconds_per_game_second': total_s / seconds,
+                                   'fields_per_row': s['fields_written'] / max(1, s['rows_written']),
+                                   'updates_per_s': s['updates'] / seconds,
+                                   'evictions': s['evictions'], 'cached': len(cache.players)}
+        sample = online[0]
+        assert backend.read(sample)['x'] == cache.get(sample)['x']
+    finally:
+        backend.close()
+        if server is not None:
+            server.stop()
+    return results
+
+def print_results(results: Dict, players: int, backend_name: str):
+    naive, cached = results['write_through'], results['write_behind']
+    print("\n" + "=" * 72)
+    print(f"WRITE-BEHIND PLAYER CACHE ({players:,} online players, {backend_name})")
+    print("=" * 72)
+    print(f"{'':24} | {'Write-through':>16} | {'Write-behind':>16}")
+    print("-" * 72)
+    print(f"{'Row writes / s':24} | {naive['row_writes_per_s']:>16,.0f} | {cached['row_writes_per_s']:>16,.0f}")
+    print(f"{'DB calls / s':24} | {naive['db_calls_per_s']:>16,.0f} | {cached['db_calls_per_s']:>16,.0f}")
+    print(f"{'DB time / game second':24} | {naive['db_seconds_per_game_second']:>15.2f}s | "
+          f"{cached['db_seconds_per_game_second']:>15.2f}s")
+    print("-" * 72)
+    print(f"Updates applied: {cached['updates_per_s']:,.0f}/s, {cached['fields_per_row']:.1f} fields per written row")
+    print(f"Row writes reduced {naive['row_writes_per_s'] / max(1, cached['row_writes_per_s']):.0f}x; "
+          f"{cached['evictions']} offline players evicted, {cached['cached']} cached at the end")
+    print("=" * 72)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write-behind player cache benchmark")
+    parser.add_argument('--backend', choices=('sqlite', 'kv', 'resp'), default='sqlite')
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--seconds', type=int, default=5, help="Simulated game time")
+    parser.add_argument('--tick-hz', type=int, default=20)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--naive-ticks', type=int, default=2, help="Ticks run in write-through mode")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.backend, args.players, args.seconds, args.tick_hz, args.flush_interval,
+                            args.naive_ticks)
+    print_results(results, args.players, args.backend)
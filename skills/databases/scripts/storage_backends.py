@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Local storage backends for player state, all runnable without services.
+
+    SQLiteBackend  - SQLite in WAL mode, upserts through cached statements
+    KVBackend      - in-process key-value store holding encoded rows
+    RespBackend    - Redis protocol (RESP2) client; RespServer is a small
+                     local stand-in speaking the same subset (HSET/HGETALL/...),
+                     so the same client also works against a real Redis
+
+Every backend exposes the same row API:
+    write(player_id, row)        / write_many([(player_id, row), ...])
+    update(player_id, fields)    / update_many([(player_id, fields), ...])
+    read(player_id) -> row|None  / read_many(player_ids)
+
+A row is a dict with the PLAYER_FIELDS keys; update() writes only the given
+fields and skips players that have no row. Connections come from a ConnectionPool; *_many() variants batch the
+work into one transaction, one lock acquisition or one pipelined round trip.
+"""
+import json
+import os
+import queue
+import selectors
+import socket
+import sqlite3
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+PLAYER_FIELDS = ('x', 'y', 'health', 'inventory', 'updated_at')
+
+Row = Dict[str, object]
+
+
+def document_to_row(doc: dict) -> Row:
+    """Flatten a player document (position dict, inventory list) into a storage row."""
+    return {'x': doc['position']['x'], 'y': doc['position']['y'], 'health': doc['health'],
+            'inventory': doc['inventory'], 'updated_at': doc['timestamp']}
+
+
+class ConnectionPool:
+    """Thread-safe pool: connections are created lazily up to `size`, then borrowers wait."""
+
+    def __init__(self, factory: Callable[[], object], size: int = 4, close: Callable[[object], None] = None):
+        self.factory = factory
+        self.size = size
+        self._close = close
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'borrowed': 0, 'waited': 0}
+
+    @contextmanager
+    def connection(self):
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    self.stats['created'] += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                conn = self.factory()
+            else:
+                self.stats['waited'] += 1
+                conn = self._idle.get()
+        self.stats['borrowed'] += 1
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._close is not None:
+                self._close(conn)
+
+
+# ----- SQLite -----
+
+class SQLiteBackend:
+    """SQLite in WAL mode; one connection per borrower, statements cached per connection."""
+    name = 'sqlite'
+
+    def __init__(self, path: str, pool_size: int = 4, synchronous: str = 'NORMAL'):
+        self.path = path
+        self.synchronous = synchronous
+        self.pool = ConnectionPool(self._connect, pool_size, close=lambda c: c.close())
+        self._update_sql: Dict[Tuple[str, ...], str] = {}
+        with self.pool.connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS player_state (
+                player_id INTEGER PRIMARY KEY, x REAL, y REAL, health INTEGER,
+                inventory TEXT, updated_at REAL)""")
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: autocommit, batches use explicit BEGIN/COMMIT
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    UPSERT = ("INSERT INTO player_state (player_id, x, y, health, inventory, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT(player_id) DO UPDATE SET x=excluded.x, y=excluded.y, health=excluded.health, "
+              "inventory=excluded.inventory, updated_at=excluded.updated_at")
+    SELECT = "SELECT x, y, health, inventory, updated_at FROM player_state WHERE player_id = ?"
+
+    @staticmethod
+    def _params(player_id: int, row: Row) -> tuple:
+        return (player_id, row['x'], row['y'], row['health'], json.dumps(row['inventory']), row['updated_at'])
+
+    def _update_statement(self, fields: Tuple[str, ...]) -> str:
+        sql = self._update_sql.get(fields)
+        if sql is None:
+            sql = f"UPDATE player_state SET {', '.join(f'{f} = ?' for f in fields)} WHERE player_id = ?"
+            self._update_sql[fields] = sql
+        return sql
+
+    @staticmethod
+    def _encode_field(field: str, value):
+        return json.dumps(value) if field == 'inventory' else value
+
+    def write(self, player_id: int, row: Row):
+        with self.pool.connection() as conn:
+            conn.execute(self.UPSERT, self._params(player_id, row))
+
+    def write_many(self, rows: Sequence[Tuple[int, Row]]):
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(self.UPSERT, [self._params(pid, row) for pid, row in rows])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def update(self, player_id: int, fields: Row):
+        keys = tuple(sorted(fields))
+        with self.pool.connection() as conn:
+            conn.execute(self._update_statement(keys),
+                         [self._encode_field(k, fields[k]) for k in keys] + [player_id])
+
+    def update_many(self, updates: Sequence[Tuple[int, Row]]):
+        # Group by field set so each group is one executemany on one cached statement
+        groups: Dict[Tuple[str, ...], list] = {}
+        for pid, fields in updates:
+            keys = tuple(sorted(fields))
+            groups.setdefault(keys, []).append([self._encode_field(k, fields[k]) for k in keys] + [pid])
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                for keys, params in groups.items():
+                    conn.executemany(self._update_statement(keys), params)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _row(values) -> Optional[Row]:
+        if values is None:
+            return None
+        x, y, health, inventory, updated_at = values
+        return {'x': x, 'y': y, 'health': health, 'inventory': json.loads(inventory), 'updated_at': updated_at}
+
+    def read(self, player_id: int) -> Optional[Row]:
+        with self.pool.connection() as conn:
+            return self._row(conn.execute(self.SELECT, (player_id,)).fetchone())
+
+    def read_many(self, player_ids: Sequence[int]) -> Dict[int, Row]:
+        result = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(player_ids), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = player_ids[start:start + 500]
+                sql = ("SELECT player_id, x, y, health, inventory, updated_at FROM player_state "
+                       f"WHERE player_id IN ({', '.join('?' * len(chunk))})")
+                for pid, *values in conn.execute(sql, chunk):
+                    result[pid] = self._row(values)
+        return result
+
+    def close(self):
+        self.pool.close()
+
+
+# ----- In-process key-value store -----
+
+class KeyValueStore:
+    """The 'server' side: bytes values in a dict behind one lock."""
+
+    def __init__(self):
+        self.data: Dict[int, bytes] = {}
+        self.lock = threading.Lock()
+
+
+class KVBackend:
+    """Rows encoded with a precompiled struct (fixed fields) plus JSON inventory."""
+    name = 'kv'
+    FIXED = struct.Struct("<ddid")  # x, y, health, updated_at
+
+    def __init__(self, store: Optional[KeyValueStore] = None, pool_size: int = 4):
+        self.store = store or KeyValueStore()
+        # A "connection" is just a handle on the shared store; pooled for parity with the others
+        self.pool = ConnectionPool(lambda: self.store, pool_size)
+
+    def _encode(self, row: Row) -> bytes:
+        return self.FIXED.pack(row['x'], row['y'], row['health'], row['updated_at']) + \
+            json.dumps(row['inventory']).encode()
+
+    def _decode(self, data: bytes) -> Row:
+        x, y, health, updated_at = self.FIXED.unpack_from(data)
+        return {'x': x, 'y': y, 'health': health, 'updated_at': updated_at,
+                'inventory': json.loads(data[self.FIXED.size:])}
+
+    def write(self, player_id: int, row: Row):
+        encoded = self._encode(row)
+        with self.pool.connection() as store, store.lock:
+            store.data[player_id] = encoded
+
+    def write_many(self, rows: Sequence[Tuple[int, Row]]):
+        encoded = [(pid, self._encode(row)) for pid, row in rows]
+        with self.pool.connection() as store, store.lock:
+            store.data.update(encoded)
+
+    def _merge(self, store: KeyValueStore, player_id: int, fields: Row):
+        current = store.data.get(player_id)
+        if current is None:
+            return
+        row = self._decode(current)
+        row.update(fields)
+        store.data[player_id] = self._encode(row)
+
+    def update(self, player_id: int, fields: Row):
+        with self.pool.connection() as store, store.lock:
+            self._merge(store, player_id, fields)
+
+    def update_many(self, updates: Sequence[Tuple[int, Row]]):
+        with self.pool.connection() as store, store.lock:
+            for pid, fields in updates:
+                self._merge(store, pid, fields)
+
+    def read(self, player_id: int) -> Optional[Row]:
+        with self.pool.connection() as store:
+            data = store.data.get(player_id)
+        return None if data is None else self._decode(data)
+
+    def read_many(self, player_ids: Sequence[int]) -> Dict[int, Row]:
+        with self.pool.connection() as store, store.lock:
+            found = [(pid, store.data.get(pid)) for pid in player_ids]
+        return {pid: self._decode(data) for pid, data in found if data is not None}
+
+    def close(self):
+        self.pool.close()
+
+
+# ----- Redis protocol -----
+
+def encode_command(*args) -> bytes:
+    out = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(out)
+
+
+class RespError(Exception):
+    """Error reply from the server."""
+
+
+class RespParser:
+    """Incremental RESP2 reply parser."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes):
+        self.buffer += data
+
+    def _parse(self, pos: int):
+        buf = self.buffer
+        end = buf.find(b'\r\n', pos)
+        if end < 0:
+            return None
+        kind, line, pos = buf[pos:pos + 1], bytes(buf[pos + 1:end]), end + 2
+        if kind == b'+':
+            return line.decode(), pos
+        if kind == b'-':
+            return RespError(line.decode()), pos
+        if kind == b':':
+            return int(line), pos
+        if kind == b'$':
+            size = int(line)
+            if size < 0:
+                return None, pos
+            if len(buf) < pos + size + 2:
+                return None
+            return bytes(buf[pos:pos + size]), pos + size + 2
+        if kind == b'*':
+            count = int(line)
+            if count < 0:
+                return None, pos
+            items = []
+            for _ in range(count):
+                parsed = self._parse(pos)
+                if parsed is None:
+                    return None
+                item, pos = parsed
+                items.append(item)
+            return items, pos
+        raise RespError(f"Bad reply type: {kind!r}")
+
+    def replies(self) -> list:
+        """All complete replies in the buffer."""
+        out = []
+        pos = 0
+        while pos < len(self.buffer):
+            parsed = self._parse(pos)
+            if parsed is None:
+                break
+            item, pos = parsed
+            out.append(item)
+        del self.buffer[:pos]
+        return out
+
+
+class RespConnection:
+    """Blocking RESP client socket with pipelining."""
+
+    def __init__(self, host: str, port: int):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.parser = RespParser()
+
+    def pipeline(self, commands: Sequence[bytes]) -> list:
+        """Send pre-encoded commands in one write; return their replies in order."""
+        return self.send_raw(b''.join(commands), len(commands))
+
+    def send_raw(self, payload: bytes, expected: int) -> list:
+        self.sock.sendall(payload)
+        replies = []
+        while len(replies) < expected:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.parser.feed(data)
+            replies.extend(self.parser.replies())
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def execute(self, *args):
+        return self.send_raw(encode_command(*args), 1)[0]
+
+    def close(self):
+        self.sock.close()
+
+
+class RespBackend:
+    """Player rows as Redis hashes (player:<id>); batches are pipelined."""
+    name = 'resp'
+
+    def __init__(self, host: str, port: int, pool_size: int = 4):
+        self.pool = ConnectionPool(lambda: RespConnection(host, port), pool_size, close=lambda c: c.close())
+        self._hset = b'$4\r\nHSET\r\n'  # Pre-encoded command name, reused for every write
+
+    def _hset_command(self, player_id: int, fields: Row) -> bytes:
+        key = b'player:%d' % player_id
+        parts = [b'*%d\r\n' % (2 + 2 * len(fields)), self._hset, b'$%d\r\n%s\r\n' % (len(key), key)]
+        for field, value in fields.items():
+            value = json.dumps(value).encode() if field == 'inventory' else repr(value).encode()
+            name = field.encode()
+            parts.append(b'$%d\r\n%s\r\n$%d\r\n%s\r\n' % (len(name), name, len(value), value))
+        return b''.join(parts)
+
+    def write(self, player_id: int, row: Row):
+        with self.pool.connection() as conn:
+            conn.send_raw(self._hset_command(player_id, row), 1)
+
+    def write_many(self, rows: Sequence[Tuple[int, Row]]):
+        if rows:
+            with self.pool.connection() as conn:
+                conn.send_raw(b''.join(self._hset_command(pid, row) for pid, row in rows), len(rows))
+
+    def update(self, player_id: int, fields: Row):
+        # HSET writes only the given fields, but would create a partial hash for a missing player
+        with self.pool.connection() as conn:
+            if conn.execute(b'EXISTS', b'player:%d' % player_id):
+                conn.send_raw(self._hset_command(player_id, fields), 1)
+
+    def update_many(self, updates: Sequence[Tuple[int, Row]]):
+        """Two pipelined round trips: EXISTS for every key, then HSET for the existing ones."""
+        if not updates:
+            return
+        with self.pool.connection() as conn:
+            found = conn.send_raw(b''.join(encode_command(b'EXISTS', b'player:%d' % pid) for pid, _ in updates),
+                                  len(updates))
+            present = [(pid, fields) for (pid, fields), exists in zip(updates, found) if exists]
+            if present:
+                conn.send_raw(b''.join(self._hset_command(pid, fields) for pid, fields in present), len(present))
+
+    @staticmethod
+    def _row(pairs: list) -> Optional[Row]:
+        if not pairs:
+            return None
+        raw = dict(zip(pairs[::2], pairs[1::2]))
+        return {'x': float(raw[b'x']), 'y': float(raw[b'y']), 'health': int(raw[b'health']),
+                'inventory': json.loads(raw[b'inventory']), 'updated_at': float(raw[b'updated_at'])}
+
+    def read(self, player_id: int) -> Optional[Row]:
+        with self.pool.connection() as conn:
+            return self._row(conn.execute(b'HGETALL', b'player:%d' % player_id))
+
+    def read_many(self, player_ids: Sequence[int]) -> Dict[int, Row]:
+        with self.pool.connection() as conn:
+            replies = conn.send_raw(b''.join(encode_command(b'HGETALL', b'player:%d' % pid) for pid in player_ids),
+                                    len(player_ids))
+        return {pid: row for pid, row in ((pid, self._row(r)) for pid, r in zip(player_ids, replies)) if row}
+
+    def close(self):
+        self.pool.close()
+
+
+class RespServer:
+    """Single-threaded selectors server speaking a RESP subset: PING SET GET DEL EXISTS HSET HGETALL HMGET."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.data: Dict[bytes, object] = {}
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self._stop_r, self._stop_w = os.pipe()
+        self.selector.register(self._stop_r, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self._serve, name="resp-server", daemon=True)
+
+    def start(self) -> 'RespServer':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        os.write(self._stop_w, b'x')
+        self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj not in (self.listener, self._stop_r):
+                key.fileobj.close()
+        self.selector.close()
+        self.listener.close()
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def _serve(self):
+        buffers: Dict[socket.socket, bytearray] = {}
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj == self._stop_r:
+                    return
+                if key.fileobj is self.listener:
+                    try:
+                        conn, _ = self.listener.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(False)
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    buffers[conn] = bytearray()
+                    self.selector.register(conn, selectors.EVENT_READ)
+                    continue
+                conn = key.fileobj
+                try:
+                    data = conn.recv(1 << 16)
+                except BlockingIOError:
+                    continue
+                except ConnectionError:
+                    data = b''
+                if not data:
+                    self.selector.unregister(conn)
+                    buffers.pop(conn, None)
+                    conn.close()
+                    continue
+                buf = buffers[conn]
+                buf += data
+                out, consumed = self._execute_all(buf)
+                del buf[:consumed]
+                if out:
+                    conn.setblocking(True)  # Replies are small; simplest correct write path
+                    conn.sendall(out)
+                    conn.setblocking(False)
+
+    def _execute_all(self, buf: bytearray) -> Tuple[bytes, int]:
+        parser = RespParser()
+        parser.buffer = buf
+        out = []
+        pos = 0
+        while pos < len(buf):
+            parsed = parser._parse(pos)
+            if parsed is None:
+                break
+            command, pos = parsed
+            out.append(self._execute(command))
+        return b''.join(out), pos
+
+    def _execute(self, command: List[bytes]) -> bytes:
+        name = command[0].upper()
+        args = command[1:]
+        data = self.data
+        if name == b'PING':
+            return b'+PONG\r\n'
+        if name == b'SET':
+            data[args[0]] = args[1]
+            return b'+OK\r\n'
+        if name == b'GET':
+            value = data.get(args[0])
+            return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+        if name == b'DEL':
+            return b':%d\r\n' % sum(data.pop(k, None) is not None for k in args)
+        if name == b'EXISTS':
+            return b':%d\r\n' % sum(k in data for k in args)
+        if name == b'HSET':
+            fields = data.setdefault(args[0], {})
+            added = 0
+            for i in range(1, len(args) - 1, 2):
+                added += args[i] not in fields
+                fields[args[i]] = args[i + 1]
+            return b':%d\r\n' % added
+        if name == b'HGETALL':
+            fields = data.get(args[0], {})
+            parts = [b'*%d\r\n' % (2 * len(fields))]
+            for k, v in fields.items():
+                parts.append(b'$%d\r\n%s\r\n$%d\r\n%s\r\n' % (len(k), k, len(v), v))
+            return b''.join(parts)
+        if name == b'HMGET':
+            fields = data.get(args[0], {})
+            parts = [b'*%d\r\n' % (len(args) - 1)]
+            for k in args[1:]:
+                v = fields.get(k)
+                parts.append(b'$-1\r\n' if v is None else b'$%d\r\n%s\r\n' % (len(v), v))
+            return b''.join(parts)
+        return b'-ERR unknown command\r\n'
@@ -1,44 +1,290 @@
 #!/usr/bin/env python3
-"""I/O multiplexing example using select (cross-platform epoll alternative)."""
+"""
+I/O multiplexing game server using selectors (epoll on Linux).
+
+Messages are length-prefixed frames: a 4-byte big-endian length followed by
+the payload. Each connection owns a read buffer and a write buffer; writes
+that cannot complete immediately are flushed on writability events, and a
+connection whose write buffer passes the high-water mark stops being read
+until it drains below the low-water mark.
+
+A zero-length frame is a heartbeat. The server sends one when a connection
+has had no outbound traffic for heartbeat_interval and closes connections
+that have been silent for idle_timeout; both run on a TimerWheel.
+"""
+import selectors
 import socket
-import select
+import struct
+import time
+
+from timer_wheel import TimerWheel
+
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024
+RECV_SIZE = 64 * 1024
+HIGH_WATER = 256 * 1024  # Pause reading above this many pending output bytes
+LOW_WATER = 64 * 1024    # Resume reading once drained below this
+IDLE_TIMEOUT = 60.0       # Close connections silent for this long
+HEARTBEAT_INTERVAL = 10.0  # Send a heartbeat after this much outbound silence
+HEARTBEAT_FRAME = struct.pack("!I", 0)
+
+# Prefer epoll explicitly; fall back to the platform default elsewhere
+Selector = getattr(selectors, 'EpollSelector', selectors.DefaultSelector)
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """Prefix payload with its length."""
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """Incremental decoder for length-prefixed frames."""
+
+    __slots__ = ('buffer',)
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Append received bytes and return every complete frame."""
+        buf = self.buffer
+        buf += data
+        frames = []
+        offset = 0
+        end = len(buf)
+        while end - offset >= 4:
+            (length,) = FRAME_HEADER.unpack_from(buf, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"Frame of {length} bytes exceeds limit")
+            if end - offset - 4 < length:
+                break
+            frames.append(bytes(buf[offset + 4:offset + 4 + length]))
+            offset += 4 + length
+        if offset:
+            del buf[:offset]
+        return frames
+
+
+class Connection:
+    """Per-connection buffers and selector interest."""
+
+    __slots__ = ('sock', 'fd', 'addr', 'decoder', 'outbuf', 'events', 'reading_paused',
+                 'last_recv', 'last_send', 'idle_timer', 'heartbeat_timer')
+
+    def __init__(self, sock: socket.socket, addr):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.addr = addr
+        self.decoder = FrameDecoder()
+        self.outbuf = bytearray()
+        self.events = selectors.EVENT_READ
+        self.reading_paused = False
+        self.last_recv = 0.0
+        self.last_send = 0.0
+        self.idle_timer = None
+        self.heartbeat_timer = None
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self.outbuf)
+
+
+class FramedServer:
+    """
+    Single-reactor TCP front end.
+
+    handler(conn, payload) is called once per frame and may return bytes to
+    send back as a frame, or call server.send(conn, payload) directly.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 9999, handler=None, backlog: int = 4096,
+                 idle_timeout: float = IDLE_TIMEOUT, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.selector = Selector()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(backlog)
+        self.server.setblocking(False)
+        self.address = self.server.getsockname()
+        self.selector.register(self.server, selectors.EVENT_READ, None)
+
+        self.handler = handler or (lambda conn, payload: payload)
+        self.connections = {}  # fd -> Connection
+        self.running = False
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.timers = TimerWheel(tick=0.05, wheel_bits=11)  # Level 0 spans 102s
+        self.now = time.monotonic()
+        self.stats = {
+            'accepted': 0,
+            'closed': 0,
+            'frames_in': 0,
+            'frames_out': 0,
+            'read_pauses': 0,
+            'idle_disconnects': 0,
+            'heartbeats_sent': 0,
+        }
+
+    # ----- Connection lifecycle -----
+
+    def _accept(self):
+        while True:
+            try:
+                sock, addr = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # EMFILE and friends: retry on the next readiness event
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(sock, addr)
+            conn.last_recv = conn.last_send = self.now
+            conn.idle_timer = self.timers.schedule(self.idle_timeout, self._on_idle, conn)
+            conn.heartbeat_timer = self.timers.schedule(self.heartbeat_interval, self._on_heartbeat, conn)
+            self.connections[conn.fd] = conn
+            self.selector.register(sock, selectors.EVENT_READ, conn)
+            self.stats['accepted'] += 1
+
+    def close(self, conn: Connection):
+        """Close a connection and drop its bookkeeping."""
+        if self.connections.pop(conn.fd, None) is None:
+            return
+        self.timers.cancel(conn.idle_timer)
+        self.timers.cancel(conn.heartbeat_timer)
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+        self.stats['closed'] += 1
+
+    def _on_idle(self, conn: Connection):
+        # Lazy reset: reads only bump last_recv, the timer re-arms itself
+        idle = self.now - conn.last_recv
+        if idle < self.idle_timeout:
+            self.timers.reschedule(conn.idle_timer, self.idle_timeout - idle)
+            return
+        self.stats['idle_disconnects'] += 1
+        self.close(conn)
+
+    def _on_heartbeat(self, conn: Connection):
+        quiet = self.now - conn.last_send
+        if quiet >= self.heartbeat_interval:
+            self._queue(conn, HEARTBEAT_FRAME)
+            self.stats['heartbeats_sent'] += 1
+            quiet = 0.0
+        if conn.fd in self.connections:
+            self.timers.reschedule(conn.heartbeat_timer, self.heartbeat_interval - quiet)
+
+    def _set_events(self, conn: Connection, events: int):
+        if events != conn.events:
+            conn.events = events
+            self.selector.modify(conn.sock, events, conn)
+
+    def _update_interest(self, conn: Connection):
+        pending = len(conn.outbuf)
+        if not conn.reading_paused and pending > HIGH_WATER:
+            conn.reading_paused = True
+            self.stats['read_pauses'] += 1
+        elif conn.reading_paused and pending < LOW_WATER:
+            conn.reading_paused = False
+        events = 0 if conn.reading_paused else selectors.EVENT_READ
+        if pending:
+            events |= selectors.EVENT_WRITE
+        self._set_events(conn, events)
+
+    # ----- I/O -----
+
+    def send(self, conn: Connection, payload: bytes):
+        """Queue a frame; written immediately when the socket has room."""
+        self.stats['frames_out'] += 1
+        self._queue(conn, FRAME_HEADER.pack(len(payload)) + payload)
+
+    def _queue(self, conn: Connection, frame: bytes):
+        was_empty = not conn.outbuf
+        conn.outbuf += frame
+        conn.last_send = self.now
+        if was_empty:
+            self._flush(conn)  # Nothing was pending: try the fast path
+        else:
+            self._update_interest(conn)
+
+    def _flush(self, conn: Connection):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self.close(conn)
+            return
+        if sent:
+            del conn.outbuf[:sent]
+        self._update_interest(conn)
+
+    def _read(self, conn: Connection):
+        try:
+            data = conn.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close(conn)
+            return
+        if not data:
+            self.close(conn)
+            return
+        conn.last_recv = self.now
+        try:
+            frames = conn.decoder.feed(data)
+        except ValueError:
+            self.close(conn)
+            return
+        for payload in frames:
+            if not payload:
+                continue  # Heartbeat: activity already recorded
+            self.stats['frames_in'] += 1
+            reply = self.handler(conn, payload)
+            if reply is not None:
+                self.send(conn, reply)
+            if conn.fd not in self.connections:
+                return
+
+    def run_once(self, timeout: float = 0.016):
+        """Process one batch of readiness events, then due timers."""
+        events = self.selector.select(timeout)
+        self.now = time.monotonic()
+        for key, mask in events:
+            conn = key.data
+            if conn is None:
+                self._accept()
+                continue
+            if mask & selectors.EVENT_WRITE:
+                self._flush(conn)
+            if mask & selectors.EVENT_READ and conn.fd in self.connections:
+                self._read(conn)
+        self.timers.advance(self.now)
+
+    def serve_forever(self, timeout: float = 0.016):
+        self.running = True
+        while self.running:
+            self.run_once(timeout)
+
+    def shutdown(self):
+        self.running = False
+        for conn in list(self.connections.values()):
+            self.close(conn)
+        self.selector.unregister(self.server)
+        self.server.close()
+        self.selector.close()
+
 
 def run_multiplexed_server(host='0.0.0.0', port=9999):
     """Run a multiplexed game server."""
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((host, port))
-    server.listen(100)
-    server.setblocking(False)
-
-    sockets = [server]
-    print(f"Multiplexed server running on {host}:{port}")
+    server = FramedServer(host, port, handler=lambda conn, payload: b"ACK")
+    print(f"Multiplexed server running on {server.address[0]}:{server.address[1]}")
 
     try:
-        while True:
-            readable, _, _ = select.select(sockets, [], [], 0.1)
-            for sock in readable:
-                if sock is server:
-                    conn, addr = server.accept()
-                    conn.setblocking(False)
-                    sockets.append(conn)
-                    print(f"Player connected: {addr}")
-                else:
-                    try:
-                        data = sock.recv(1024)
-                        if data:
-                            # Process game message
-                            sock.send(b"ACK")
-                        else:
-                            sockets.remove(sock)
-                            sock.close()
-                    except:
-                        sockets.remove(sock)
-                        sock.close()
+        server.serve_forever()
     except KeyboardInterrupt:
         print("Server shutdown")
     finally:
-        server.close()
+        server.shutdown()
 
 if __name__ == "__main__":
     run_multiplexed_server()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Loopback benchmark for the selectors-based TCP front end.
+
+Starts FramedServer in a child process, opens N concurrent client
+connections from this process and runs a closed loop per connection: send a
+timestamped frame, wait for the echo, repeat. Reports messages/sec and
+round-trip latency percentiles.
+
+Usage:
+    python frontend_benchmark.py --connections 10000 --duration 10
+"""
+import argparse
+import multiprocessing
+import resource
+import selectors
+import socket
+import struct
+import time
+
+from epoll_example import FrameDecoder, FramedServer, Selector, encode_frame
+
+STAMP = struct.Struct("!d")
+
+
+def raise_fd_limit(needed: int) -> int:
+    """Raise RLIMIT_NOFILE towards the hard limit; returns the new soft limit."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard != resource.RLIM_INFINITY else max(soft, needed)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def _serve(port_queue, stop_event, connections: int):
+    raise_fd_limit(connections + 64)
+    server = FramedServer('127.0.0.1', 0)  # Default handler echoes each frame
+    port_queue.put(server.address[1])
+    while not stop_event.is_set():
+        server.run_once(0.05)
+    server.shutdown()
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def run_clients(port: int, connections: int, duration: float, payload_size: int) -> dict:
+    """Connect all clients, then drive closed-loop echo traffic."""
+    selector = Selector()
+    padding = b'\x00' * max(0, payload_size - STAMP.size)
+    clients = {}
+
+    connect_started_at = time.time()  # Wall clock, comparable across processes
+    connect_start = time.perf_counter()
+    for _ in range(connections):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.connect(('127.0.0.1', port))  # Blocking connect: loopback is fast
+        sock.setblocking(False)
+        decoder = FrameDecoder()
+        clients[sock.fileno()] = (sock, decoder)
+        selector.register(sock, selectors.EVENT_READ, (sock, decoder))
+    connect_time = time.perf_counter() - connect_start
+
+    latencies = []
+    messages = 0
+    start = time.perf_counter()
+    for sock, _ in clients.values():
+        sock.send(encode_frame(STAMP.pack(time.perf_counter()) + padding))
+
+    deadline = start + duration
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        for key, _ in selector.select(0.05):
+            sock, decoder = key.data
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                continue
+            if not data:
+                selector.unregister(sock)
+                continue
+            now = time.perf_counter()
+            for frame in decoder.feed(data):
+                if not frame:
+                    continue  # Heartbeat
+                (sent_at,) = STAMP.unpack_from(frame)
+                latencies.append(now - sent_at)
+                messages += 1
+                if now < deadline:
+                    sock.send(encode_frame(STAMP.pack(now) + padding))
+    elapsed = time.perf_counter() - start
+
+    for sock, _ in clients.values():
+        sock.close()
+    selector.close()
+
+    latencies.sort()
+    return {
+        'connections': connections,
+        'connect_time_s': connect_time,
+        'connect_started_at': connect_started_at,
+        'messages': messages,
+        'elapsed_s': elapsed,
+        'msgs_per_sec': messages / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def run_benchmark(connections: int = 10000, duration: float = 10.0, payload_size: int = 32) -> dict:
+    limit = raise_fd_limit(connections + 64)
+    if limit < connections + 64:
+        connections = limit - 64
+        print(f"RLIMIT_NOFILE is {limit}; reducing to {connections} connections")
+
+    port_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve, args=(port_queue, stop_event, connections))
+    server.start()
+    try:
+        port = port_queue.get(timeout=10)
+        return run_clients(port, connections, duration, payload_size)
+    finally:
+        stop_event.set()
+        server.join(timeout=10)
+
+
+def print_results(results: dict):
+    print("\n" + "=" * 60)
+    print("SELECTORS TCP FRONT END - LOOPBACK BENCHMARK")
+    print("=" * 60)
+    print(f"Connections:     {results['connections']}")
+    print(f"Connect Time:    {results['connect_time_s']:.2f} s")
+    print(f"Messages:        {results['messages']}")
+    print(f"Throughput:      {results['msgs_per_sec']:.0f} msgs/sec")
+    print(f"P50 Latency:     {results['p50_ms']:.2f} ms")
+    print(f"P99 Latency:     {results['p99_ms']:.2f} ms")
+    print(f"Max Latency:     {results['max_ms']:.2f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="selectors TCP front end benchmark")
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--payload', type=int, default=32)
+    args = parser.parse_args()
+
+    print_results(run_benchmark(args.connections, args.duration, args.payload))
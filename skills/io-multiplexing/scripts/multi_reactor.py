@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Multi-reactor TCP server: one edge-triggered epoll loop per worker process.
+
+Two ways to spread connections over reactors:
+    reuseport - every reactor binds its own SO_REUSEPORT listener and the
+                kernel load-balances incoming connections
+    acceptor  - the parent process accepts and hands each socket to a
+                reactor round-robin over a Unix socket (SCM_RIGHTS)
+
+Reactors publish counters into a shared-memory array (one row per reactor,
+single writer per row, so no locking) and drain gracefully: on drain they
+stop accepting, keep serving existing connections until the clients leave
+or the drain timeout passes, then flush and close what is left.
+
+Linux only (epoll, SO_REUSEPORT).
+"""
+import errno
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import time
+
+from epoll_example import FRAME_HEADER, HIGH_WATER, LOW_WATER, FrameDecoder
+
+RECV_SIZE = 64 * 1024
+
+# Shared metrics layout: one row of counters per reactor
+METRIC_FIELDS = ('accepted', 'shed', 'active', 'closed', 'frames_in', 'frames_out',
+                 'bytes_in', 'bytes_out', 'draining')
+FIELD_INDEX = {name: i for i, name in enumerate(METRIC_FIELDS)}
+NUM_FIELDS = len(METRIC_FIELDS)
+
+EPOLL_FLAGS = select.EPOLLIN | select.EPOLLOUT | select.EPOLLRDHUP | select.EPOLLET
+
+
+class ReactorMetrics:
+    """View onto one reactor's row of the shared counter array"""
+
+    def __init__(self, shared, reactor_id: int):
+        self.shared = shared
+        self.base = reactor_id * NUM_FIELDS
+
+    def add(self, field: str, amount: int = 1):
+        self.shared[self.base + FIELD_INDEX[field]] += amount
+
+    def set(self, field: str, value: int):
+        self.shared[self.base + FIELD_INDEX[field]] = value
+
+
+class ETConnection:
+    """Connection state for an edge-triggered reactor"""
+
+    __slots__ = ('sock', 'fd', 'decoder', 'outbuf', 'readable', 'writable')
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.decoder = FrameDecoder()
+        self.outbuf = bytearray()
+        # Edge-triggered: remember readiness we have not fully consumed
+        self.readable = False
+        self.writable = True
+
+
+class Reactor:
+    """Edge-triggered epoll loop owning a subset of connections"""
+
+    def __init__(self, reactor_id: int, shared_metrics, handler=None,
+                 listener: socket.socket = None, handoff: socket.socket = None):
+        self.reactor_id = reactor_id
+        self.metrics = ReactorMetrics(shared_metrics, reactor_id)
+        self.handler = handler or (lambda payload: payload)
+        self.listener = listener
+        self.handoff = handoff
+        self.epoll = select.epoll()
+        self.connections = {}  # fd -> ETConnection
+        self.accepting = True
+        # Reserve fd: released under EMFILE so the pending connection can be accepted and shed
+        self.spare_fd = os.open(os.devnull, os.O_RDONLY) if listener is not None else -1
+
+        if listener is not None:
+            listener.setblocking(False)
+            self.epoll.register(listener.fileno(), select.EPOLLIN | select.EPOLLET)
+        if handoff is not None:
+            handoff.setblocking(False)
+            self.epoll.register(handoff.fileno(), select.EPOLLIN | select.EPOLLET)
+
+    # ----- Connection lifecycle -----
+
+    def _add(self, sock: socket.socket):
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = ETConnection(sock)
+        self.connections[conn.fd] = conn
+        self.epoll.register(conn.fd, EPOLL_FLAGS)
+        self.metrics.add('accepted')
+        self.metrics.set('active', len(self.connections))
+
+    def _close(self, conn: ETConnection):
+        if self.connections.pop(conn.fd, None) is None:
+            return
+        self.epoll.unregister(conn.fd)
+        conn.sock.close()
+        self.metrics.add('closed')
+        self.metrics.set('active', len(self.connections))
+
+    def _accept_all(self):
+        """Edge-triggered accept: loop until the backlog is empty.
+
+        Returning early on an error would leave connections queued with no
+        new edge to report them, so out of descriptors the spare fd is given
+        up to accept and close the head of the backlog, and any other error
+        re-arms the listener so the next poll tries again.
+        """
+        while self.accepting:
+            try:
+                sock, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE) and self.spare_fd >= 0:
+                    if self._shed():
+                        continue
+                    return  # Backlog empty: EMFILE is reported before the queue is checked
+                if e.errno == errno.ECONNABORTED:
+                    continue
+                self.epoll.modify(self.listener.fileno(), select.EPOLLIN | select.EPOLLET)
+                return
+            self._add(sock)
+
+    def _shed(self) -> bool:
+        """Out of descriptors: refuse one pending connection instead of stalling the listener"""
+        os.close(self.spare_fd)
+        self.spare_fd = -1
+        try:
+            sock, _ = self.listener.accept()
+        except OSError:
+            sock = None
+        if sock is not None:
+            sock.close()
+            self.metrics.add('shed')
+        try:
+            self.spare_fd = os.open(os.devnull, os.O_RDONLY)
+        except OSError:
+            pass  # Still exhausted: later errors fall back to re-arming
+        return sock is not None
+
+    def _receive_handoffs(self):
+        """Take sockets passed from the acceptor process"""
+        while True:
+            try:
+                _, fds, _, _ = socket.recv_fds(self.handoff, 1, 64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if not fds:
+                return  # Acceptor went away
+            for fd in fds:
+                self._add(socket.socket(fileno=fd))
+
+    # ----- I/O -----
+
+    def _flush(self, conn: ETConnection):
+        while conn.outbuf and conn.writable:
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except (BlockingIOError, InterruptedError):
+                conn.writable = False  # Wait for the next EPOLLOUT edge
+                return
+            except OSError:
+                self._close(conn)
+                return
+            del conn.outbuf[:sent]
+            self.metrics.add('bytes_out', sent)
+
+    def _read(self, conn: ETConnection):
+        """Read until EAGAIN, unless output backpressure pauses us"""
+        while conn.readable:
+            if len(conn.outbuf) > HIGH_WATER:
+                return  # Keep conn.readable set; resume once drained
+            try:
+                data = conn.sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                conn.readable = False
+                return
+            except OSError:
+                self._close(conn)
+                return
+            if not data:
+                self._close(conn)
+                return
+            self.metrics.add('bytes_in', len(data))
+            try:
+                frames = conn.decoder.feed(data)
+            except ValueError:
+                self._close(conn)
+                return
+            heartbeats = 0
+            for payload in frames:
+                if not payload:
+                    heartbeats += 1  # Zero-length heartbeat: keeps the connection alive, nothing to echo
+                    continue
+                reply = self.handler(payload)
+                if reply is not None:
+                    conn.outbuf += FRAME_HEADER.pack(len(reply))
+                    conn.outbuf += reply
+                    self.metrics.add('frames_out')
+            self.metrics.add('frames_in', len(frames) - heartbeats)
+            self._flush(conn)
+            if conn.fd not in self.connections:
+                return
+
+    def poll(self, timeout: float = 0.05):
+        for fd, events in self.epoll.poll(timeout):
+            if self.listener is not None and fd == self.listener.fileno():
+                self._accept_all()
+                continue
+            if self.handoff is not None and fd == self.handoff.fileno():
+                self._receive_handoffs()
+                continue
+            conn = self.connections.get(fd)
+            if conn is None:
+                continue
+            if events & select.EPOLLOUT:
+                conn.writable = True
+                self._flush(conn)
+                if conn.fd not in self.connections:
+                    continue
+                if conn.readable and len(conn.outbuf) < LOW_WATER:
+                    self._read(conn)  # Resume reads paused by backpressure
+            if events & (select.EPOLLIN | select.EPOLLRDHUP | select.EPOLLHUP | select.EPOLLERR):
+                conn.readable = True
+                self._read(conn)
+
+    # ----- Draining -----
+
+    def stop_accepting(self):
+        if not self.accepting:
+            return
+        if self.listener is not None:
+            # Take whatever is already queued: closing a listener resets its backlog
+            self._accept_all()
+        self.accepting = False
+        self.metrics.set('draining', 1)
+        if self.listener is not None:
+            self.epoll.unregister(self.listener.fileno())
+            self.listener.close()
+            self.listener = None
+
+    def drain(self, timeout: float):
+        """Serve existing connections until they close or timeout passes"""
+        self.stop_accepting()
+        deadline = time.monotonic() + timeout
+        while self.connections and time.monotonic() < deadline:
+            self.poll(0.05)
+        for conn in list(self.connections.values()):
+            if conn.outbuf:
+                conn.sock.setblocking(True)
+                conn.sock.settimeout(0.5)
+                try:
+                    conn.sock.sendall(conn.outbuf)
+                except OSError:
+                    pass
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._close(conn)
+
+    def close(self):
+        if self.spare_fd >= 0:
+            os.close(self.spare_fd)
+            self.spare_fd = -1
+        if self.listener is not None:
+            self.listener.close()
+        if self.handoff is not None:
+            self.handoff.close()
+        self.epoll.close()
+
+
+def make_reuseport_listener(host: str, port: int, backlog: int = 4096) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def _reactor_main(reactor_id, shared_metrics, drain_event, ready, host, port,
+                  handoff, drain_timeout):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Parent coordinates shutdown
+    listener = make_reuseport_listener(host, port) if handoff is None else None
+    reactor = Reactor(reactor_id, shared_metrics, listener=listener, handoff=handoff)
+    ready.release()
+    try:
+        while not drain_event.is_set():
+            reactor.poll(0.05)
+        reactor.drain(drain_timeout)
+    finally:
+        reactor.close()
+
+
+class MultiReactorServer:
+    """Spawn N reactor processes behind one TCP port"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 9999, reactors: int = None,
+                 mode: str = 'reuseport', drain_timeout: float = 5.0):
+        if mode == 'reuseport' and not hasattr(socket, 'SO_REUSEPORT'):
+            mode = 'acceptor'
+        self.host = host
+        self.port = port
+        self.num_reactors = reactors or os.cpu_count() or 1
+        self.mode = mode
+        self.drain_timeout = drain_timeout
+        self.shared_metrics = multiprocessing.Array('q', self.num_reactors * NUM_FIELDS, lock=False)
+        self.drain_event = multiprocessing.Event()
+        self.processes = []
+        self.acceptor = None
+        self.handoffs = []
+        self.next_handoff = 0
+
+    def start(self):
+        ready = multiprocessing.Semaphore(0)
+        if self.mode == 'reuseport':
+            if self.port == 0:
+                # Reserve a concrete port that every reactor can share. The
+                # probe never listens, so forked reactors inheriting it do
+                # not end up with a listener nobody accepts on.
+                probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                probe.bind((self.host, 0))
+                self.port = probe.getsockname()[1]
+                self.acceptor = probe  # Closed once the reactors are listening
+        else:
+            self.acceptor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.acceptor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.acceptor.bind((self.host, self.port))
+            self.acceptor.listen(4096)
+            self.port = self.acceptor.getsockname()[1]
+
+        for i in range(self.num_reactors):
+            child_end = None
+            if self.mode == 'acceptor':
+                parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self.handoffs.append(parent_end)
+            proc = multiprocessing.Process(
+                target=_reactor_main,
+                args=(i, self.shared_metrics, self.drain_event, ready, self.host, self.port,
+                      child_end, self.drain_timeout),
+                daemon=True,
+            )
+            proc.start()
+            if child_end is not None:
+                child_end.close()
+            self.processes.append(proc)
+        for _ in range(self.num_reactors):
+            ready.acquire()
+
+        if self.mode == 'reuseport' and self.acceptor is not None:
+            self.acceptor.close()
+            self.acceptor = None
+
+    def run_acceptor(self, timeout: float = 0.05):
+        """Accept pending connections and hand them out round-robin"""
+        if self.acceptor is None:
+            return
+        readable, _, _ = select.select([self.acceptor], [], [], timeout)
+        if not readable:
+            return
+        self.acceptor.setblocking(False)
+        while not self.drain_event.is_set():
+            try:
+                sock, _ = self.acceptor.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            target = self.handoffs[self.next_handoff]
+            self.next_handoff = (self.next_handoff + 1) % len(self.handoffs)
+            socket.send_fds(target, [b'c'], [sock.fileno()])
+            sock.close()  # The reactor holds its own duplicate
+
+    def serve_forever(self):
+        try:
+            while not self.drain_event.is_set():
+                if self.mode == 'acceptor':
+                    self.run_acceptor()
+                else:
+                    time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        self.drain()
+
+    def drain(self):
+        """Stop accepting everywhere and wait for reactors to finish draining"""
+        self.drain_event.set()
+        if self.acceptor is not None:
+            self.acceptor.close()
+            self.acceptor = None
+        for proc in self.processes:
+            proc.join(self.drain_timeout + 2)
+            if proc.is_alive():
+                proc.terminate()
+        for end in self.handoffs:
+            end.close()
+
+    def metrics(self) -> dict:
+        """Per-reactor counters plus totals from the shared array"""
+        snapshot = list(self.shared_metrics)
+        per_reactor = [
+            dict(zip(METRIC_FIELDS, snapshot[i * NUM_FIELDS:(i + 1) * NUM_FIELDS]))
+            for i in range(self.num_reactors)
+        ]
+        totals = {field: sum(r[field] for r in per_reactor) for field in METRIC_FIELDS}
+        return {'reactors': per_reactor, 'total': totals}
+
+
+def run_multi_reactor_server(host='0.0.0.0', port=9999, reactors=None, mode='reuseport'):
+    """Run the multi-reactor game server until Ctrl+C, then drain."""
+    server = MultiReactorServer(host, port, reactors, mode)
+    server.start()
+    print(f"Multi-reactor server ({server.num_reactors} reactors, {server.mode}) on {host}:{server.port}")
+    signal.signal(signal.SIGTERM, lambda *_: server.drain_event.set())
+    server.serve_forever()
+    totals = server.metrics()['total']
+    print(f"Drained: {totals['accepted']} accepted, {totals['frames_in']} frames in")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Multi-reactor TCP game server")
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--reactors', type=int, default=None)
+    parser.add_argument('--mode', choices=['reuseport', 'acceptor'], default='reuseport')
+    args = parser.parse_args()
+    run_multi_reactor_server(port=args.port, reactors=args.reactors, mode=args.mode)
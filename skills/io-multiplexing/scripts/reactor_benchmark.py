@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the multi-reactor TCP server.
+
+For each reactor count, starts MultiReactorServer, spreads client
+connections over several client processes (each a closed echo loop from
+frontend_benchmark) and reports connections/sec and messages/sec.
+
+Connections/sec is measured on the server side: from the first client
+connect() until the reactors' shared 'accepted' counter reaches the total.
+A client's blocking connect() returns once the kernel has queued the
+handshake, so timing it would measure the backlog, not the accept loop.
+
+Usage:
+    python reactor_benchmark.py --reactors 1 2 4 8 --connections 4000 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from frontend_benchmark import raise_fd_limit, run_clients
+from multi_reactor import MultiReactorServer
+
+
+def _client_worker(port, connections, duration, payload_size, results):
+    raise_fd_limit(connections + 64)
+    results.put(run_clients(port, connections, duration, payload_size))
+
+
+def run_scaling_point(reactors: int, connections: int, client_procs: int, duration: float,
+                      payload_size: int, mode: str) -> dict:
+    """Measure one reactor count."""
+    server = MultiReactorServer('127.0.0.1', 0, reactors=reactors, mode=mode, drain_timeout=1.0)
+    server.start()
+    acceptor = None
+    if server.mode == 'acceptor':
+        acceptor = multiprocessing.Process(target=server.serve_forever, daemon=True)
+        acceptor.start()
+
+    results = multiprocessing.Queue()
+    per_client = connections // client_procs
+    clients = [
+        multiprocessing.Process(target=_client_worker,
+                                args=(server.port, per_client, duration, payload_size, results))
+        for _ in range(client_procs)
+    ]
+    for proc in clients:
+        proc.start()
+    expected = per_client * client_procs
+    accept_deadline = time.time() + duration + 30
+    accepted_at = None
+    while time.time() < accept_deadline:
+        if server.metrics()['total']['accepted'] >= expected:
+            accepted_at = time.time()
+            break
+        time.sleep(0.001)
+    client_results = [results.get() for _ in clients]
+    for proc in clients:
+        proc.join()
+
+    metrics = server.metrics()
+    if acceptor is not None:
+        acceptor.terminate()
+        acceptor.join()
+    server.drain()
+
+    connect_started = min(r['connect_started_at'] for r in client_results)
+    accept_time = accepted_at - connect_started if accepted_at is not None else 0.0
+    elapsed = max(r['elapsed_s'] for r in client_results)
+    total_messages = sum(r['messages'] for r in client_results)
+    return {
+        'reactors': reactors,
+        'connections': per_client * client_procs,
+        'conns_per_sec': expected / accept_time if accept_time > 0 else 0.0,
+        'msgs_per_sec': total_messages / elapsed if elapsed else 0.0,
+        'p99_ms': max(r['p99_ms'] for r in client_results),
+        'per_reactor_accepted': [r['accepted'] for r in metrics['reactors']],
+    }
+
+
+def print_results(rows):
+    print("\n" + "=" * 78)
+    print("MULTI-REACTOR SCALING")
+    print("=" * 78)
+    print(f"{'Reactors':>8} | {'Conns/sec':>10} | {'Msgs/sec':>10} | {'Speedup':>7} | {'P99 ms':>8} | Accepted per reactor")
+    print("-" * 78)
+    base = rows[0]['msgs_per_sec'] or 1.0
+    for row in rows:
+        print(f"{row['reactors']:>8} | {row['conns_per_sec']:>10.0f} | {row['msgs_per_sec']:>10.0f} | "
+              f"{row['msgs_per_sec'] / base:>6.2f}x | {row['p99_ms']:>8.2f} | {row['per_reactor_accepted']}")
+    print("=" * 78)
+    print(f"CPU cores available: {os.cpu_count()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-reactor scaling benchmark")
+    parser.add_argument('--reactors', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--connections', type=int, default=4000)
+    parser.add_argument('--clients', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Client processes generating load")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--payload', type=int, default=32)
+    parser.add_argument('--mode', choices=['reuseport', 'acceptor'], default='reuseport')
+    args = parser.parse_args()
+
+    rows = [
+        run_scaling_point(n, args.connections, args.clients, args.duration, args.payload, args.mode)
+        for n in args.reactors
+    ]
+    print_results(rows)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Idle-timeout scheduling benchmark: full scan vs heap vs timer wheel.
+
+Simulates N connections on a 60 Hz server loop in virtual time. Each tick a
+fraction of connections sends a packet (bumping its last-activity time) and a
+small fraction goes permanently silent so idle timeouts actually fire.
+
+    full scan - check every connection's last-activity on every tick
+    heap      - heapq of deadlines, lazily re-armed when popped
+    wheel     - TimerWheel idle timers, lazily re-armed when fired
+
+Also measures raw schedule+cancel cost per timer for the heap (lazy
+deletion) and the wheel.
+
+Usage:
+    python timer_benchmark.py --connections 100000 --seconds 20
+"""
+import argparse
+import heapq
+import random
+import time
+
+from timer_wheel import TimerWheel
+
+TICK_DT = 1.0 / 60
+
+
+def make_workload(connections: int, ticks: int, active_fraction: float, silent_fraction: float, seed: int = 7):
+    """Per-tick lists of connection ids that send a packet."""
+    rng = random.Random(seed)
+    silent = set(rng.sample(range(connections), int(connections * silent_fraction)))
+    talkers = [c for c in range(connections) if c not in silent]
+    per_tick = max(1, int(connections * active_fraction))
+    return [rng.sample(talkers, min(per_tick, len(talkers))) for _ in range(ticks)]
+
+
+def initial_activity(connections: int, idle_timeout: float, seed: int = 11):
+    """Stagger last-activity times so deadlines are spread, as on a live server."""
+    rng = random.Random(seed)
+    return {c: -rng.uniform(0, idle_timeout) for c in range(connections)}
+
+
+def run_full_scan(connections: int, workload, idle_timeout: float):
+    last = initial_activity(connections, idle_timeout)
+    tick_times = []
+    expired = 0
+    now = 0.0
+    for active in workload:
+        now += TICK_DT
+        start = time.perf_counter()
+        for c in active:
+            if c in last:
+                last[c] = now
+        dead = [c for c, t in last.items() if now - t >= idle_timeout]
+        for c in dead:
+            del last[c]
+        expired += len(dead)
+        tick_times.append(time.perf_counter() - start)
+    return tick_times, expired
+
+
+def run_heap(connections: int, workload, idle_timeout: float):
+    last = initial_activity(connections, idle_timeout)
+    heap = [(last[c] + idle_timeout, c) for c in range(connections)]
+    heapq.heapify(heap)
+    tick_times = []
+    expired = 0
+    now = 0.0
+    for active in workload:
+        now += TICK_DT
+        start = time.perf_counter()
+        for c in active:
+            if c in last:
+                last[c] = now
+        while heap and heap[0][0] <= now:
+            _, c = heapq.heappop(heap)
+            idle = now - last[c]
+            if idle < idle_timeout:
+                heapq.heappush(heap, (now + idle_timeout - idle, c))
+            else:
+                del last[c]
+                expired += 1
+        tick_times.append(time.perf_counter() - start)
+    return tick_times, expired
+
+
+def run_wheel(connections: int, workload, idle_timeout: float):
+    last = initial_activity(connections, idle_timeout)
+    # 1024 level-0 slots cover 17s at 60 Hz, so idle timers never cascade
+    wheel = TimerWheel(tick=TICK_DT, wheel_bits=10, now=0.0)
+    state = {'now': 0.0, 'expired': 0}
+    timers = {}
+
+    def on_idle(c):
+        idle = state['now'] - last[c]
+        if idle < idle_timeout:
+            wheel.reschedule(timers[c], idle_timeout - idle)
+        else:
+            del last[c]
+            del timers[c]
+            state['expired'] += 1
+
+    for c in range(connections):
+        timers[c] = wheel.schedule(last[c] + idle_timeout, on_idle, c)
+
+    tick_times = []
+    now = 0.0
+    for active in workload:
+        now += TICK_DT
+        state['now'] = now
+        start = time.perf_counter()
+        for c in active:
+            if c in last:
+                last[c] = now
+        wheel.advance(now + TICK_DT / 2)
+        tick_times.append(time.perf_counter() - start)
+    return tick_times, state['expired']
+
+
+def bench_schedule_cancel(count: int):
+    """ns per schedule and per cancel at a given number of live timers"""
+    rng = random.Random(1)
+    delays = [rng.uniform(1, 60) for _ in range(count)]
+
+    wheel = TimerWheel(tick=0.01, now=0.0)
+    noop = lambda: None  # noqa: E731
+    start = time.perf_counter_ns()
+    handles = [wheel.schedule(d, noop) for d in delays]
+    wheel_schedule = (time.perf_counter_ns() - start) / count
+    start = time.perf_counter_ns()
+    for h in handles:
+        wheel.cancel(h)
+    wheel_cancel = (time.perf_counter_ns() - start) / count
+
+    heap = []
+    cancelled = set()
+    start = time.perf_counter_ns()
+    for i, d in enumerate(delays):
+        heapq.heappush(heap, (d, i))
+    heap_schedule = (time.perf_counter_ns() - start) / count
+    start = time.perf_counter_ns()
+    for i in range(count):
+        cancelled.add(i)  # Lazy deletion; the entry stays until popped
+    heap_cancel = (time.perf_counter_ns() - start) / count
+
+    return {
+        'wheel_schedule_ns': wheel_schedule, 'wheel_cancel_ns': wheel_cancel,
+        'heap_schedule_ns': heap_schedule, 'heap_cancel_ns': heap_cancel,
+    }
+
+
+def summarize(tick_times):
+    ordered = sorted(tick_times)
+    return {
+        'avg_ms': sum(ordered) / len(ordered) * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'total_s': sum(ordered),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timer scheduling benchmark")
+    parser.add_argument('--connections', type=int, default=100000)
+    parser.add_argument('--seconds', type=float, default=20.0, help="Simulated server time")
+    parser.add_argument('--idle-timeout', type=float, default=5.0)
+    parser.add_argument('--active', type=float, default=0.02, help="Fraction sending each tick")
+    parser.add_argument('--silent', type=float, default=0.05, help="Fraction that goes silent")
+    args = parser.parse_args()
+
+    ticks = int(args.seconds / TICK_DT)
+    print(f"Building workload: {args.connections} connections, {ticks} ticks...")
+    workload = make_workload(args.connections, ticks, args.active, args.silent)
+
+    print("\n" + "=" * 70)
+    print(f"IDLE TIMEOUT MAINTENANCE ({args.connections} connections, 60 Hz)")
+    print("=" * 70)
+    print(f"{'Strategy':12} | {'Avg/tick':>10} | {'P99/tick':>10} | {'Max/tick':>10} | {'Expired':>8}")
+    print("-" * 70)
+    for name, runner in (('full scan', run_full_scan), ('heap', run_heap), ('wheel', run_wheel)):
+        tick_times, expired = runner(args.connections, workload, args.idle_timeout)
+        stats = summarize(tick_times)
+        print(f"{name:12} | {stats['avg_ms']:8.3f}ms | {stats['p99_ms']:8.3f}ms | "
+              f"{stats['max_ms']:8.3f}ms | {expired:>8}")
+
+    costs = bench_schedule_cancel(args.connections)
+    print("\n" + "=" * 70)
+    print(f"SCHEDULE / CANCEL COST ({args.connections} live timers)")
+    print("=" * 70)
+    print(f"Wheel:  schedule {costs['wheel_schedule_ns']:7.0f} ns   cancel {costs['wheel_cancel_ns']:7.0f} ns")
+    print(f"Heap:   schedule {costs['heap_schedule_ns']:7.0f} ns   cancel {costs['heap_cancel_ns']:7.0f} ns (lazy)")
+    print("=" * 70)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Hierarchical timer wheel for connection timeouts, heartbeats and retransmits.
+
+schedule() and cancel() are O(1): a timer lives in a dict keyed by itself
+inside one wheel slot. Level 0 covers wheel_size ticks; each higher level
+covers wheel_size times more, and its slots are cascaded down into finer
+levels as time reaches them (Varghese & Lauck scheme 7).
+
+Size level 0 (tick * 2**wheel_bits) to cover the common timeouts: timers
+that fit there never cascade, which avoids a burst of re-insertions each time
+a higher-level slot comes due.
+
+Typical use is the lazy-reset pattern: keep a last-activity timestamp on the
+connection and let the idle timer re-arm itself for the remaining time when
+it fires, instead of cancelling and re-scheduling on every packet.
+"""
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class Timer:
+    """Handle returned by TimerWheel.schedule()"""
+
+    __slots__ = ('deadline', 'callback', 'args', 'slot')
+
+    def __init__(self, deadline: int, callback: Callable, args: tuple):
+        self.deadline = deadline  # Absolute tick
+        self.callback = callback
+        self.args = args
+        self.slot: Optional[Dict] = None  # Slot dict holding this timer, None once fired/cancelled
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+
+class TimerWheel:
+    """Hashed hierarchical timing wheel with O(1) schedule and cancel"""
+
+    def __init__(self, tick: float = 0.01, wheel_bits: int = 8, levels: int = 4,
+                 now: Optional[float] = None):
+        self.tick = tick
+        self.wheel_bits = wheel_bits
+        self.wheel_size = 1 << wheel_bits
+        self.mask = self.wheel_size - 1
+        self.levels = levels
+        self.wheels: List[List[Dict[Timer, None]]] = [
+            [{} for _ in range(self.wheel_size)] for _ in range(levels)
+        ]
+        self.origin = time.monotonic() if now is None else now
+        self.current_tick = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _ticks_at(self, when: float) -> int:
+        return int((when - self.origin) / self.tick)
+
+    def _insert(self, timer: Timer):
+        delta = timer.deadline - self.current_tick
+        if delta < 0:
+            delta = 1  # Overdue: fire on the next tick
+            timer.deadline = self.current_tick + 1
+        level = (delta.bit_length() - 1) // self.wheel_bits if delta else 0
+        if level >= self.levels:
+            level = self.levels - 1
+        slot = self.wheels[level][(timer.deadline >> (self.wheel_bits * level)) & self.mask]
+        slot[timer] = None
+        timer.slot = slot
+
+    def _delay_ticks(self, delay: float) -> int:
+        # Round up, tolerating float error so 5.0 / (1/60) is 300 ticks, not 301
+        ticks = int(delay / self.tick + 0.999999)
+        return ticks if ticks > 0 else 1
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        """Call callback(*args) after delay seconds (rounded up to the tick)"""
+        timer = Timer(self.current_tick + self._delay_ticks(delay), callback, args)
+        self._insert(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """Cancel a pending timer; returns False if it already fired"""
+        slot = timer.slot
+        if slot is None:
+            return False
+        del slot[timer]
+        timer.slot = None
+        self.count -= 1
+        return True
+
+    def reschedule(self, timer: Timer, delay: float) -> Timer:
+        """Move a timer (pending or not) to fire delay seconds from now"""
+        self.cancel(timer)
+        timer.deadline = self.current_tick + self._delay_ticks(delay)
+        self._insert(timer)
+        self.count += 1
+        return timer
+
+    def _cascade(self, level: int):
+        """Redistribute the current slot of a higher level into lower ones"""
+        index = (self.current_tick >> (self.wheel_bits * level)) & self.mask
+        slot = self.wheels[level][index]
+        if not slot:
+            return
+        self.wheels[level][index] = {}
+        for timer in slot:
+            self._insert(timer)
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Run every timer due at or before now; returns how many fired"""
+        target = self._ticks_at(time.monotonic() if now is None else now)
+        fired = 0
+        while self.current_tick < target:
+            if not self.count:
+                self.current_tick = target  # Nothing pending: jump ahead
+                break
+            self.current_tick += 1
+            tick = self.current_tick
+            # Cascade each level whose lower levels just wrapped around
+            level = 1
+            while level < self.levels and not (tick & ((1 << (self.wheel_bits * level)) - 1)):
+                self._cascade(level)
+                level += 1
+
+            index = tick & self.mask
+            slot = self.wheels[0][index]
+            if not slot:
+                continue
+            self.wheels[0][index] = {}
+            for timer in list(slot):
+                if timer.slot is not slot:
+                    continue  # Cancelled by an earlier callback in this slot
+                if timer.deadline > tick:
+                    self._insert(timer)  # Clamped to max range; not due yet
+                    continue
+                timer.slot = None
+                self.count -= 1
+                fired += 1
+                timer.callback(*timer.args)
+        return fired
+
+    def now(self) -> float:
+        """Wheel time of the last processed tick"""
+        return self.origin + self.current_tick * self.tick
+
+
+if __name__ == "__main__":
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+    for i in range(5):
+        wheel.schedule(0.05 * (i + 1), fired.append, i)
+    cancelled = wheel.schedule(0.12, fired.append, 'cancelled')
+    wheel.cancel(cancelled)
+
+    start = time.monotonic()
+    while len(wheel):
+        wheel.advance()
+        time.sleep(0.005)
+    print(f"Fired {fired} in {time.monotonic() - start:.3f}s")
@@ -1,51 +1,290 @@
 #!/usr/bin/env python3
-"""Message queue benchmark for game server events."""
+"""Message queue benchmark for game server events.
+
+    sync mode  - publish everything, then drain: raw queue throughput
+    async mode - N producers and M batching consumers on a bounded
+                 asyncio.Queue; producers await when it is full, and each
+                 event's publish-to-processed latency goes into a histogram
+"""
+import argparse
 import asyncio
+import json
+import os
+import sys
 import time
+from array import array
 from collections import deque
 
+from event_bus import EventBus, PLAYER_MOVE, REJECT
+from event_log import EventLog
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'databases', 'scripts'))
+from load_generator import LatencyHistogram  # noqa: E402
+
 class GameEventQueue:
-    """Simple in-memory event queue for benchmarking."""
+    """Simple in-memory event queue (one dict per event) used as the baseline.
+
+    Pass an EventLog to also persist every accepted event; the log's fsync
+    policy decides when it becomes durable, and commit() forces it either way.
+    """
 
-    def __init__(self):
-        self.queue = deque(maxlen=100000)
+    def __init__(self, maxlen: int = 100000, log: EventLog = None):
+        self.queue = deque()
+        self.maxlen = maxlen
+        self.log = log
         self.processed = 0
+        self.rejected = 0
+        self.resume_offset = None  # Set by recover() when the queue filled up first
 
-    def publish(self, event: dict):
-        """Publish event to queue."""
+    def publish(self, event: dict) -> bool:
+        """Publish event to queue; refuses (and counts) events once full."""
+        if len(self.queue) >= self.maxlen:
+            self.rejected += 1
+            return False
         self.queue.append(event)
+        if self.log is not None:
+            self.log.append(json.dumps(event).encode())
+        return True
 
-    def consume(self) -> dict:
-        """Consume event from queue."""
+    def commit(self):
+        """Make every published event durable (no-op without a log)."""
+        if self.log is not None:
+            self.log.commit()
+
+    def recover(self, offset: int = 0) -> int:
+        """Reload events from the log starting at offset, e.g. after a crash.
+
+        Stops once the queue holds maxlen events, like publish(); resume_offset
+        is then the first offset not reloaded (None when the log was replayed
+        to the end).
+        """
+        restored = 0
+        self.resume_offset = None
+        if self.log is None:
+            return restored
+        while records := self.log.read(offset, 4096):
+            for offset, _, value in records:
+                if len(self.queue) >= self.maxlen:
+                    self.resume_offset = offset
+                    return restored
+                self.queue.append(json.loads(value))
+                restored += 1
+            offset += 1
+        return restored
+
+    def consume(self):
+        """Consume event from queue, None if empty."""
         if self.queue:
             self.processed += 1
             return self.queue.popleft()
         return None
 
-async def benchmark(events: int = 100000):
-    """Benchmark queue throughput."""
+def benchmark_dict_queue(events: int) -> dict:
+    """Publish then drain one dict per event, in rounds that fit the queue."""
     queue = GameEventQueue()
+    publish_time = consume_time = 0.0
+    checksum = 0.0
+    sent = 0
+    while sent < events:
+        n = min(queue.maxlen, events - sent)
+        start = time.perf_counter()
+        for i in range(sent, sent + n):
+            queue.publish({
+                "type": "player_move",
+                "player_id": i % 100,
+                "x": i * 0.1,
+                "y": i * 0.2
+            })
+        publish_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        while (event := queue.consume()) is not None:
+            checksum += event["x"]
+        consume_time += time.perf_counter() - start
+        sent += n
+    return {"name": "dict deque", "events": queue.processed, "publish_s": publish_time,
+            "consume_s": consume_time, "rejected": queue.rejected, "checksum": checksum}
 
-    # Publish events
-    start = time.time()
-    for i in range(events):
-        queue.publish({
-            "type": "player_move",
-            "player_id": i % 100,
-            "x": i * 0.1,
-            "y": i * 0.2
+def make_batches(events: int, batch_size: int) -> list:
+    """Pre-decoded columnar batches, as they would arrive from the network layer."""
+    batches = []
+    for base in range(0, events, batch_size):
+        idx = range(base, min(events, base + batch_size))
+        batches.append({
+            "player_id": array('I', [i % 100 for i in idx]),
+            "x": array('d', [i * 0.1 for i in idx]),
+            "y": array('d', [i * 0.2 for i in idx]),
         })
-    publish_time = time.time() - start
+    return batches
+
+def benchmark_event_bus(events: int, subscribers: int = 1, batch_size: int = 1024,
+                        capacity: int = 1 << 16) -> dict:
+    """Publish columnar batches and drain every subscriber after each publish round."""
+    bus = EventBus()
+    bus.create_topic("moves", PLAYER_MOVE, capacity=capacity, policy=REJECT)
+    subs = [bus.subscribe("moves") for _ in range(subscribers)]
+    batches = make_batches(events, batch_size)
+    publish_time = consume_time = 0.0
+    checksum = 0.0
+    pending = list(batches)
+    offset = 0
+    while pending:
+        start = time.perf_counter()
+        while pending:
+            batch = pending[0]
+            count = len(batch["x"]) - offset
+            view = {f: memoryview(col)[offset:] for f, col in batch.items()}
+            accepted = bus.publish_batch("moves", view, count)
+            if accepted < count:  # Backpressure: ring full, drain before retrying
+                offset += accepted
+                break
+            pending.pop(0)
+            offset = 0
+        publish_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for sub in subs:
+            while (got := bus.consume_batch(sub, batch_size * 4)) is not None:
+                checksum += sum(got["x"])
+        consume_time += time.perf_counter() - start
+    return {"name": f"event bus x{subscribers}", "events": sum(s.consumed for s in subs),
+            "publish_s": publish_time, "consume_s": consume_time,
+            # Refused publishes are retried after a drain; only events no subscriber got are lost
+            "rejected": events - min(s.consumed for s in subs),
+            "retried": bus.topics["moves"].rejected, "checksum": checksum}
+
+async def _producer(queue: asyncio.Queue, events: int, batch: int, rate: float, stats: dict,
+                    put_lock: asyncio.Lock):
+    """Publish `events` events in bursts of `batch`, paced to `rate` events/sec (0 = flat out).
+
+    asyncio.Queue.put() lets any caller that finds a free slot take it ahead
+    of a parked putter, so a producer that has to wait queues on put_lock
+    (FIFO) and so does every put issued while anyone is waiting there; only
+    uncontended puts skip it.
+    """
+    clock = time.perf_counter_ns
+    interval = batch / rate if rate else 0.0
+    next_burst = time.perf_counter()
+    sent = 0
+    while sent < events:
+        for _ in range(min(batch, events - sent)):
+            start = clock()
+            if queue.full() or put_lock.locked():
+                async with put_lock:
+                    await queue.put((start, sent % 100, sent * 0.1, sent * 0.2))
+                stats["blocked_puts"] += 1
+            else:
+                await queue.put((start, sent % 100, sent * 0.1, sent * 0.2))  # Free slot: returns at once
+            stats["blocked_ns"] += clock() - start
+            sent += 1
+        stats["max_depth"] = max(stats["max_depth"], queue.qsize())
+        if interval:
+            next_burst += interval
+            await asyncio.sleep(max(0.0, next_burst - time.perf_counter()))
+        else:
+            await asyncio.sleep(0)
+
+async def _consumer(queue: asyncio.Queue, batch: int, work_ns: int, hist: LatencyHistogram, stats: dict):
+    """Drain up to `batch` events per wakeup; `work_ns` of simulated handling per event."""
+    clock = time.perf_counter_ns
+    while True:
+        first = await queue.get()
+        if first is None:
+            return
+        events = [first]
+        while len(events) < batch and not queue.empty():
+            event = queue.get_nowait()
+            if event is None:
+                queue.put_nowait(None)  # Leave the stop marker for the next wakeup
+                break
+            events.append(event)
+        for published, player_id, x, y in events:
+            if work_ns:
+                deadline = clock() + work_ns
+                while clock() < deadline:
+                    pass
+            stats["checksum"] += x
+            hist.record(clock() - published)
+        stats["consumed"] += len(events)
+        stats["batches"] += 1
+        await asyncio.sleep(0)
+
+async def benchmark_async(events: int = 100000, producers: int = 4, consumers: int = 2,
+                          capacity: int = 4096, batch: int = 256, rate: float = 0.0,
+                          work_us: float = 0.0) -> dict:
+    """Concurrent producer/consumer pipeline over a bounded asyncio.Queue."""
+    queue = asyncio.Queue(maxsize=capacity)
+    hist = LatencyHistogram()
+    stats = {"blocked_ns": 0, "blocked_puts": 0, "max_depth": 0,
+             "consumed": 0, "batches": 0, "checksum": 0.0}
+    per_producer = events // producers
+    start = time.perf_counter()
+    workers = [asyncio.create_task(_consumer(queue, batch, int(work_us * 1000), hist, stats))
+               for _ in range(consumers)]
+    put_lock = asyncio.Lock()
+    await asyncio.gather(*(_producer(queue, per_producer, batch, rate / producers, stats, put_lock)
+                           for _ in range(producers)))
+    for _ in range(consumers):
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - start
+    return {
+        "events": stats["consumed"],
+        "elapsed_s": elapsed,
+        "throughput": stats["consumed"] / elapsed,
+        "avg_batch": stats["consumed"] / max(1, stats["batches"]),
+        "blocked_puts": stats["blocked_puts"],
+        "blocked_s": stats["blocked_ns"] / 1e9,
+        "max_depth": stats["max_depth"],
+        "p50_us": hist.percentile(50) / 1000,
+        "p99_us": hist.percentile(99) / 1000,
+        "p999_us": hist.percentile(99.9) / 1000,
+        "max_us": hist.max / 1000,
+        "mean_us": hist.mean() / 1000,
+    }
+
+def print_async_result(r: dict, label: str):
+    print(f"{label:28} | {r['throughput']:>10,.0f} ev/s | batch {r['avg_batch']:6.1f} | "
+          f"depth {r['max_depth']:>5} | blocked {r['blocked_puts']:>6} ({r['blocked_s']:5.2f}s) | "
+          f"p50 {r['p50_us']:>8.0f} µs  p99 {r['p99_us']:>8.0f} µs  p99.9 {r['p999_us']:>8.0f} µs  "
+          f"max {r['max_us']:>8.0f} µs")
+
+def print_result(r: dict, events: int):
+    total = r["publish_s"] + r["consume_s"]
+    print(f"{r['name']:16} | {r['events']:>9} | {r['publish_s']:7.3f}s | {r['consume_s']:7.3f}s | "
+          f"{events / total:>12,.0f} ev/s | {r['rejected']:>8}")
 
-    # Consume events
-    start = time.time()
-    while queue.consume():
-        pass
-    consume_time = time.time() - start
+def benchmark(events: int = 100000, batch_size: int = 1024):
+    """Benchmark queue throughput: dict-per-event deque vs columnar event bus."""
+    print(f"{'Queue':16} | {'Consumed':>9} | {'Publish':>8} | {'Consume':>8} | {'Throughput':>15} | {'Dropped':>8}")
+    print("-" * 80)
+    print_result(benchmark_dict_queue(events), events)
+    for subscribers in (1, 4):
+        print_result(benchmark_event_bus(events, subscribers, batch_size), events)
 
-    print(f"Published {events} events in {publish_time:.3f}s")
-    print(f"Consumed {queue.processed} events in {consume_time:.3f}s")
-    print(f"Throughput: {events/(publish_time+consume_time):.0f} events/sec")
+async def main(args):
+    if args.mode in ("sync", "both"):
+        benchmark(args.events, args.batch)
+    if args.mode in ("async", "both"):
+        print(f"\nasync pipeline: {args.producers} producers, {args.consumers} consumers, "
+              f"capacity {args.capacity}, {args.events} events")
+        scenarios = [("flat out", args.rate, 0.0), ("consumers at work", args.rate, args.work_us)]
+        for label, rate, work_us in scenarios:
+            r = await benchmark_async(args.events, args.producers, args.consumers, args.capacity,
+                                      args.consumer_batch, rate, work_us)
+            print_async_result(r, f"{label} ({work_us:g} µs/ev)")
 
 if __name__ == "__main__":
-    asyncio.run(benchmark())
+    parser = argparse.ArgumentParser(description="Game event queue benchmark")
+    parser.add_argument('--mode', choices=["sync", "async", "both"], default="both")
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=1024, help="Publish batch size (sync mode)")
+    parser.add_argument('--producers', type=int, default=4)
+    parser.add_argument('--consumers', type=int, default=2)
+    parser.add_argument('--capacity', type=int, default=4096, help="Bounded queue size (async mode)")
+    parser.add_argument('--consumer-batch', type=int, default=256)
+    parser.add_argument('--rate', type=float, default=0.0, help="Total publish rate, events/sec (0 = flat out)")
+    parser.add_argument('--work-us', type=float, default=2.0, help="Simulated handling cost per event")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Hot-path instrumentation: counters, gauges and timers cheap enough for the game loop.
+
+Every metric keeps one shard per thread. A thread only ever writes its own
+shard (no lock on the hot path); collect() sums the shards when scraped.
+
+    REGISTRY = MetricsRegistry()
+    packets = REGISTRY.counter('packets_received_total', kind='udp')
+    packets.inc()                             # a few plain increments' worth
+    cell = packets.shard(); cell.value += 1   # tightest loops: same as a plain += 1
+
+    tick = REGISTRY.timer('tick_seconds')
+    with tick.time():
+        run_tick()
+
+    @REGISTRY.timed('matchmaking_seconds')
+    def find_match(...): ...
+
+MetricsRegistry(enabled=False) (or GAME_METRICS=off in the environment)
+hands out shared no-op metrics and leaves @timed functions unwrapped, so
+disabled instrumentation costs one empty method call or nothing at all.
+
+Usage:
+    python instrumentation.py            # ns-per-operation microbenchmark
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from timeseries import LogHistogram
+
+OVERFLOW = "__overflow__"  # Label value shared by series created past a metric's cardinality limit
+
+class _Cell:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+class _Sharded:
+    """Per-thread cells created on first use from each thread."""
+    cell_type = _Cell
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...]):
+        self.name = name
+        self.labels = labels
+        self._local = threading.local()
+        self._cells: List = []
+        self._lock = threading.Lock()  # Only taken when a thread creates its cell
+
+    def shard(self):
+        """This thread's cell; cache it in hot loops and bump `.value` directly."""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self.cell_type()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def inc(self, amount: int = 1):
+        try:
+            self._local.cell.value += amount
+        except AttributeError:
+            self.shard().value += amount
+
+    def value(self):
+        return sum(cell.value for cell in self._cells)
+
+class Gauge(_Sharded):
+    """inc/dec are sharded; set() replaces the total; set_function() samples on scrape."""
+    kind = 'gauge'
+
+    def __init__(self, name, labels):
+        super().__init__(name, labels)
+        self._base = 0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1):
+        try:
+            self._local.cell.value += amount
+        except AttributeError:
+            self.shard().value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self._base = value - sum(cell.value for cell in self._cells)
+
+    def set_function(self, func: Callable[[], float]):
+        self._function = func
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._base + sum(cell.value for cell in self._cells)
+
+class _TimerContext:
+    __slots__ = ('cell', 'start')
+
+    def __init__(self, cell):
+        self.cell = cell
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.cell.add(time.perf_counter_ns() - self.start)
+
+class Timer(_Sharded):
+    """Durations (ns) in a per-thread timeseries.LogHistogram; value() merges them."""
+    kind = 'timer'
+    cell_type = LogHistogram
+
+    def observe_ns(self, ns: int):
+        try:
+            self._local.cell.add(ns)
+        except AttributeError:
+            self.shard().add(ns)
+
+    def observe(self, seconds: float):
+        self.observe_ns(int(seconds * 1e9))
+
+    def time(self) -> _TimerContext:
+        """Context manager timing its block."""
+        return _TimerContext(self.shard())
+
+    def value(self) -> Dict[str, float]:
+        """count, sum and max in seconds, plus p50/p90/p99."""
+        merged = LogHistogram()
+        for cell in list(self._cells):
+            merged.merge(cell)
+        out = {'count': merged.count, 'sum': merged.sum / 1e9, 'max': max(merged.max, 0) / 1e9}
+        for q in (50, 90, 99):
+            out[f'p{q}'] = merged.quantile(q / 100) / 1e9
+        return out
+
+class _NoopMetric:
+    """Shared stand-in for every metric when instrumentation is disabled."""
+    kind = 'noop'
+    name = ''
+    labels = ()
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, func):
+        pass
+
+    def observe(self, seconds):
+        pass
+
+    def observe_ns(self, ns):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def shard(self):
+        return _Cell()  # Writes go nowhere
+
+    def value(self):
+        return 0
+
+NOOP = _NoopMetric()
+
+class MetricsRegistry:
+    """Creates and caches metrics by (name, labels); collect() reads them all.
+
+    Each metric name may have at most max_series label sets. Past that, new
+    label sets share one series whose label values are all OVERFLOW, and
+    overflowed[name] counts lookups folded into it; remove() frees a slot
+    (e.g. when a match ends).
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_series: int = 10000):
+        if enabled is None:
+            enabled = os.environ.get('GAME_METRICS', 'on').lower() not in ('0', 'off', 'false')
+        self.enabled = enabled
+        self.max_series = max_series
+        self.metrics: Dict[Tuple[str, Tuple], _Sharded] = {}
+        self.help: Dict[str, str] = {}
+        self.series_count: Dict[str, int] = {}
+        self.overflowed: Dict[str, int] = {}
+        self.version = 0  # Bumped whenever a series is added or removed
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, labels: Dict[str, str]):
+        if not self.enabled:
+            return NOOP
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    if key[1] and self.series_count.get(name, 0) >= self.max_series:
+                        self.overflowed[name] = self.overflowed.get(name, 0) + 1
+                        key = (name, tuple((k, OVERFLOW) for k, _ in key[1]))
+                        metric = self.metrics.get(key)
+                    if metric is None:
+                        metric = cls(name, key[1])
+                        self.metrics[key] = metric
+                        self.version += 1
+                        if OVERFLOW not in (v for _, v in key[1]):
+                            self.series_count[name] = self.series_count.get(name, 0) + 1
+                    if help:
+                        self.help[name] = help
+        if not isinstance(metric, cls):
+            raise TypeError(f"Metric {name!r} already registered as a {metric.kind}")
+        return metric
+
+    def remove(self, name: str, **labels):
+        """Drop one series; its values are gone from the next scrape."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            if self.metrics.pop(key, None) is not None:
+                self.version += 1
+                if OVERFLOW not in (v for _, v in key[1]):  # The overflow series never took a slot
+                    self.series_count[name] -= 1
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def timer(self, name: str, help: str = "", **labels) -> Timer:
+        return self._get(Timer, name, help, labels)
+
+    def timed(self, name: str, help: str = "", **labels):
+        """Decorator: time every call of the function (unwrapped when disabled)."""
+        def decorate(func):
+            if not self.enabled:
+                return func
+            timer = self.timer(name, help, **labels)
+            clock = time.perf_counter_ns
+
+            def wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timer.observe_ns(clock() - start)
+            wrapper.__name__ = func.__name__
+            wrapper.__qualname__ = func.__qualname__
+            wrapper.__doc__ = func.__doc__
+            wrapper.__wrapped__ = func
+            return wrapper
+        return decorate
+
+    def collect(self) -> List[Tuple[str, str, Tuple, object]]:
+        """(name, kind, labels, value) for every metric; shards are merged here."""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return [(m.name, m.kind, m.labels, m.value()) for m in metrics]
+
+class InstrumentationSource:
+    """metrics_sources adapter: flattens a registry into the monitor's sample dict."""
+    name = "instrumentation"
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def sample(self) -> Dict[str, float]:
+        out = {}
+        for name, kind, labels, value in self.registry.collect():
+            key = name + ''.join(f"_{v}" for _, v in labels)
+            if kind == 'timer':
+                out[key + '_count'] = value['count']
+                out[key + '_p99'] = value['p99']
+            else:
+                out[key] = value
+        return out
+
+REGISTRY = MetricsRegistry()
+
+# ----- Microbenchmark -----
+
+def _ns_per_op(func: Callable[[int], None], ops: int) -> float:
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        func(ops)
+        best = min(best, (time.perf_counter_ns() - start) / ops)
+    return best
+
+def run_microbenchmark(ops: int = 200000, threads: int = 4) -> Dict[str, float]:
+    on = MetricsRegistry(enabled=True)
+    off = MetricsRegistry(enabled=False)
+    counter, noop = on.counter('bench_total'), off.counter('bench_total')
+    timer, noop_timer = on.timer('bench_seconds'), off.timer('bench_seconds')
+    gauge = on.gauge('bench_gauge')
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def plain_int(n):
+        box = [0]
+        for _ in range(n):
+            box[0] += 1
+
+    def counter_inc(n):
+        inc = counter.inc
+        for _ in range(n):
+            inc()
+
+    def shard_inc(n):
+        cell = counter.shard()
+        for _ in range(n):
+            cell.value += 1
+
+    def noop_inc(n):
+        inc = noop.inc
+        for _ in range(n):
+            inc()
+
+    def gauge_inc(n):
+        inc = gauge.inc
+        for _ in range(n):
+            inc()
+
+    def timer_ctx(n):
+        t = timer.time
+        for _ in range(n):
+            with t():
+                pass
+
+    def noop_ctx(n):
+        t = noop_timer.time
+        for _ in range(n):
+            with t():
+                pass
+
+    def work():
+        return None
+
+    timed_work = on.timed('bench_timed_seconds')(work)
+    untimed_work = off.timed('bench_timed_seconds')(work)
+
+    def call_timed(n):
+        for _ in range(n):
+            timed_work()
+
+    def call_plain(n):
+        for _ in range(n):
+            untimed_work()
+
+    loop = _ns_per_op(empty, ops)
+    results = {name: _ns_per_op(func, ops) - loop for name, func in (
+        ('plain list[0] += 1', plain_int), ('Counter.inc()', counter_inc), ('shard().value += 1', shard_inc),
+        ('Gauge.inc()', gauge_inc), ('disabled Counter.inc()', noop_inc), ('Timer.time() block', timer_ctx),
+        ('disabled Timer.time() block', noop_ctx), ('plain function call', call_plain),
+        ('@timed function call', call_timed))}
+
+    # Correctness under threads: every increment lands, no locks on the hot path
+    shared = on.counter('threaded_total')
+
+    def hammer():
+        inc = shared.inc
+        for _ in range(ops):
+            inc()
+    workers = [threading.Thread(target=hammer) for _ in range(threads)]
+    start = time.perf_counter_ns()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    results[f'{threads} threads Counter.inc()'] = (time.perf_counter_ns() - start) / (ops * threads)
+    assert shared.value() == ops * threads, shared.value()
+    start = time.perf_counter_ns()
+    on.collect()
+    results['collect() scrape (us)'] = (time.perf_counter_ns() - start) / 1000
+    return results
+
+if __name__ == "__main__":
+    results = run_microbenchmark()
+    print("\n" + "=" * 60)
+    print("INSTRUMENTATION OVERHEAD (ns per operation, loop cost removed)")
+    print("=" * 60)
+    for name, ns in results.items():
+        unit = "us" if name.endswith("(us)") else "ns"
+        print(f"  {name.replace(' (us)', ''):32} {ns:8.1f} {unit}")
+    print("=" * 60)
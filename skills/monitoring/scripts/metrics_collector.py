@@ -1,15 +1,32 @@
 #!/usr/bin/env python3
 """
 Game Server Metrics Collection & Monitoring
-Demonstrates key metrics for production game servers
+Collects key metrics for production game servers from the running process:
+CPU/RSS from /proc/self, GC pauses from gc.callbacks, tick rate and latency
+from hooks the game loop calls (see metrics_sources.py).
+
+Health checks go through the alerting engine (alerting.py): thresholds with
+hysteresis, EWMA anomaly detection on TPS and latency, and SLO burn rates.
+
+Usage:
+    python metrics_collector.py              # 5 samples from a simulated 60 Hz loop
+    python metrics_collector.py --overhead   # sampling + hook cost vs the tick budget
 """
 
 import time
 import random
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
+from alerting import AlertEngine, AlertEvent, game_server_rules
+from metrics_sources import SourceRegistry, TickSource, default_registry
+from timeseries import TimeSeriesStore
+
+# Every numeric ServerMetrics field gets a history; raw sample keys (e.g. 'tick_ms_p99') can be added
+STORED_METRICS = ('cpu_usage', 'memory_usage', 'active_players', 'tps', 'avg_latency', 'p99_latency',
+                  'error_rate', 'match_count', 'avg_players_per_match', 'gc_pause_time')
+
 @dataclass
 class ServerMetrics:
     """Game server metrics snapshot"""
@@ -28,89 +45,94 @@ class ServerMetrics:
 class GameServerMonitor:
     """Collect and analyze game server metrics"""
 
-    def __init__(self):
-        self.metrics_history: List[ServerMetrics] = []
+    def __init__(self, registry: Optional[SourceRegistry] = None, target_tps: float = 60.0,
+                 store: Optional[TimeSeriesStore] = None, trend_samples: int = 10,
+                 alerts: Optional[AlertEngine] = None, stored_metrics: Iterable[str] = STORED_METRICS):
+        self.store = store or TimeSeriesStore()  # Bounded: raw ring + 1m/10m/1h rollups per metric
+        self.stored_metrics = tuple(stored_metrics)
+        self.trend_samples = trend_samples
+        self.latest: Optional[ServerMetrics] = None
+        self.registry = registry or default_registry(target_tps)
+        self.ticks: Optional[TickSource] = self.registry.get('tick')  # Hooks for the game loop
+        self.last_sample: Dict[str, float] = {}
+        self.alerts = alerts or AlertEngine(game_server_rules(target_tps))
+        self.alert_events: List[AlertEvent] = []
+
+    def close(self):
+        """Detach the sources (GCSource keeps a gc.callbacks hook until then)."""
+        self.registry.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def collect_metrics(self) -> ServerMetrics:
-        """Collect current metrics from game server"""
-        # In production, these would come from actual instrumentation
+        """Collect current metrics from the registered sources"""
+        sample = self.registry.collect()
+        now = time.time()
+        self.last_sample = sample
+        players = int(sample.get('active_players', 0))
+        matches = int(sample.get('match_count', 0))
         metrics = ServerMetrics(
-            timestamp=datetime.now().isoformat(),
-            cpu_usage=random.uniform(20, 80),
-            memory_usage=random.uniform(30, 85),
-            active_players=random.randint(100, 500),
-            tps=random.uniform(58, 62),  # Should be 60 for 60 Hz tick
-            avg_latency=random.uniform(10, 50),
-            p99_latency=random.uniform(50, 200),
-            error_rate=random.uniform(0.001, 0.05),
-            match_count=random.randint(5, 20),
-            avg_players_per_match=8.5,
-            gc_pause_time=random.uniform(5, 30)
+            timestamp=datetime.fromtimestamp(now).isoformat(),
+            cpu_usage=sample.get('cpu_usage', 0.0),
+            memory_usage=sample.get('memory_usage', 0.0),
+            active_players=players,
+            tps=sample.get('tps', 0.0),
+            avg_latency=sample.get('avg_latency', 0.0),
+            p99_latency=sample.get('p99_latency', 0.0),
+            error_rate=sample.get('error_rate', 0.0),
+            match_count=matches,
+            avg_players_per_match=players / matches if matches else 0.0,
+            gc_pause_time=sample.get('gc_pause_time', 0.0)
         )
-        self.metrics_history.append(metrics)
+        store = self.store
+        fields = vars(metrics)
+        values = {}
+        for name in self.stored_metrics:
+            value = fields.get(name, sample.get(name))
+            if value is not None:
+                values[name] = value
+        store.record_many(values, now)
+        if self.ticks is not None:  # TickSource starts fresh histograms each sample, so the store can keep these
+            store.record_histogram('latency_ms', self.ticks.last_latency_ms, now, adopt=True)
+            store.record_histogram('tick_ms', self.ticks.last_tick_ms, now, adopt=True)
+        self.latest = metrics
         return metrics
 
     def check_health(self, metrics: ServerMetrics) -> Dict[str, str]:
-        """Perform health checks against SLOs"""
-        alerts = {}
-
-        # CPU alert
-        if metrics.cpu_usage > 80:
-            alerts['cpu'] = f"HIGH: {metrics.cpu_usage:.1f}%"
-        elif metrics.cpu_usage > 90:
-            alerts['cpu'] = f"CRITICAL: {metrics.cpu_usage:.1f}%"
-
-        # Memory alert
-        if metrics.memory_usage > 85:
-            alerts['memory'] = f"HIGH: {metrics.memory_usage:.1f}%"
-        elif metrics.memory_usage > 95:
-            alerts['memory'] = f"CRITICAL: {metrics.memory_usage:.1f}%"
-
-        # Latency alert
-        if metrics.p99_latency > 200:
-            alerts['latency'] = f"HIGH P99: {metrics.p99_latency:.0f}ms"
-        elif metrics.p99_latency > 500:
-            alerts['latency'] = f"CRITICAL P99: {metrics.p99_latency:.0f}ms"
-
-        # TPS alert
-        if abs(metrics.tps - 60) > 2:
-            alerts['tps'] = f"LOW: {metrics.tps:.1f} (target: 60)"
-
-        # Error rate alert
-        if metrics.error_rate > 0.01:
-            alerts['errors'] = f"HIGH: {metrics.error_rate:.3%}"
-        elif metrics.error_rate > 0.05:
-            alerts['errors'] = f"CRITICAL: {metrics.error_rate:.3%}"
-
-        # GC pause alert
-        if metrics.gc_pause_time > 100:
-            alerts['gc'] = f"HIGH PAUSE: {metrics.gc_pause_time:.0f}ms"
-
-        return alerts
+        """Evaluate the alert rules (see alerting.py) on a snapshot; returns the firing alerts.
+
+        Stateful: a breach has to persist for a rule's for_samples to fire and
+        be gone for its clear_samples to resolve. The transitions this sample
+        caused (firing, escalated, resolved, ...) are kept in alert_events.
+        """
+        sample = asdict(metrics)
+        del sample['timestamp']
+        sample['requests'] = self.last_sample.get('requests', 0)
+        ts = datetime.fromisoformat(metrics.timestamp).timestamp()
+        self.alert_events = self.alerts.evaluate(sample, ts)
+        return self.alerts.active()
 
     def analyze_trends(self) -> Dict[str, float]:
-        """Analyze metrics trends"""
-        if len(self.metrics_history) < 2:
+        """Analyze metrics trends over the last trend_samples samples (O(1) per metric)"""
+        cpu = self.store.get('cpu_usage')
+        if cpu is None or len(cpu.raw) < 2:
             return {}
 
-        recent = self.metrics_history[-10:]  # Last 10 samples
+        n = self.trend_samples
+        trends = {}
+        for key, name in (('cpu_avg', 'cpu_usage'), ('memory_avg', 'memory_usage'),
+                          ('latency_avg', 'avg_latency'), ('error_rate_avg', 'error_rate')):
+            series = self.store.get(name)
+            trends[key] = series.raw.mean_last(n) if series else 0.0
 
-        trends = {
-            'cpu_avg': sum(m.cpu_usage for m in recent) / len(recent),
-            'memory_avg': sum(m.memory_usage for m in recent) / len(recent),
-            'latency_avg': sum(m.avg_latency for m in recent) / len(recent),
-            'error_rate_avg': sum(m.error_rate for m in recent) / len(recent),
-        }
-
-        # Calculate slopes (trend direction)
-        if len(recent) >= 2:
-            cpu_first = recent[0].cpu_usage
-            cpu_last = recent[-1].cpu_usage
-            trends['cpu_trend'] = cpu_last - cpu_first
-
-            mem_first = recent[0].memory_usage
-            mem_last = recent[-1].memory_usage
-            trends['memory_trend'] = mem_last - mem_first
+        # Calculate slopes (trend direction): newest minus oldest of the window
+        for key, name in (('cpu_trend', 'cpu_usage'), ('memory_trend', 'memory_usage')):
+            raw = self.store.get(name).raw
+            trends[key] = raw.at(0)[1] - raw.at(min(n, len(raw)) - 1)[1]
 
         return trends
 
@@ -152,20 +174,23 @@ class GameServerMonitor:
 
     def print_summary(self):
         """Print collection summary"""
-        if not self.metrics_history:
+        players = self.store.get('active_players')
+        latencies = self.store.get('avg_latency')
+        if players is None or latencies is None:
             return
 
         print("\n📊 COLLECTION SUMMARY")
         print("-" * 70)
-        print(f"  Samples collected: {len(self.metrics_history)}")
-        print(f"  Time span: {self.metrics_history[0].timestamp} to {self.metrics_history[-1].timestamp}")
-
-        # Calculate statistics
-        players = [m.active_players for m in self.metrics_history]
-        latencies = [m.avg_latency for m in self.metrics_history]
-
-        print(f"  Player range: {min(players)} - {max(players)}")
-        print(f"  Latency range: {min(latencies):.1f}ms - {max(latencies):.1f}ms")
+        print(f"  Samples collected: {players.count}")
+        print(f"  Time span: {datetime.fromtimestamp(players.first_ts).isoformat()} to "
+              f"{datetime.fromtimestamp(self.store.last_ts).isoformat()}")
+        print(f"  Player range: {players.min:.0f} - {players.max:.0f}")
+        print(f"  Latency range: {latencies.min:.1f}ms - {latencies.max:.1f}ms")
+        for label, seconds in (('1m', 60), ('10m', 600), ('1h', 3600)):
+            print(f"  Latency {label:>3}: p50 {self.store.quantile('latency_ms', 0.5, seconds):6.1f}ms  "
+                  f"p99 {self.store.quantile('latency_ms', 0.99, seconds):6.1f}ms  "
+                  f"tick p99 {self.store.quantile('tick_ms', 0.99, seconds):5.2f}ms")
+        print(f"  Store footprint: ~{self.store.memory_bytes() / 1024:.0f} KiB for {len(self.store.series)} series")
 
 class AlertSystem:
     """Alert severity and routing"""
@@ -199,7 +224,91 @@ class AlertSystem:
             print("   → Logging to monitoring dashboard")
             print("   → Email to team")
 
+# ----- Simulated game loop -----
+
+def simulate_tick(ticks: TickSource, rng: random.Random, players: int):
+    """One tick of fake game work that allocates (so the GC has something to do)."""
+    ticks.tick_start()
+    state = [{'id': i, 'pos': (rng.random(), rng.random())} for i in range(players // 4)]
+    for entity in state:
+        entity['pos'] = (entity['pos'][0] + 0.01, entity['pos'][1])
+    for _ in range(players // 20):
+        ticks.record_latency(rng.lognormvariate(3.0, 0.4))
+        ticks.record_request(rng.random() > 0.002)
+    ticks.tick_end()
+
+def run_game_loop(monitor: GameServerMonitor, seconds: float, tps: float = 60.0, players: int = 400,
+                  seed: int = 5):
+    """Drive the monitor's tick hooks at `tps` for `seconds`."""
+    rng = random.Random(seed)
+    ticks = monitor.ticks
+    ticks.set_gauge('active_players', players)
+    ticks.set_gauge('match_count', players // 8)
+    interval = 1 / tps
+    next_tick = time.perf_counter()
+    end = next_tick + seconds
+    while next_tick < end:
+        simulate_tick(ticks, rng, players)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+def measure_overhead(samples: int = 200, tps: float = 60.0, players: int = 400) -> Dict[str, float]:
+    """Cost of collect_metrics() and of the per-tick hooks, relative to one tick."""
+    with GameServerMonitor(target_tps=tps) as monitor:
+        rng = random.Random(1)
+        ticks = monitor.ticks
+        ticks.set_gauge('active_players', players)
+        clock = time.perf_counter_ns
+        sample_ns = []
+        for _ in range(samples):
+            for _ in range(int(tps)):  # One second's worth of hook data per sample
+                ticks.record_tick(0.004)
+                for _ in range(players // 20):
+                    ticks.record_latency(rng.lognormvariate(3.0, 0.4))
+                    ticks.record_request(True)
+            start = clock()
+            monitor.collect_metrics()
+            sample_ns.append(clock() - start)
+
+        count = 100000
+        start = clock()
+        for _ in range(count):
+            ticks.tick_start()
+            ticks.tick_end()
+        hook_ns = (clock() - start) / count
+        sample_ns.sort()
+        tick_ns = 1e9 / tps
+        return {'sample_us_median': sample_ns[len(sample_ns) // 2] / 1000,
+                'sample_us_p99': sample_ns[int(len(sample_ns) * 0.99)] / 1000,
+                'sample_pct_of_tick': 100 * sample_ns[len(sample_ns) // 2] / tick_ns,
+                'hook_ns_per_tick': hook_ns,
+                'hook_pct_of_tick': 100 * hook_ns / tick_ns,
+                'per_source_us': {name: ns / 1000 for name, ns in monitor.registry.cost_ns.items()}}
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Game server metrics collection")
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--overhead', action='store_true', help="Benchmark sampling overhead instead")
+    args = parser.parse_args()
+
+    if args.overhead:
+        o = measure_overhead()
+        print("\n" + "=" * 70)
+        print("MONITORING OVERHEAD (1 Hz sampling, 60 Hz tick = 16.67 ms budget)")
+        print("=" * 70)
+        print(f"  collect_metrics(): {o['sample_us_median']:8.1f} us median, {o['sample_us_p99']:8.1f} us p99 "
+              f"= {o['sample_pct_of_tick']:.3f}% of one tick")
+        for name, us in o['per_source_us'].items():
+            print(f"    {name:8} {us:8.1f} us")
+        print(f"  tick hooks:        {o['hook_ns_per_tick']:8.0f} ns per tick = {o['hook_pct_of_tick']:.4f}% of a tick")
+        verdict = "PASS" if o['sample_pct_of_tick'] < 1.0 else "FAIL"
+        print(f"  Budget (< 1% of a tick per sample): {verdict}")
+        raise SystemExit(0)
+
     # Create monitor
     monitor = GameServerMonitor()
 
@@ -207,8 +316,10 @@ if __name__ == "__main__":
     print("=" * 70)
 
     # Collect metrics over time
-    print("\nCollecting metrics for 5 samples...")
-    for i in range(5):
+    print(f"\nCollecting metrics for {args.samples} samples from a simulated 60 Hz game loop...")
+    monitor.registry.collect()  # Prime CPU and tick baselines
+    for i in range(args.samples):
+        run_game_loop(monitor, 1.0)
         metrics = monitor.collect_metrics()
         monitor.print_metrics(metrics)
 
@@ -221,8 +332,6 @@ if __name__ == "__main__":
         if alerts:
             AlertSystem.route_alert(severity, alerts)
 
-        time.sleep(0.5)
-
     # Print trends
     trends = monitor.analyze_trends()
     print("\n📈 TREND ANALYSIS")
@@ -231,3 +340,4 @@ if __name__ == "__main__":
         print(f"  {metric:20} {value:8.2f}")
 
     monitor.print_summary()
+    monitor.close()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+OpenMetrics scrape endpoint for a MetricsRegistry, served from asyncio.
+
+    exposition = OpenMetricsExposition(REGISTRY)
+    server = await serve_metrics(exposition, port=9100)   # GET /metrics
+
+Scrapes must not stall the game tick running on the same loop:
+    - each series' name+labels prefix is encoded once and reused; only the
+      value is formatted per scrape
+    - rendering yields to the loop after every `slice_ms` of work, so a
+      100k-series render is many short slices instead of one long stall
+    - the encoded body is cached for `max_age` seconds and concurrent
+      scrapes share one in-flight render
+    - gzip (when accepted) runs in the default executor; zlib releases the GIL
+    - the registry and layout are moved out of the collector's reach with
+      gc.freeze() once built, and collection is deferred while a render is
+      in progress, so a gen-2 pass over the 100k-metric heap never lands
+      mid-scrape
+    - the body goes out in WRITE_CHUNK slices with a drain() after each, so the
+      transport never holds (and repeatedly trims) a multi-megabyte buffer
+Per-match metrics are bounded by the registry's max_series cardinality limit.
+
+register_monitor(registry, monitor) exports a GameServerMonitor's latest
+sample (CPU, memory, TPS, latency, errors, GC) and its alert state as
+scrape-time gauges, so the same endpoint serves both.
+
+Usage:
+    python metrics_endpoint.py --series 100000 --scrapes 5
+"""
+import asyncio
+import gc
+import math
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import Gauge, MetricsRegistry
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+WRITE_CHUNK = 256 * 1024
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isfinite(value):
+        return repr(value)
+    if math.isnan(value):
+        return "NaN"
+    return "+Inf" if value > 0 else "-Inf"
+
+# (gauge name, GameServerMonitor sample key, help)
+MONITOR_GAUGES = (
+    ('game_cpu_usage_percent', 'cpu_usage', "Process CPU, % of one core"),
+    ('game_memory_usage_percent', 'memory_usage', "Resident memory, % of host memory"),
+    ('game_ticks_per_second', 'tps', "Delivered tick rate"),
+    ('game_tick_duration_p99_ms', 'tick_ms_p99', "p99 tick duration"),
+    ('game_player_latency_avg_ms', 'avg_latency', "Mean player round trip"),
+    ('game_player_latency_p99_ms', 'p99_latency', "p99 player round trip"),
+    ('game_error_ratio', 'error_rate', "Failed share of requests"),
+    ('game_active_players', 'active_players', "Connected players"),
+    ('game_gc_pause_ms', 'gc_pause_time', "GC pause time in the last sample"),
+)
+
+def register_monitor(registry: MetricsRegistry, monitor) -> List[Gauge]:
+    """Export a GameServerMonitor through registry as gauges read at scrape time.
+
+    Sample gauges read monitor.last_sample (NaN until the first collect);
+    game_alert_severity{alert=...} is the firing severity of each server-wide
+    rule (0 = ok, 1 = warning, 2 = critical) and game_alerts_firing their count.
+    """
+    gauges = []
+    for name, key, help_text in MONITOR_GAUGES:
+        gauge = registry.gauge(name, help_text)
+        gauge.set_function(lambda key=key: monitor.last_sample.get(key, math.nan))
+        gauges.append(gauge)
+    engine = monitor.alerts
+    for rules in engine.by_metric.values():
+        for rule in rules:
+            gauge = registry.gauge('game_alert_severity', "Firing severity per alert rule (0 = ok)",
+                                   alert=rule.name)
+
+            def severity(name=rule.name):
+                state = engine.states.get((name, ()))
+                return state.firing if state is not None else 0
+            gauge.set_function(severity)
+            gauges.append(gauge)
+    firing = registry.gauge('game_alerts_firing', "Server-wide alerts currently firing")
+    firing.set_function(lambda: len(engine.active(())))
+    gauges.append(firing)
+    return gauges
+
+class OpenMetricsExposition:
+    """Renders a MetricsRegistry as OpenMetrics text, with prefix and body caching."""
+
+    def __init__(self, registry: MetricsRegistry, max_age: float = 1.0, slice_ms: Optional[float] = 2.0,
+                 freeze_gc: bool = True):
+        self.registry = registry
+        self.max_age = max_age
+        self.slice_ms = slice_ms  # None: render in one blocking pass
+        self.freeze_gc = freeze_gc  # gc.freeze() after each layout build; the metrics live for the process
+        self._layout_version = -1
+        self._families: List[Tuple[str, str, list]] = []  # (name, kind, [(metric, prefixes)])
+        self._body: Optional[bytes] = None
+        self._gzipped: Optional[bytes] = None
+        self._rendered_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self.stats = {'renders': 0, 'cache_hits': 0, 'last_render_ms': 0.0, 'series': 0}
+
+    def _layout_steps(self):
+        """Group series into families and pre-encode their prefixes (only when series changed).
+
+        A generator: yields when its time slice is used up (see _slices).
+        """
+        if self._layout_version == self.registry.version:
+            return
+        version = self.registry.version
+        due = self._slices()
+        families: Dict[str, Tuple[str, list]] = {}
+        for i, metric in enumerate(list(self.registry.metrics.values()), 1):
+            name, labels, kind = metric.name, metric.labels, metric.kind
+            if kind == 'counter':
+                base = name[:-6] if name.endswith('_total') else name
+                prefixes = (f"{base}_total{_labels(labels)} ",)
+            elif kind == 'gauge':
+                base = name
+                prefixes = (f"{name}{_labels(labels)} ",)
+            else:  # timer -> summary
+                base = name
+                prefixes = tuple(f"{name}{_labels(labels, 'quantile=' + chr(34) + q + chr(34))} "
+                                 for q in ('0.5', '0.9', '0.99'))
+                prefixes += (f"{name}_count{_labels(labels)} ", f"{name}_sum{_labels(labels)} ")
+            family = families.setdefault(base, ('summary' if kind == 'timer' else kind, []))
+            family[1].append((metric, prefixes))
+            if i & 63 == 0 and due():
+                yield
+        self._families = [(name, kind, series) for name, (kind, series) in sorted(families.items())]
+        self._layout_version = version
+        if self.freeze_gc:
+            gc.freeze()  # Later full collections skip the registry and prefixes instead of walking them
+
+    def _header(self, name: str, kind: str) -> List[str]:
+        lines = [f"# TYPE {name} {kind}\n"]
+        help_text = self.registry.help.get(name) or self.registry.help.get(name + '_total')
+        if help_text:
+            lines.append(f"# HELP {name} {_escape(help_text)}\n")
+        return lines
+
+    @staticmethod
+    def _series_lines(out: List[str], metric, prefixes):
+        value = metric.value()
+        if metric.kind == 'timer':
+            p50, p90, p99, count, total = prefixes
+            out.append(p50 + _number(value['p50']) + "\n")
+            out.append(p90 + _number(value['p90']) + "\n")
+            out.append(p99 + _number(value['p99']) + "\n")
+            out.append(count + _number(value['count']) + "\n")
+            out.append(total + _number(value['sum']) + "\n")
+        else:
+            out.append(prefixes[0] + _number(value) + "\n")
+
+    def _overflow_lines(self) -> List[str]:
+        if not self.registry.overflowed:
+            return []
+        lines = self._header('metrics_cardinality_overflow', 'counter')
+        for name, count in sorted(self.registry.overflowed.items()):
+            lines.append(f'metrics_cardinality_overflow_total{{metric="{_escape(name)}"}} {count}\n')
+        return lines
+
+    def _slices(self):
+        """Returns due(): True once slice_ms has passed since the last time it returned True."""
+        if not self.slice_ms:
+            return lambda: False
+        budget = self.slice_ms / 1000
+        clock = time.perf_counter
+        state = [clock() + budget]
+
+        def due():
+            now = clock()
+            if now < state[0]:
+                return False
+            state[0] = now + budget
+            return True
+        return due
+
+    def _render_steps(self, out: List[str]):
+        """Append the body to out; yields when a time slice is used up."""
+        yield from self._layout_steps()
+        due = self._slices()
+        done = 0
+        for name, kind, series in self._families:
+            out.extend(self._header(name, kind))
+            for metric, prefixes in series:
+                self._series_lines(out, metric, prefixes)
+                done += 1
+                if done & 63 == 0 and due():
+                    yield
+        out.extend(self._overflow_lines())
+        out.append("# EOF\n")
+
+    def render(self) -> bytes:
+        """Whole body in one go (blocks for the full render)."""
+        out: List[str] = []
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in self._render_steps(out):
+                pass
+            return "".join(out).encode()
+        finally:
+            if enabled:
+                gc.enable()
+
+    async def render_async(self) -> bytes:
+        """Same body, giving the event loop a turn between time slices.
+
+        Each slice's lines are encoded before yielding, so the final join is
+        a bytes copy rather than one long str join + encode. Collection stays
+        off until the body is joined: the per-series strings would otherwise
+        trigger a full collection in the middle of a slice.
+        """
+        out: List[str] = []
+        parts: List[bytes] = []
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in self._render_steps(out):
+                parts.append("".join(out).encode())
+                out.clear()
+                await asyncio.sleep(0)
+            parts.append("".join(out).encode())
+            return b"".join(parts)
+        finally:
+            if enabled:
+                gc.enable()
+
+    async def body(self, gzip: bool = False) -> bytes:
+        """Cached body if fresh, else one shared render for all concurrent scrapers."""
+        if self._body is not None and time.monotonic() - self._rendered_at < self.max_age:
+            self.stats['cache_hits'] += 1
+        elif self._inflight is not None:
+            await self._inflight
+        else:
+            loop = asyncio.get_running_loop()
+            self._inflight = loop.create_future()
+            try:
+                start = time.perf_counter()
+                body = await self.render_async() if self.slice_ms else self.render()
+                self._body, self._gzipped = body, None
+                self._rendered_at = time.monotonic()
+                self.stats['renders'] += 1
+                self.stats['last_render_ms'] = (time.perf_counter() - start) * 1000
+                self.stats['series'] = sum(len(series) for _, _, series in self._families)
+            finally:
+                self._inflight.set_result(None)
+                self._inflight = None
+        if not gzip:
+            return self._body
+        if self._gzipped is None:
+            body = self._body
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+            self._gzipped = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: compressor.compress(body) + compressor.flush())
+        return self._gzipped
+
+async def _handle(exposition: OpenMetricsExposition, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await reader.readuntil(b"\r\n\r\n")
+        request_line, *header_lines = request.decode('latin-1').split("\r\n")
+        parts = request_line.split()
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if len(parts) < 2 or parts[0] != 'GET' or parts[1].split('?')[0] != '/metrics':
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        else:
+            gzip = 'gzip' in headers.get('accept-encoding', '')
+            body = await exposition.body(gzip)
+            encoding = "Content-Encoding: gzip\r\n" if gzip else ""
+            head = (f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\n"
+                    f"{encoding}Connection: close\r\n\r\n")
+            writer.write(head.encode())
+            view = memoryview(body)
+            for start in range(0, len(body), WRITE_CHUNK):  # Keeps the transport buffer small
+                writer.write(view[start:start + WRITE_CHUNK])
+                await writer.drain()
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve_metrics(exposition: OpenMetricsExposition, host: str = '127.0.0.1', port: int = 9100):
+    """Start the scrape listener on the running loop; returns the asyncio Server."""
+    return await asyncio.start_server(lambda r, w: _handle(exposition, r, w), host, port)
+
+# ----- Benchmark -----
+
+def populate(registry: MetricsRegistry, series: int, per_match: int = 5):
+    """Per-match metrics: `series` label sets spread over a few metric names."""
+    names = ['match_players', 'match_score_total', 'match_events_total', 'match_tick_seconds', 'match_bytes_total']
+    for i in range(series):
+        name = names[i % per_match]
+        match_id = i // per_match
+        if name.endswith('_seconds'):
+            registry.timer(name, "Per-match tick duration", match=str(match_id)).observe_ns(1_000_000 + i)
+        elif name.endswith('_total'):
+            registry.counter(name, "Per-match counter", match=str(match_id)).inc(i)
+        else:
+            registry.gauge(name, "Players in match", match=str(match_id)).set(i % 10)
+
+async def _scrape(port: int, gzip: bool = False) -> Tuple[float, int]:
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    accept = "Accept-Encoding: gzip\r\n" if gzip else ""
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: x\r\n{accept}\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    return (time.perf_counter() - start) * 1000, len(data)
+
+async def _ticks(stop: asyncio.Event, hz: float, lags: List[float]):
+    """60 Hz game tick on the same loop; records how late each tick starts."""
+    loop = asyncio.get_running_loop()
+    interval = 1 / hz
+    next_tick = loop.time() + interval
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        lags.append(max(0.0, loop.time() - next_tick) * 1000)
+        next_tick += interval
+
+async def run_benchmark(series: int, scrapes: int, slice_ms: Optional[float], max_age: float = 0.0) -> Dict:
+    registry = MetricsRegistry(enabled=True, max_series=series)
+    populate(registry, series)
+    exposition = OpenMetricsExposition(registry, max_age=max_age, slice_ms=slice_ms)
+    server = await serve_metrics(exposition, port=0)
+    port = server.sockets[0].getsockname()[1]
+    stop = asyncio.Event()
+    lags: List[float] = []
+    ticker = asyncio.create_task(_ticks(stop, 60, lags))
+    await asyncio.sleep(0.1)
+    latencies = []
+    size = 0
+    for _ in range(scrapes):
+        ms, size = await _scrape(port)
+        latencies.append(ms)
+        await asyncio.sleep(0.05)
+    cached_ms, _ = await _scrape(port) if max_age else (0.0, 0)
+    gzip_ms, gzip_size = await _scrape(port, gzip=True)
+    stop.set()
+    await ticker
+    server.close()
+    await server.wait_closed()
+    lags.sort()
+    return {'series': exposition.stats['series'], 'render_ms': exposition.stats['last_render_ms'],
+            'scrape_ms': sorted(latencies)[len(latencies) // 2], 'bytes': size, 'gzip_bytes': gzip_size,
+            'gzip_ms': gzip_ms, 'cached_ms': cached_ms,
+            'tick_lag_p99_ms': lags[int(len(lags) * 0.99)] if lags else 0.0, 'tick_lag_max_ms': lags[-1] if lags else 0.0}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenMetrics endpoint scrape benchmark")
+    parser.add_argument('--series', type=int, default=100000)
+    parser.add_argument('--scrapes', type=int, default=5)
+    parser.add_argument('--slice-ms', type=float, default=2.0, help="Render work between loop yields")
+    args = parser.parse_args()
+
+    print(f"Registering {args.series:,} per-match series...")
+    rows = [('blocking render', asyncio.run(run_benchmark(args.series, args.scrapes, None))),
+            (f'sliced ({args.slice_ms:g} ms)', asyncio.run(run_benchmark(args.series, args.scrapes, args.slice_ms))),
+            ('sliced + 1s cache', asyncio.run(run_benchmark(args.series, args.scrapes, args.slice_ms, max_age=1.0)))]
+    print("\n" + "=" * 96)
+    print(f"OPENMETRICS SCRAPE ({rows[0][1]['series']:,} series, {rows[0][1]['bytes'] / 1e6:.1f} MB, "
+          f"gzip {rows[0][1]['gzip_bytes'] / 1e6:.1f} MB)")
+    print("=" * 96)
+    print(f"{'Mode':20} | {'Render':>9} | {'Scrape p50':>10} | {'Cached':>8} | {'60 Hz tick lag p99':>18} | {'max':>8}")
+    print("-" * 96)
+    for label, r in rows:
+        cached = f"{r['cached_ms']:6.1f}ms" if r['cached_ms'] else "     -  "
+        print(f"{label:20} | {r['render_ms']:7.1f}ms | {r['scrape_ms']:8.1f}ms | {cached} | "
+              f"{r['tick_lag_p99_ms']:16.2f}ms | {r['tick_lag_max_ms']:6.2f}ms")
+    print("=" * 96)
+    tick_ms = 1000 / 60
+    for label, r in rows[1:]:
+        assert r['tick_lag_p99_ms'] < tick_ms, f"{label}: tick lag p99 {r['tick_lag_p99_ms']:.1f}ms > one tick"
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Metric sources for GameServerMonitor: real numbers from the running process.
+
+    ProcSource    - CPU % and RSS from /proc/self (resource.getrusage elsewhere)
+    GCSource      - collector pause times via gc.callbacks
+    TickSource    - tick rate, tick duration, player latency and error rate,
+                    fed by hooks the game loop calls (tick_start/tick_end, ...)
+    SourceRegistry - pluggable set of sources; collect() merges their samples
+                     and keeps the cost of each
+
+A source is anything with a `name` and a `sample() -> Dict[str, float]`.
+Sampling is meant to run at ~1 Hz; the hooks run every tick, so they only
+add to histograms (timeseries.LogHistogram) that sample() reads and resets.
+"""
+import gc
+import os
+import resource
+import time
+from typing import Callable, Dict, List, Optional
+
+from timeseries import LogHistogram
+
+PROC_STAT = "/proc/self/stat"
+PROC_MEMINFO = "/proc/meminfo"
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = resource.getpagesize()
+
+class ProcSource:
+    """Process CPU (% of one core since the last sample) and resident memory."""
+    name = "proc"
+
+    def __init__(self):
+        try:
+            self._stat_fd = os.open(PROC_STAT, os.O_RDONLY)  # Kept open; pread re-reads it fresh
+        except OSError:
+            self._stat_fd = None
+        self.total_memory = self._total_memory()
+        self._last_cpu = self._cpu_seconds()
+        self._last_wall = time.monotonic()
+
+    def _total_memory(self) -> float:
+        try:
+            with open(PROC_MEMINFO) as f:
+                for line in f:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        if hasattr(os, 'sysconf') and 'SC_PHYS_PAGES' in os.sysconf_names:
+            return os.sysconf('SC_PHYS_PAGES') * PAGE_SIZE
+        return 0.0
+
+    def _read(self):
+        """(cpu seconds, rss bytes) for this process."""
+        if self._stat_fd is not None:
+            fields = os.pread(self._stat_fd, 4096, 0).rsplit(b')', 1)[1].split()  # comm may contain spaces
+            return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        rss = usage.ru_maxrss  # Peak, not current, without /proc
+        return usage.ru_utime + usage.ru_stime, rss if os.uname().sysname == 'Darwin' else rss * 1024
+
+    def _cpu_seconds(self) -> float:
+        return self._read()[0]
+
+    def uninstall(self):
+        if self._stat_fd is not None:
+            os.close(self._stat_fd)
+            self._stat_fd = None
+
+    def sample(self) -> Dict[str, float]:
+        cpu, rss = self._read()
+        wall = time.monotonic()
+        elapsed = wall - self._last_wall
+        usage = 100 * (cpu - self._last_cpu) / elapsed if elapsed > 0 else 0.0
+        self._last_cpu, self._last_wall = cpu, wall
+        return {'cpu_usage': usage, 'rss_bytes': rss,
+                'memory_usage': 100 * rss / self.total_memory if self.total_memory else 0.0}
+
+class GCSource:
+    """Garbage collector pauses since the last sample, via gc.callbacks."""
+    name = "gc"
+
+    def __init__(self):
+        self._start = 0
+        self._pauses: List[int] = []
+        self._collected = 0
+        self.installed = False
+        self.install()
+
+    def _callback(self, phase: str, info: dict):
+        if phase == "start":
+            self._start = time.perf_counter_ns()
+        else:
+            self._pauses.append(time.perf_counter_ns() - self._start)
+            self._collected += info.get('collected', 0)
+
+    def install(self):
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+
+    def uninstall(self):
+        if self.installed:
+            gc.callbacks.remove(self._callback)
+            self.installed = False
+
+    def sample(self) -> Dict[str, float]:
+        pauses, self._pauses = self._pauses, []
+        collected, self._collected = self._collected, 0
+        return {'gc_pause_time': sum(pauses) / 1e6, 'gc_pause_max': max(pauses, default=0) / 1e6,
+                'gc_collections': len(pauses), 'gc_collected': collected}
+
+class TickSource:
+    """Game-loop instrumentation hooks; sample() turns what they recorded into rates.
+
+    Call tick_start()/tick_end() around each tick (or record_tick(seconds)),
+    record_latency(ms) per player round trip, record_request(ok) per request,
+    and set_gauge() for counts such as active_players.
+    """
+    name = "tick"
+
+    def __init__(self, target_tps: float = 60.0):
+        self.target_tps = target_tps
+        self._tick_started = 0.0
+        self.tick_ms = LogHistogram()
+        self.latency_ms = LogHistogram()
+        self.last_tick_ms = LogHistogram()  # Previous sample's histograms, owned by the time-series store
+        self.last_latency_ms = LogHistogram()
+        self._requests = 0
+        self._errors = 0
+        self._last_sample = time.perf_counter()
+        self.gauges: Dict[str, float] = {}
+
+    def tick_start(self):
+        self._tick_started = time.perf_counter()
+
+    def tick_end(self):
+        self.tick_ms.add((time.perf_counter() - self._tick_started) * 1000)
+
+    def record_tick(self, seconds: float):
+        self.tick_ms.add(seconds * 1000)
+
+    def record_latency(self, ms: float):
+        self.latency_ms.add(ms)
+
+    def record_request(self, ok: bool = True):
+        self._requests += 1
+        if not ok:
+            self._errors += 1
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def sample(self) -> Dict[str, float]:
+        now = time.perf_counter()
+        elapsed = now - self._last_sample
+        self._last_sample = now
+        ticks, latencies = self.tick_ms, self.latency_ms
+        # Fresh histograms for the hooks; the finished pair is handed to the store, which may keep it
+        self.tick_ms, self.latency_ms = LogHistogram(), LogHistogram()
+        self.last_tick_ms, self.last_latency_ms = ticks, latencies
+        requests, errors = self._requests, self._errors
+        self._requests = self._errors = 0
+        out = {
+            'tps': ticks.count / elapsed if elapsed > 0 else 0.0,
+            'tick_ms_avg': ticks.mean(),
+            'tick_ms_p99': ticks.quantile(0.99),
+            'avg_latency': latencies.mean(),
+            'p99_latency': latencies.quantile(0.99),
+            'error_rate': errors / requests if requests else 0.0,
+            'requests': requests,
+        }
+        out.update(self.gauges)
+        return out
+
+class CallableSource:
+    """Wrap a plain function returning a dict as a source."""
+
+    def __init__(self, name: str, func: Callable[[], Dict[str, float]]):
+        self.name = name
+        self.sample = func
+
+class SourceRegistry:
+    """Named metric sources; collect() merges every sample into one dict."""
+
+    def __init__(self):
+        self.sources: Dict[str, object] = {}
+        self.cost_ns: Dict[str, int] = {}
+        self.errors: Dict[str, str] = {}
+
+    def register(self, source) -> object:
+        if source.name in self.sources:
+            raise ValueError(f"Duplicate metric source: {source.name!r}")
+        self.sources[source.name] = source
+        return source
+
+    def unregister(self, name: str):
+        source = self.sources.pop(name, None)
+        if source is not None and hasattr(source, 'uninstall'):
+            source.uninstall()
+
+    def get(self, name: str) -> Optional[object]:
+        return self.sources.get(name)
+
+    def close(self):
+        """Unregister every source, uninstalling hooks such as GCSource's gc callback."""
+        for name in list(self.sources):
+            self.unregister(name)
+
+    def collect(self) -> Dict[str, float]:
+        """Sample every source; a failing source is reported in errors, not raised."""
+        merged: Dict[str, float] = {}
+        clock = time.perf_counter_ns
+        for name, source in self.sources.items():
+            start = clock()
+            try:
+                merged.update(source.sample())
+                self.errors.pop(name, None)
+            except Exception as e:
+                self.errors[name] = repr(e)
+            self.cost_ns[name] = clock() - start
+        return merged
+
+def default_registry(target_tps: float = 60.0) -> SourceRegistry:
+    registry = SourceRegistry()
+    registry.register(ProcSource())
+    registry.register(GCSource())
+    registry.register(TickSource(target_tps))
+    return registry
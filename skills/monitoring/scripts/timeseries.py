@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Bounded in-memory time-series store for GameServerMonitor.
+
+    RingBuffer      - fixed-size raw samples (array-backed), O(1) suffix means
+    LogHistogram    - DDSketch-style log-bucketed histogram: relative-error
+                      quantiles, mergeable, bucket count capped
+    Rollup          - per-window aggregates (count/sum/min/max + histogram)
+                      kept in a fixed ring of slots
+    RollupChain     - 1m -> 10m -> 1h: samples land in the finest level only;
+                      a level's slot is folded into the next level when it
+                      closes, so coarse levels cost nothing per sample
+    TimeSeriesStore - one Series per metric: raw ring + rollup chain
+
+Recording is O(1) per sample (amortised: a slot is folded once per window)
+and memory does not grow with uptime: raw_capacity samples plus a fixed
+number of slots per level, per metric.
+"""
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (window seconds, slots kept): 1h of minutes, 1 day of 10 minutes, 1 week of hours
+DEFAULT_ROLLUPS = ((60, 60), (600, 144), (3600, 168))
+
+class RingBuffer:
+    """Last `capacity` (timestamp, value) pairs; sum/mean of the newest n in O(1).
+
+    Each slot also stores the running total up to and including its sample,
+    so the sum of any suffix is one subtraction.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.cums = array('d', bytes(8 * capacity))
+        self.head = 0  # Next write position
+        self.size = 0
+        self.total = 0.0  # Running total through the newest sample
+        self.base = 0.0   # Running total just before the oldest retained sample
+
+    def append(self, ts: float, value: float):
+        head = self.head
+        if self.size == self.capacity:
+            self.base = self.cums[head]  # Overwriting the oldest sample
+        else:
+            self.size += 1
+        self.total += value
+        self.times[head] = ts
+        self.values[head] = value
+        self.cums[head] = self.total
+        self.head = (head + 1) % self.capacity
+
+    def __len__(self):
+        return self.size
+
+    def at(self, back: int) -> Tuple[float, float]:
+        """(ts, value) `back` samples ago: at(0) is the newest."""
+        if not 0 <= back < self.size:
+            raise IndexError(back)
+        i = (self.head - 1 - back) % self.capacity
+        return self.times[i], self.values[i]
+
+    def sum_last(self, n: int) -> float:
+        n = min(n, self.size)
+        if n == self.size:
+            return self.total - self.base
+        return self.total - self.cums[(self.head - 1 - n) % self.capacity]
+
+    def mean_last(self, n: int) -> float:
+        n = min(n, self.size)
+        return self.sum_last(n) / n if n else 0.0
+
+    def mean(self) -> float:
+        return self.mean_last(self.size)
+
+    def __iter__(self):
+        """Oldest to newest."""
+        for back in range(self.size - 1, -1, -1):
+            yield self.at(back)
+
+class LogHistogram:
+    """Log-bucketed histogram: every quantile within relative_accuracy of the true value.
+
+    Bucket k holds values in (gamma**(k-1), gamma**k]; two histograms with the
+    same accuracy merge by adding counts. When more than max_buckets are in
+    use the lowest buckets are collapsed, so only the low tail loses accuracy.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.counts: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1):
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self.zero_count += count
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + count
+        if len(counts) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.counts)
+        lowest, target = keys[0], keys[1]
+        self.counts[target] += self.counts.pop(lowest)
+
+    def merge(self, other: 'LogHistogram'):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge histograms with different accuracy")
+        counts = self.counts
+        for key, count in list(other.counts.items()):  # other may still be taking samples
+            counts[key] = counts.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(counts) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0..1); 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        counts = self.counts
+        found = None
+        if rank >= self.count / 2:
+            # High quantiles: step down key by key from the bucket holding max, keeping the
+            # lowest one whose cumulative count (everything at or below it) still exceeds
+            # rank; only the buckets above the answer are visited. Sparse tails (more empty
+            # keys than buckets) finish with a sort of the keys left below.
+            cumulative = self.count
+            key = math.ceil(math.log(self.max) / self._log_gamma)
+            misses = 0
+            while cumulative > rank:
+                count = counts.get(key)
+                if count:
+                    found = key
+                    cumulative -= count
+                elif misses == len(counts):
+                    for key in sorted((k for k in counts if k < key), reverse=True):
+                        if cumulative <= rank:
+                            break
+                        found = key
+                        cumulative -= counts[key]
+                    break
+                else:
+                    misses += 1
+                key -= 1
+        else:
+            for key in sorted(counts):
+                seen += counts[key]
+                if seen > rank:
+                    found = key
+                    break
+        if found is None:
+            return self.max
+        value = 2 * self.gamma ** found / (self.gamma + 1)  # Bucket midpoint in relative terms
+        return min(max(value, self.min), self.max)
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def copy(self) -> 'LogHistogram':
+        h = LogHistogram(self.relative_accuracy, self.max_buckets, self.min_value)
+        h.merge(self)
+        return h
+
+    def clear(self):
+        self.counts = {}
+        self.zero_count = self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+class Rollup:
+    """Aggregates per `window` seconds in a ring of `slots`; the open slot accumulates in place."""
+
+    def __init__(self, window: float, slots: int):
+        self.window = window
+        self.slots = slots
+        self.ids: List[int] = [-1] * slots  # Slot id (ts // window) held at each position, -1 = empty
+        self.stats: List[Optional[list]] = [None] * slots  # [count, sum, min, max, last]
+        self.hists: List[Optional[LogHistogram]] = [None] * slots
+        self.open_pos = -1
+        self.dropped_late = 0  # Samples for a window older than the open one
+
+    def _open(self, ts: float, slot_id: Optional[int] = None):
+        """Position for ts (-1 for a late sample, which is dropped), plus the
+        (ts, stats, hist) of the slot this closes, if any.
+        """
+        if slot_id is None:
+            slot_id = int(ts // self.window)
+        pos = slot_id % self.slots
+        closed = None
+        if pos == self.open_pos and self.ids[pos] == slot_id:
+            return pos, closed
+        if self.open_pos >= 0 and slot_id < self.ids[self.open_pos]:
+            # Out of order: its window is closed (and maybe folded upwards) or was never
+            # opened; writing it here could overwrite a newer window in the ring
+            self.dropped_late += 1
+            return -1, closed
+        if self.ids[pos] != slot_id:
+            if self.open_pos >= 0 and self.ids[self.open_pos] < slot_id:
+                p = self.open_pos
+                closed = (self.ids[p] * self.window, self.stats[p], self.hists[p])
+            self.ids[pos] = slot_id  # Overwrites the window a full ring ago
+            self.stats[pos] = None
+            self.hists[pos] = None
+            self.open_pos = pos
+        return pos, closed
+
+    def add(self, ts: float, value: float, slot_id: Optional[int] = None):
+        pos, closed = self._open(ts, slot_id)
+        if pos < 0:
+            return closed
+        s = self.stats[pos]
+        if s is None:
+            self.stats[pos] = [1, value, value, value, value]
+        else:
+            s[0] += 1
+            s[1] += value
+            if value < s[2]:
+                s[2] = value
+            if value > s[3]:
+                s[3] = value
+            s[4] = value
+        return closed
+
+    def add_histogram(self, ts: float, hist: LogHistogram, adopt: bool = False):
+        """Merge hist into the open slot; with adopt, an empty slot takes hist itself instead of a copy."""
+        pos, closed = self._open(ts)
+        if pos < 0:
+            return closed
+        current = self.hists[pos]
+        if current is None:
+            self.hists[pos] = hist if adopt else hist.copy()
+        else:
+            current.merge(hist)
+        return closed
+
+    def fold(self, ts: float, stats: Optional[list], hist: Optional[LogHistogram]):
+        """Merge a closed finer-level slot into this level."""
+        pos, closed = self._open(ts)
+        if pos < 0:
+            return closed
+        if stats is not None:
+            s = self.stats[pos]
+            if s is None:
+                self.stats[pos] = list(stats)
+            else:
+                s[0] += stats[0]
+                s[1] += stats[1]
+                s[2] = min(s[2], stats[2])
+                s[3] = max(s[3], stats[3])
+                s[4] = stats[4]
+        if hist is not None:
+            current = self.hists[pos]
+            if current is None:
+                self.hists[pos] = hist.copy()
+            else:
+                current.merge(hist)
+        return closed
+
+    def live(self, now: float, seconds: float) -> List[int]:
+        newest = int(now // self.window)
+        oldest = newest - max(1, math.ceil(seconds / self.window)) + 1
+        return [pos for pos in range(self.slots) if oldest <= self.ids[pos] <= newest]
+
+    def series(self, now: float) -> List[Tuple[float, float]]:
+        """(window start, mean) for every held window, oldest first: the downsampled series."""
+        out = [(self.ids[pos] * self.window, self.stats[pos][1] / self.stats[pos][0])
+               for pos in self.live(now, self.window * self.slots) if self.stats[pos] is not None]
+        out.sort()
+        return out
+
+class RollupChain:
+    """Rollup levels from finest to coarsest; each level is fed by the one below as its slots close."""
+
+    def __init__(self, spec: Iterable[Tuple[float, int]]):
+        self.levels = [Rollup(window, slots) for window, slots in spec]
+
+    def _cascade(self, closed):
+        for level in self.levels[1:]:
+            if closed is None:
+                return
+            closed = level.fold(*closed)
+
+    def add(self, ts: float, value: float, slot_id: Optional[int] = None):
+        """slot_id: ts // the finest window, when the caller already has it."""
+        closed = self.levels[0].add(ts, value, slot_id)
+        if closed is not None:
+            self._cascade(closed)
+
+    def add_histogram(self, ts: float, hist: LogHistogram, adopt: bool = False):
+        self._cascade(self.levels[0].add_histogram(ts, hist, adopt))
+
+    def _cells(self, now: float, seconds: float):
+        """(stats, hist) cells covering the last `seconds`: the finest level that spans
+        the range, plus the still-open slots of the finer levels not folded into it yet."""
+        index = next((i for i, r in enumerate(self.levels) if r.window * r.slots >= seconds),
+                     len(self.levels) - 1)
+        level = self.levels[index]
+        cells = [(level.stats[pos], level.hists[pos]) for pos in level.live(now, seconds)]
+        for finer in self.levels[:index]:
+            if finer.open_pos >= 0 and finer.open_pos in finer.live(now, seconds):
+                cells.append((finer.stats[finer.open_pos], finer.hists[finer.open_pos]))
+        return cells
+
+    def summary(self, now: float, seconds: float) -> Dict[str, float]:
+        count, total, lo, hi = 0, 0.0, math.inf, -math.inf
+        for s, _ in self._cells(now, seconds):
+            if s is not None:
+                count += s[0]
+                total += s[1]
+                lo = min(lo, s[2])
+                hi = max(hi, s[3])
+        if not count:
+            return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0}
+        return {'count': count, 'mean': total / count, 'min': lo, 'max': hi}
+
+    def histogram(self, now: float, seconds: float) -> Optional[LogHistogram]:
+        merged = None
+        for _, h in self._cells(now, seconds):
+            if h is not None:
+                if merged is None:
+                    merged = h.copy()
+                else:
+                    merged.merge(h)
+        return merged
+
+class Series:
+    """One metric: raw ring, rollup chain and lifetime count/min/max."""
+
+    def __init__(self, raw_capacity: int, rollups: Iterable[Tuple[float, int]]):
+        self.raw = RingBuffer(raw_capacity)
+        self.rollups = RollupChain(rollups)
+        self.count = 0
+        self.first_ts = None
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, ts: float, value: float, slot_id: Optional[int] = None):
+        self.raw.append(ts, value)
+        self.rollups.add(ts, value, slot_id)
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+class TimeSeriesStore:
+    """Metric name -> Series, plus rollup-only histogram metrics."""
+
+    def __init__(self, raw_capacity: int = 600, rollups=DEFAULT_ROLLUPS):
+        self.raw_capacity = raw_capacity
+        self.rollup_spec = tuple(rollups)
+        self.series: Dict[str, Series] = {}
+        self.histograms: Dict[str, RollupChain] = {}
+        self.last_ts = 0.0
+
+    def record(self, name: str, value: float, ts: float):
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = Series(self.raw_capacity, self.rollup_spec)
+        series.add(ts, value)
+        if ts > self.last_ts:
+            self.last_ts = ts
+
+    def record_many(self, values: Dict[str, float], ts: float):
+        """record() for one sample of many metrics; the finest rollup slot is worked out once."""
+        slot_id = int(ts // self.rollup_spec[0][0]) if self.rollup_spec else None
+        series_by_name = self.series
+        for name, value in values.items():
+            series = series_by_name.get(name)
+            if series is None:
+                series = series_by_name[name] = Series(self.raw_capacity, self.rollup_spec)
+            series.add(ts, value, slot_id)
+        if ts > self.last_ts:
+            self.last_ts = ts
+
+    def record_histogram(self, name: str, hist: LogHistogram, ts: float, adopt: bool = False):
+        """Add one sample's histogram. Pass adopt=True to hand hist over (it must not be changed afterwards)."""
+        chain = self.histograms.get(name)
+        if chain is None:
+            chain = self.histograms[name] = RollupChain(self.rollup_spec)
+        chain.add_histogram(ts, hist, adopt)
+        if ts > self.last_ts:
+            self.last_ts = ts
+
+    def get(self, name: str) -> Optional[Series]:
+        return self.series.get(name)
+
+    def window(self, name: str, seconds: float, now: Optional[float] = None) -> Dict[str, float]:
+        """count/mean/min/max of `name` over the last `seconds` (rollup granularity)."""
+        series = self.series.get(name)
+        if series is None:
+            return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0}
+        return series.rollups.summary(now or self.last_ts, seconds)
+
+    def quantile(self, name: str, q: float, seconds: float, now: Optional[float] = None) -> float:
+        chain = self.histograms.get(name)
+        if chain is None:
+            return 0.0
+        hist = chain.histogram(now or self.last_ts, seconds)
+        return hist.quantile(q) if hist is not None else 0.0
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: fixed per series, plus histogram buckets in use."""
+        raw = len(self.series) * self.raw_capacity * 24
+        slots = (len(self.series) + len(self.histograms)) * sum(slots for _, slots in self.rollup_spec) * 120
+        buckets = sum(len(h.counts) for chain in self.histograms.values() for r in chain.levels
+                      for h in r.hists if h is not None) * 70
+        return raw + slots + buckets
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Tick-phase job graph scheduler on top of GameThreadPool.
+
+A server tick is declared once as a graph of jobs with dependencies
+(input -> AI -> physics -> replication, possibly split into shards).
+Every tick, TickScheduler submits each job the moment its last dependency
+finishes, so independent shards of different phases overlap instead of
+waiting on a phase-wide barrier.
+
+After the tick it reports:
+    critical path  - longest dependency chain by measured run time; no
+                     amount of extra workers gets the tick below this
+    worker idle    - per worker, tick wall time not spent running jobs
+    phases         - first start to last finish per phase
+    deadline       - whether the tick fit its frame budget; the budget is
+                     enforced: once it runs out, jobs not yet dispatched
+                     are skipped (timed_out) and jobs still queued or
+                     running are reported (overran) instead of waited for
+
+Usage:
+    python job_graph.py --shards 8 --workers 4 --ticks 20
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from thread_pool import FINISHED, GameThreadPool, TaskFuture
+
+class Job:
+    """One node of the graph: func(*args) once all deps have finished."""
+    __slots__ = ('name', 'func', 'args', 'deps', 'phase', 'dependents')
+
+    def __init__(self, name: str, func: Callable, args: tuple, deps: Iterable[str], phase: Optional[str]):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.deps = list(deps)
+        self.phase = phase
+        self.dependents: List[str] = []
+
+class JobGraph:
+    """Static description of one tick's work."""
+
+    def __init__(self, name: str = "tick", deadline: Optional[float] = 1 / 60):
+        self.name = name
+        self.deadline = deadline
+        self.jobs: Dict[str, Job] = {}
+        self._order: Optional[List[str]] = None
+
+    def add(self, name: str, func: Callable, *args, deps: Iterable[str] = (), phase: Optional[str] = None) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"Duplicate job: {name!r}")
+        job = Job(name, func, args, deps, phase)
+        self.jobs[name] = job
+        self._order = None
+        return job
+
+    def order(self) -> List[str]:
+        """Topological order; raises ValueError on unknown dependencies or cycles."""
+        if self._order is not None:
+            return self._order
+        for job in self.jobs.values():
+            job.dependents = []
+        for job in self.jobs.values():
+            for dep in job.deps:
+                if dep not in self.jobs:
+                    raise ValueError(f"Job {job.name!r} depends on unknown job {dep!r}")
+                self.jobs[dep].dependents.append(job.name)
+        remaining = {name: len(job.deps) for name, job in self.jobs.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for dependent in self.jobs[name].dependents:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.jobs):
+            stuck = sorted(name for name, count in remaining.items() if count)
+            raise ValueError(f"Dependency cycle among: {', '.join(stuck)}")
+        self._order = order
+        return order
+
+class TickScheduler:
+    """Runs a JobGraph on a pool, dispatching jobs as their inputs become ready."""
+
+    def __init__(self, pool: GameThreadPool):
+        self.pool = pool
+
+    def run(self, graph: JobGraph) -> dict:
+        """Execute one tick of graph; returns the tick report."""
+        order = graph.order()
+        jobs = graph.jobs
+        remaining = {name: len(job.deps) for name, job in jobs.items()}
+        futures: Dict[str, TaskFuture] = {}
+        ready_ns: Dict[str, int] = {}
+        failed: Dict[str, BaseException] = {}
+        skipped: List[str] = []
+        timed_out: List[str] = []
+        lock = threading.Lock()
+        finished = threading.Event()
+        state = {'pending': len(jobs), 'expired': False}
+
+        def dispatch(name: str):
+            with lock:
+                if state['expired']:  # Became ready just as the budget ran out
+                    timed_out.append(name)
+                    return
+            ready_ns[name] = time.perf_counter_ns()
+            job = jobs[name]
+            try:
+                future = self.pool.submit(job.func, *job.args)
+            except Exception as e:  # e.g. PoolShutdownError: fail the job instead of hanging the tick
+                settle(name, e)
+                return
+            futures[name] = future
+            future.add_done_callback(lambda f, name=name: settle(name, f.exception()))
+
+        def skip_dependents(name: str) -> int:
+            count = 0
+            stack = list(jobs[name].dependents)
+            while stack:
+                dependent = stack.pop()
+                if remaining[dependent] >= 0:
+                    remaining[dependent] = -1  # Never becomes ready
+                    skipped.append(dependent)
+                    count += 1
+                    stack.extend(jobs[dependent].dependents)
+            return count
+
+        def settle(name: str, error: Optional[BaseException]):
+            ready = []
+            with lock:
+                if error is not None:
+                    failed[name] = error
+                    state['pending'] -= skip_dependents(name)
+                elif not state['expired']:
+                    for dependent in jobs[name].dependents:
+                        if remaining[dependent] > 0:
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                ready.append(dependent)
+                state['pending'] -= 1
+                done = state['pending'] == 0
+            for dependent in ready:
+                dispatch(dependent)
+            if done:
+                finished.set()
+
+        start_ns = time.perf_counter_ns()
+        roots = [name for name in order if not jobs[name].deps]
+        overran: List[str] = []
+        if roots:
+            for name in roots:
+                dispatch(name)
+            timeout = None
+            if graph.deadline is not None:
+                timeout = max(0.0, graph.deadline - (time.perf_counter_ns() - start_ns) / 1e9)
+            if not finished.wait(timeout):
+                with lock:
+                    state['expired'] = True  # settle() stops dispatching dependents
+                    for name in order:
+                        if remaining[name] > 0:
+                            remaining[name] = -1
+                            timed_out.append(name)
+                    overran = [name for name, future in list(futures.items()) if not future.done()]
+        end_ns = time.perf_counter_ns()
+        report = self._report(graph, futures, ready_ns, failed, skipped, start_ns, end_ns)
+        with lock:  # Late completions keep settling after the deadline
+            report['timed_out'] = list(timed_out)
+        report['overran'] = overran
+        return report
+
+    def _report(self, graph, futures, ready_ns, failed, skipped, start_ns, end_ns) -> dict:
+        jobs = graph.jobs
+        wall_ns = end_ns - start_ns
+        futures = {name: f for name, f in list(futures.items()) if f.state == FINISHED}
+
+        # Longest chain by measured run time, in topological order
+        best: Dict[str, int] = {}
+        via: Dict[str, Optional[str]] = {}
+        for name in graph.order():
+            future = futures.get(name)
+            if future is None:
+                continue
+            prev = max((d for d in jobs[name].deps if d in best), key=best.get, default=None)
+            best[name] = future.run_ns + (best[prev] if prev else 0)
+            via[name] = prev
+        path = []
+        node = max(best, key=best.get, default=None)
+        while node is not None:
+            path.append(node)
+            node = via[node]
+        path.reverse()
+
+        busy = [0] * self.pool.num_workers
+        for future in futures.values():
+            if future.worker >= 0:
+                busy[future.worker] += future.run_ns
+
+        phases: Dict[str, dict] = {}
+        for name, future in futures.items():
+            phase = jobs[name].phase
+            if phase is None:
+                continue
+            span = phases.setdefault(phase, {'start_ns': future.started_ns, 'end_ns': future.finished_ns,
+                                             'busy_ns': 0, 'jobs': 0})
+            span['start_ns'] = min(span['start_ns'], future.started_ns)
+            span['end_ns'] = max(span['end_ns'], future.finished_ns)
+            span['busy_ns'] += future.run_ns
+            span['jobs'] += 1
+
+        dispatch_delay = [futures[n].started_ns - ready_ns[n] for n in futures]
+        return {
+            'graph': graph.name,
+            'wall_ms': wall_ns / 1e6,
+            'deadline_ms': graph.deadline * 1000 if graph.deadline is not None else None,
+            'deadline_met': graph.deadline is None or wall_ns <= graph.deadline * 1e9,
+            'critical_path_ms': (best[path[-1]] / 1e6) if path else 0.0,
+            'critical_path': path,
+            'work_ms': sum(busy) / 1e6,
+            'worker_busy_ms': [ns / 1e6 for ns in busy],
+            'worker_idle_ms': [(wall_ns - ns) / 1e6 for ns in busy],
+            'phases': {p: {'start_ms': (s['start_ns'] - start_ns) / 1e6, 'end_ms': (s['end_ns'] - start_ns) / 1e6,
+                           'busy_ms': s['busy_ns'] / 1e6, 'jobs': s['jobs']}
+                       for p, s in sorted(phases.items(), key=lambda kv: kv[1]['start_ns'])},
+            'max_dispatch_delay_us': max(dispatch_delay, default=0) / 1000,
+            'failed': {name: repr(e) for name, e in list(failed.items())},
+            'skipped': list(skipped),
+        }
+
+# ----- Example tick -----
+
+def _spin(us: float) -> int:
+    """Stand-in for pure-Python game work of roughly `us` microseconds."""
+    deadline = time.perf_counter_ns() + int(us * 1000)
+    n = 0
+    while time.perf_counter_ns() < deadline:
+        n += 1
+    return n
+
+def _wait_io(us: float):
+    """Stand-in for work that releases the GIL (socket reads, DB calls)."""
+    time.sleep(us / 1e6)
+
+def build_game_tick(shards: int, deadline: float = 1 / 60) -> JobGraph:
+    """input -> AI -> physics -> replication, sharded; physics also needs the neighbouring AI shard."""
+    graph = JobGraph("game_tick", deadline)
+    for s in range(shards):
+        graph.add(f"input/{s}", _wait_io, 400, phase="input")
+    for s in range(shards):
+        graph.add(f"ai/{s}", _spin, 250, deps=[f"input/{s}"], phase="ai")
+    for s in range(shards):
+        graph.add(f"physics/{s}", _spin, 300, deps=[f"ai/{s}", f"ai/{(s + 1) % shards}"], phase="physics")
+    for s in range(shards):
+        graph.add(f"replication/{s}", _wait_io, 300, deps=[f"physics/{s}"], phase="replication")
+    return graph
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tick job graph scheduler")
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--deadline-ms', type=float, default=1000 / 60)
+    args = parser.parse_args()
+
+    graph = build_game_tick(args.shards, args.deadline_ms / 1000)
+    with GameThreadPool(num_workers=args.workers) as pool:
+        scheduler = TickScheduler(pool)
+        reports = [scheduler.run(graph) for _ in range(args.ticks)]
+
+    reports.sort(key=lambda r: r['wall_ms'])
+    median = reports[len(reports) // 2]
+    missed = sum(not r['deadline_met'] for r in reports)
+    dropped = sum(len(r['timed_out']) + len(r['overran']) for r in reports)
+    print("\n" + "=" * 70)
+    print(f"TICK JOB GRAPH ({len(graph.jobs)} jobs, {args.workers} workers, {args.ticks} ticks)")
+    print("=" * 70)
+    print(f"Tick wall (median): {median['wall_ms']:7.2f} ms   budget {median['deadline_ms']:.2f} ms   "
+          f"missed {missed}/{len(reports)}")
+    if dropped:
+        print(f"Over budget:        {dropped} jobs skipped or left running across all ticks")
+    print(f"Critical path:      {median['critical_path_ms']:7.2f} ms   {' -> '.join(median['critical_path'])}")
+    print(f"Total work:         {median['work_ms']:7.2f} ms   "
+          f"(parallelism {median['work_ms'] / median['wall_ms']:.2f})")
+    print(f"Max dispatch delay: {median['max_dispatch_delay_us']:7.0f} µs")
+    print("-" * 70)
+    for phase, span in median['phases'].items():
+        print(f"  {phase:12} {span['start_ms']:6.2f} -> {span['end_ms']:6.2f} ms   "
+              f"{span['jobs']} jobs, {span['busy_ms']:6.2f} ms busy")
+    print("-" * 70)
+    for w, (busy, idle) in enumerate(zip(median['worker_busy_ms'], median['worker_idle_ms'])):
+        print(f"  worker {w}: busy {busy:6.2f} ms   idle {idle:6.2f} ms")
+    print("=" * 70)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+GameThreadPool vs concurrent.futures.ThreadPoolExecutor on tick-sized tasks.
+
+Every "tick" submits a burst of tiny tasks (a few µs of Python each) and
+waits for all of them, as a server would fan out per-entity work. Reports
+wall time per tick and per-task overhead for:
+    submit     - one submit() per task, then wait on every future
+    batch      - GameThreadPool.submit_batch() / executor.map()
+    map        - map() with chunking (executor.map(chunksize=...) only
+                 chunks for process pools, so its thread variant runs per item)
+
+Usage:
+    python pool_benchmark.py --tasks 2000 --ticks 50 --workers 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from thread_pool import GameThreadPool, task_timing_summary
+
+
+def tick_task(entity_id: int) -> int:
+    """A few µs of pure-Python work, like one entity's AI or movement step."""
+    acc = entity_id
+    for i in range(20):
+        acc = (acc * 31 + i) & 0xFFFF
+    return acc
+
+
+def run_ticks(ticks: int, body) -> float:
+    """Seconds per tick (median) of body()."""
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        body()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def bench_executor(workers: int, tasks: int, ticks: int) -> dict:
+    ids = list(range(tasks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit():
+            wait([executor.submit(tick_task, i) for i in ids])
+
+        def batch():
+            list(executor.map(tick_task, ids))
+
+        return {'submit': run_ticks(ticks, submit), 'batch': run_ticks(ticks, batch),
+                'map': run_ticks(ticks, batch)}
+
+
+def bench_pool(workers: int, tasks: int, ticks: int) -> dict:
+    ids = list(range(tasks))
+    args = [(i,) for i in ids]
+    with GameThreadPool(num_workers=workers) as pool:
+        def submit():
+            futures = [pool.submit(tick_task, i) for i in ids]
+            for f in futures:
+                f.result()
+
+        def batch():
+            for f in pool.submit_batch(tick_task, args):
+                f.result()
+
+        def mapped():
+            list(pool.map(tick_task, ids))
+
+        result = {'submit': run_ticks(ticks, submit), 'batch': run_ticks(ticks, batch),
+                  'map': run_ticks(ticks, mapped)}
+        futures = pool.submit_batch(tick_task, args)
+        pool.wait_all()
+        result['timing'] = task_timing_summary(futures)
+        result['stats'] = pool.stats()
+    return result
+
+
+def serial_baseline(tasks: int, ticks: int) -> float:
+    ids = list(range(tasks))
+    return run_ticks(ticks, lambda: [tick_task(i) for i in ids])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread pool overhead benchmark")
+    parser.add_argument('--tasks', type=int, default=2000, help="Tasks per tick")
+    parser.add_argument('--ticks', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    serial = serial_baseline(args.tasks, args.ticks)
+    executor = bench_executor(args.workers, args.tasks, args.ticks)
+    pool = bench_pool(args.workers, args.tasks, args.ticks)
+
+    print("\n" + "=" * 70)
+    print(f"TICK FAN-OUT ({args.tasks} tasks/tick, {args.workers} workers, median of {args.ticks} ticks)")
+    print("=" * 70)
+    print(f"Serial (no pool):      {serial * 1000:8.2f} ms/tick  "
+          f"{serial / args.tasks * 1e6:6.2f} µs/task")
+    print(f"{'Mode':8} | {'ThreadPoolExecutor':>24} | {'GameThreadPool':>24} | {'Speedup':>7}")
+    print("-" * 70)
+    for mode in ('submit', 'batch', 'map'):
+        e, p = executor[mode], pool[mode]
+        print(f"{mode:8} | {e * 1000:8.2f} ms {e / args.tasks * 1e6:6.2f} µs/t | "
+              f"{p * 1000:8.2f} ms {p / args.tasks * 1e6:6.2f} µs/t | {e / p:6.1f}x")
+    print("-" * 70)
+    t = pool['timing']
+    print(f"GameThreadPool task timing: queue p50 {t['queue_p50_us']:.0f} µs, p99 {t['queue_p99_us']:.0f} µs; "
+          f"run p50 {t['run_p50_us']:.1f} µs, p99 {t['run_p99_us']:.1f} µs")
+    print(f"Stolen tasks: {pool['stats']['stolen']} of {pool['stats']['completed']}")
+    print("=" * 70)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Process-based backend for GameThreadPool: same API, real parallelism for CPU-bound work.
+
+Pure-Python physics holds the GIL, so the thread pool runs it one core at a
+time. GameProcessPool keeps persistent worker processes instead. Tasks go
+out in chunks (one pickle and one queue round-trip per chunk, not per
+task) and a collector thread in the parent resolves the TaskFutures.
+
+Each worker reports back on its own pipe, first claiming a chunk and then
+returning its results. If a worker process dies, its pipe hits EOF and the
+tasks it had claimed fail with WorkerDiedError; once no worker is left,
+every outstanding task fails the same way.
+
+Entity data should not travel with the tasks: put it in SharedArrays
+(multiprocessing.shared_memory) and pass the small, picklable `spec`; the
+worker attaches once and reads the columns in place.
+
+Task functions must be importable module-level functions (they are pickled
+by reference).
+"""
+import itertools
+import multiprocessing as mp
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from thread_pool import FINISHED, CANCELLED, PoolShutdownError, TaskFuture, _run_chunk
+
+CLAIM, RESULTS = 0, 1  # Message kinds on a worker's result pipe
+
+class WorkerDiedError(RuntimeError):
+    """Raised by TaskFuture.result() for tasks whose worker process died."""
+
+class SharedArrays:
+    """Named typed columns in one shared memory block.
+
+    The creating process owns the block (close() unlinks it); workers call
+    SharedArrays.attach(spec) and get memoryviews onto the same memory.
+    """
+
+    def __init__(self, columns: Dict[str, int], typecode: str = 'd'):
+        itemsize = array(typecode).itemsize
+        layout = []
+        offset = 0
+        for name, length in columns.items():
+            layout.append((name, offset, length))
+            offset += length * itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        self.spec = (self.shm.name, typecode, tuple(layout))
+        self.columns = _map_columns(self.shm, typecode, layout)
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self.columns[name]
+
+    @staticmethod
+    def attach(spec) -> Dict[str, memoryview]:
+        """Columns for spec in this process; attached once and cached."""
+        columns = _attached.get(spec[0])
+        if columns is None:
+            name, typecode, layout = spec
+            shm = shared_memory.SharedMemory(name=name)
+            columns = _map_columns(shm, typecode, layout)
+            _attached[name] = columns
+            _attached_blocks.append(shm)  # Keep the mapping alive
+        return columns
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        self.shm.close()
+        self.shm.unlink()
+
+_attached: Dict[str, Dict[str, memoryview]] = {}
+_attached_blocks: List[shared_memory.SharedMemory] = []
+
+def _map_columns(shm, typecode: str, layout) -> Dict[str, memoryview]:
+    itemsize = array(typecode).itemsize
+    buf = shm.buf
+    return {name: buf[offset:offset + length * itemsize].cast(typecode) for name, offset, length in layout}
+
+def _process_worker(index: int, tasks, conn):
+    """Worker process: run chunks of (task_id, func, args) until the None sentinel."""
+    clock = time.perf_counter_ns
+    while True:
+        chunk = tasks.get()
+        if chunk is None:
+            conn.close()
+            return
+        conn.send((CLAIM, [task_id for task_id, _, _ in chunk]))
+        out = []
+        for task_id, func, args in chunk:
+            start = clock()
+            try:
+                value, ok = func(*args), True
+            except Exception as e:
+                value, ok = e, False
+            out.append((task_id, ok, value, start, clock()))
+        try:
+            conn.send((RESULTS, out))  # Pickles before writing, so failures surface here
+        except Exception:  # Unpicklable result or exception: report it instead
+            conn.send((RESULTS, [(tid, False, RuntimeError(f"unpicklable result: {v!r}"), s, e)
+                                 for tid, _, v, s, e in out]))
+
+class GameProcessPool:
+    """Persistent worker processes behind the GameThreadPool API."""
+
+    def __init__(self, num_workers: Optional[int] = None, chunk_size: int = 16):
+        self.num_workers = num_workers or mp.cpu_count()
+        self.chunk_size = chunk_size
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context('fork' if 'fork' in methods else 'spawn')
+        self._tasks = ctx.Queue()
+        self._futures: Dict[int, TaskFuture] = {}
+        self._ids = itertools.count()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self.completed = [0] * self.num_workers
+        self.busy_ns = [0] * self.num_workers
+        self.workers = []
+        self._readers = []
+        for i in range(self.num_workers):
+            reader, writer = ctx.Pipe(duplex=False)
+            worker = ctx.Process(target=_process_worker, args=(i, self._tasks, writer), daemon=True)
+            worker.start()
+            writer.close()  # Before the next fork, so only worker i holds it and its exit means EOF
+            self.workers.append(worker)
+            self._readers.append(reader)
+        self._collector = threading.Thread(target=self._collect, name="process-pool-results", daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        """Resolve futures from the workers' pipes until every worker has exited."""
+        live = {reader: i for i, reader in enumerate(self._readers)}
+        claimed: List[List[int]] = [[] for _ in self.workers]
+        while live:
+            for reader in wait(list(live)):
+                index = live[reader]
+                try:
+                    kind, payload = reader.recv()
+                except (EOFError, OSError):
+                    del live[reader]
+                    reader.close()
+                    self._worker_exited(index, claimed[index], not live)
+                    claimed[index] = []
+                    continue
+                if kind == CLAIM:
+                    claimed[index] = payload
+                    continue
+                claimed[index] = []
+                with self._lock:
+                    futures = [self._futures.pop(task_id) for task_id, *_ in payload]
+                for future, (_, ok, value, start, end) in zip(futures, payload):
+                    future.worker = index
+                    future.started_ns = start
+                    if ok:
+                        future._result = value
+                    else:
+                        future._exception = value
+                    future._finish(FINISHED, end)  # Worker clock: perf_counter is system-wide on Linux
+                    self.busy_ns[index] += end - start
+                self.completed[index] += len(payload)
+                with self._lock:
+                    if not self._futures:
+                        self._drained.notify_all()
+
+    def _worker_exited(self, index: int, claimed: List[int], last: bool):
+        """Fail the tasks a dead worker held; with no workers left, fail everything outstanding."""
+        worker = self.workers[index]
+        worker.join(1.0)
+        with self._lock:
+            task_ids = list(self._futures) if last else [t for t in claimed if t in self._futures]
+            futures = [self._futures.pop(task_id) for task_id in task_ids]
+        for future in futures:
+            future.worker = index
+            future._exception = WorkerDiedError(f"worker {index} exited with code {worker.exitcode}")
+            future._finish(FINISHED)
+        with self._lock:
+            if not self._futures:
+                self._drained.notify_all()
+
+    def _dispatch(self, func: Callable, args_list: List[tuple]) -> List[TaskFuture]:
+        if self._shutdown:
+            raise PoolShutdownError("pool is shut down")
+        futures = [TaskFuture(func, args) for args in args_list]
+        entries = []
+        with self._lock:
+            for future in futures:
+                task_id = next(self._ids)
+                self._futures[task_id] = future
+                entries.append((task_id, func, future.args))
+        size = self.chunk_size
+        for i in range(0, len(entries), size):
+            self._tasks.put(entries[i:i + size])
+        return futures
+
+    def submit(self, func: Callable, *args) -> TaskFuture:
+        """Submit a task to the pool; returns its future."""
+        return self._dispatch(func, [args])[0]
+
+    def submit_batch(self, func: Callable, args_list: Iterable[tuple]) -> List[TaskFuture]:
+        """Submit func(*args) for every args tuple, chunk_size tasks per message."""
+        return self._dispatch(func, list(args_list))
+
+    def map(self, func: Callable, iterable: Iterable, chunksize: Optional[int] = None,
+            timeout: Optional[float] = None):
+        """Like builtin map, run in worker processes; results in order."""
+        items = list(iterable)
+        if chunksize is None:
+            chunksize = max(1, len(items) // (self.num_workers * 4))
+        futures = self.submit_batch(_run_chunk, [(func, items[i:i + chunksize])
+                                                 for i in range(0, len(items), chunksize)])
+
+        def results():
+            for future in futures:
+                yield from future.result(timeout)
+        return results()
+
+    def wait_all(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all tasks to complete; False on timeout."""
+        with self._lock:
+            return self._drained.wait_for(lambda: not self._futures, timeout)
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stop accepting tasks, let workers finish (or cancel what has not run), stop processes."""
+        self._shutdown = True
+        if cancel_pending:
+            while True:
+                try:
+                    chunk = self._tasks.get_nowait()
+                except Exception:
+                    break
+                with self._lock:
+                    futures = [self._futures.pop(task_id) for task_id, *_ in chunk]
+                for future in futures:
+                    future._finish(CANCELLED)
+        for _ in self.workers:
+            self._tasks.put(None)
+        if wait:
+            self.wait_all()
+            for worker in self.workers:
+                worker.join()
+            self._collector.join()  # Returns once every worker's pipe is closed
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.num_workers,
+            'completed': sum(self.completed),
+            'per_worker_completed': list(self.completed),
+            'per_worker_busy_ms': [ns / 1e6 for ns in self.busy_ns],
+            'queued': len(self._futures),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+
+# ----- Collision kernel -----
+
+def make_entities(count: int, world: float = 1000.0, seed: int = 3) -> SharedArrays:
+    """Entities with x, y, radius columns in shared memory."""
+    import random
+    rng = random.Random(seed)
+    store = SharedArrays({'x': count, 'y': count, 'r': count})
+    x, y, r = store['x'], store['y'], store['r']
+    for i in range(count):
+        x[i] = rng.uniform(0, world)
+        y[i] = rng.uniform(0, world)
+        r[i] = rng.uniform(1.0, 6.0)
+    return store
+
+def collide_range(spec, start: int, end: int) -> int:
+    """Count overlapping pairs (i, j) with start <= i < end and i < j: brute-force circle tests."""
+    columns = SharedArrays.attach(spec) if isinstance(spec, tuple) else spec
+    # Only rows >= start can pair with this range: copy that tail, not the whole column
+    xs, ys, rs = (columns[c][start:].tolist() for c in ('x', 'y', 'r'))
+    n = len(xs)
+    hits = 0
+    for i in range(end - start):
+        xi, yi, ri = xs[i], ys[i], rs[i]
+        for j in range(i + 1, n):
+            dx = xs[j] - xi
+            if -12.0 < dx < 12.0:
+                dy = ys[j] - yi
+                reach = ri + rs[j]
+                if dx * dx + dy * dy < reach * reach:
+                    hits += 1
+    return hits
+
+def collision_ranges(count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, count) so every range has about the same number of (i, j>i) pairs."""
+    total = count * (count - 1) / 2
+    bounds = [0]
+    acc = 0.0
+    for i in range(count):
+        acc += count - 1 - i
+        if acc >= total * len(bounds) / parts and len(bounds) < parts:
+            bounds.append(i + 1)
+    bounds.append(count)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+if __name__ == "__main__":
+    import argparse
+    from thread_pool import GameThreadPool
+
+    parser = argparse.ArgumentParser(description="Thread vs process backend on a collision kernel")
+    parser.add_argument('--entities', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=mp.cpu_count())
+    parser.add_argument('--parts', type=int, default=64, help="Ranges the kernel is split into")
+    args = parser.parse_args()
+
+    store = make_entities(args.entities)
+    ranges = collision_ranges(args.entities, args.parts)
+    try:
+        collide_range(store.columns, *ranges[0])  # Warm up
+        start = time.perf_counter()
+        serial = sum(collide_range(store.columns, a, b) for a, b in ranges)
+        serial_s = time.perf_counter() - start
+
+        with GameThreadPool(num_workers=args.workers) as pool:
+            start = time.perf_counter()
+            threaded = sum(f.result() for f in pool.submit_batch(collide_range, [(store.columns, a, b)
+                                                                                 for a, b in ranges]))
+            thread_s = time.perf_counter() - start
+
+        with GameProcessPool(num_workers=args.workers, chunk_size=1) as pool:
+            pool.submit_batch(collide_range, [(store.spec, *ranges[0])] * args.workers)
+            pool.wait_all()  # Warm up: workers attach the shared block before timing starts
+            start = time.perf_counter()
+            processed = sum(f.result() for f in pool.submit_batch(collide_range, [(store.spec, a, b)
+                                                                                  for a, b in ranges]))
+            process_s = time.perf_counter() - start
+    finally:
+        store.close()
+
+    assert serial == threaded == processed, (serial, threaded, processed)
+    print("\n" + "=" * 60)
+    print(f"COLLISION KERNEL ({args.entities} entities, {len(ranges)} tasks, "
+          f"{args.workers} workers, {mp.cpu_count()} CPUs)")
+    print("=" * 60)
+    print(f"Overlapping pairs: {serial}")
+    print(f"Serial:          {serial_s * 1000:8.1f} ms")
+    print(f"Thread backend:  {thread_s * 1000:8.1f} ms  ({serial_s / thread_s:4.2f}x)")
+    print(f"Process backend: {process_s * 1000:8.1f} ms  ({serial_s / process_s:4.2f}x)")
+    print("=" * 60)
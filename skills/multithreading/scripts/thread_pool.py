@@ -1,44 +1,299 @@
 #!/usr/bin/env python3
-"""Thread pool implementation for game server tasks."""
+"""Thread pool implementation for game server tasks.
+
+Each worker owns a deque. The owner pops from the right end (newest first,
+still warm in cache) and idle workers steal from the left end of a
+victim's deque. submit() returns a TaskFuture; submit_batch() and map()
+spread many small tasks over the deques with one extend() per worker and a
+single wakeup, which keeps per-task overhead low for tick-sized work.
+
+Every future records which worker ran it and when it was submitted,
+started and finished (perf_counter_ns), so callers can build timing stats.
+"""
+import itertools
+import logging
 import threading
-import queue
 import time
+from collections import deque
+from typing import Callable, Iterable, List, Optional
+
+PENDING, RUNNING, FINISHED, CANCELLED = 'pending', 'running', 'finished', 'cancelled'
+
+_callback_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+class PoolShutdownError(RuntimeError):
+    """Raised when submitting to a pool that is shutting down."""
+
+class TaskCancelledError(RuntimeError):
+    """Raised by TaskFuture.result() for tasks dropped at shutdown."""
+
+class TaskFuture:
+    """Result handle for one task; result() blocks, re-raising the task's exception."""
+    __slots__ = ('func', 'args', 'state', '_result', '_exception', '_event', '_callbacks',
+                 'worker', 'submitted_ns', 'started_ns', 'finished_ns')
+
+    def __init__(self, func: Callable, args: tuple):
+        self.func = func
+        self.args = args
+        self.state = PENDING
+        self._result = None
+        self._exception: Optional[BaseException] = None
+        self._event: Optional[threading.Event] = None  # Created only if someone has to wait
+        self._callbacks = None
+        self.worker = -1
+        self.submitted_ns = time.perf_counter_ns()
+        self.started_ns = 0
+        self.finished_ns = 0
+
+    def done(self) -> bool:
+        return self.state in (FINISHED, CANCELLED)
+
+    def _wait(self, timeout: Optional[float]):
+        if self.done():
+            return
+        with _callback_lock:  # _finish() picks up the event under the same lock
+            if self.done():
+                return
+            event = self._event
+            if event is None:
+                event = self._event = threading.Event()
+        if not event.wait(timeout):
+            raise TimeoutError("task did not finish in time")
+
+    def result(self, timeout: Optional[float] = None):
+        self._wait(timeout)
+        if self.state == CANCELLED:
+            raise TaskCancelledError("task was cancelled")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn: Callable[['TaskFuture'], None]):
+        """Call fn(future) on completion (in the worker thread), or now if already done."""
+        with _callback_lock:
+            if not self.done():
+                if self._callbacks is None:
+                    self._callbacks = []
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    @property
+    def queue_ns(self) -> int:
+        return self.started_ns - self.submitted_ns
+
+    @property
+    def run_ns(self) -> int:
+        return self.finished_ns - self.started_ns
+
+    def _finish(self, state: str, finished_ns: int = 0):
+        self.finished_ns = finished_ns or time.perf_counter_ns()  # Before done() can see it
+        self.func = self.args = None
+        self.state = state
+        with _callback_lock:
+            event = self._event
+            callbacks, self._callbacks = self._callbacks, None
+        if event is not None:
+            event.set()
+        if callbacks:
+            for fn in callbacks:
+                try:
+                    fn(self)
+                except Exception:  # A bad callback must not kill the worker before _task_done()
+                    logger.exception("done callback %r raised", fn)
 
 class GameThreadPool:
-    """Thread pool for CPU-bound game operations."""
+    """Work-stealing thread pool for game server tasks."""
 
-    def __init__(self, num_workers: int = 4):
-        self.tasks = queue.Queue()
+    def __init__(self, num_workers: int = 4, name: str = "game-pool"):
+        self.num_workers = num_workers
+        self.deques = [deque() for _ in range(num_workers)]
+        self._cv = threading.Condition()
+        self._idle = 0
+        self._shutdown = False
+        self._next = itertools.count()
+        self._outstanding = 0
+        self._count_lock = threading.Lock()
+        self._drained = threading.Condition(self._count_lock)
+        self.completed = [0] * num_workers
+        self.stolen = [0] * num_workers
+        self.busy_ns = [0] * num_workers
         self.workers = []
-        self.results = {}
-        self._lock = threading.Lock()
 
         for i in range(num_workers):
-            worker = threading.Thread(target=self._worker, daemon=True)
+            worker = threading.Thread(target=self._worker, args=(i,), name=f"{name}-{i}", daemon=True)
             worker.start()
             self.workers.append(worker)
 
-    def _worker(self):
-        """Worker thread that processes tasks."""
+    def _find_task(self, index: int) -> Optional[TaskFuture]:
+        own = self.deques[index]
+        try:
+            return own.pop()
+        except IndexError:
+            pass
+        n = self.num_workers
+        for offset in range(1, n):
+            victim = self.deques[(index + offset) % n]
+            try:
+                task = victim.popleft()
+            except IndexError:
+                continue
+            self.stolen[index] += 1
+            return task
+        return None
+
+    def _worker(self, index: int):
+        """Worker thread: run own tasks, steal when empty, sleep when everything is empty."""
+        clock = time.perf_counter_ns
         while True:
-            task_id, func, args = self.tasks.get()
+            task = self._find_task(index)
+            if task is None:
+                with self._cv:
+                    self._idle += 1
+                    # Re-check under the lock: submitters notify only after pushing
+                    while not self._shutdown and not any(self.deques):
+                        self._cv.wait()
+                    self._idle -= 1
+                    if self._shutdown and not any(self.deques):
+                        return
+                continue
+            task.state = RUNNING
+            task.worker = index
+            task.started_ns = clock()
             try:
-                result = func(*args)
-                with self._lock:
-                    self.results[task_id] = result
-            except Exception as e:
-                with self._lock:
-                    self.results[task_id] = f"Error: {e}"
-            finally:
-                self.tasks.task_done()
-
-    def submit(self, task_id: str, func, *args):
-        """Submit a task to the pool."""
-        self.tasks.put((task_id, func, args))
-
-    def wait_all(self):
-        """Wait for all tasks to complete."""
-        self.tasks.join()
+                task._result = task.func(*task.args)
+            except BaseException as e:
+                task._exception = e
+            task._finish(FINISHED)
+            self.busy_ns[index] += task.finished_ns - task.started_ns
+            self.completed[index] += 1
+            self._task_done(1)
+
+    def _task_done(self, count: int):
+        with self._count_lock:
+            self._outstanding -= count
+            if self._outstanding == 0:
+                self._drained.notify_all()
+
+    def submit(self, func: Callable, *args) -> TaskFuture:
+        """Submit a task to the pool; returns its future."""
+        task = TaskFuture(func, args)
+        # Check and push under _cv: workers exit under it once shut down with empty deques
+        with self._cv:
+            if self._shutdown:
+                raise PoolShutdownError("pool is shut down")
+            with self._count_lock:
+                self._outstanding += 1
+            self.deques[next(self._next) % self.num_workers].append(task)
+            if self._idle:
+                self._cv.notify(1)
+        return task
+
+    def submit_batch(self, func: Callable, args_list: Iterable[tuple]) -> List[TaskFuture]:
+        """Submit func(*args) for every args tuple; one push per worker deque."""
+        if self._shutdown:
+            raise PoolShutdownError("pool is shut down")
+        tasks = [TaskFuture(func, args) for args in args_list]
+        if not tasks:
+            return tasks
+        n = self.num_workers
+        with self._cv:
+            if self._shutdown:
+                raise PoolShutdownError("pool is shut down")
+            with self._count_lock:
+                self._outstanding += len(tasks)
+            first = next(self._next)
+            for i in range(n):
+                chunk = tasks[i::n]
+                if chunk:
+                    self.deques[(first + i) % n].extend(chunk)
+            if self._idle:
+                self._cv.notify(min(n, len(tasks)))
+        return tasks
+
+    def map(self, func: Callable, iterable: Iterable, chunksize: Optional[int] = None,
+            timeout: Optional[float] = None):
+        """Like builtin map, run in parallel; results in order. Items run in chunks to amortise overhead."""
+        items = list(iterable)
+        if not items:
+            return iter(())
+        if chunksize is None:
+            chunksize = max(1, len(items) // (self.num_workers * 4))
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        futures = self.submit_batch(_run_chunk, [(func, chunk) for chunk in chunks])
+
+        def results():
+            for future in futures:
+                yield from future.result(timeout)
+        return results()
+
+    def wait_all(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all tasks to complete; False on timeout."""
+        with self._count_lock:
+            return self._drained.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stop accepting tasks; run (or cancel) queued ones, then stop the workers."""
+        with self._cv:
+            self._shutdown = True
+        if cancel_pending:
+            cancelled = 0
+            for d in self.deques:
+                while True:
+                    try:
+                        task = d.popleft()
+                    except IndexError:
+                        break
+                    task._finish(CANCELLED)
+                    cancelled += 1
+            if cancelled:
+                self._task_done(cancelled)
+        with self._cv:
+            self._shutdown = True
+            self._cv.notify_all()
+        if wait:
+            for worker in self.workers:
+                worker.join()
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.num_workers,
+            'completed': sum(self.completed),
+            'stolen': sum(self.stolen),
+            'per_worker_completed': list(self.completed),
+            'per_worker_busy_ms': [ns / 1e6 for ns in self.busy_ns],
+            'queued': sum(len(d) for d in self.deques),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+
+def _run_chunk(func: Callable, items: list) -> list:
+    return [func(item) for item in items]
+
+def task_timing_summary(futures: Iterable[TaskFuture]) -> dict:
+    """Queue-wait and run-time percentiles (µs) over finished futures."""
+    done = [f for f in futures if f.state == FINISHED]
+    if not done:
+        return {}
+    queue_us = sorted(f.queue_ns / 1000 for f in done)
+    run_us = sorted(f.run_ns / 1000 for f in done)
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(len(values) * q))]
+    return {
+        'tasks': len(done),
+        'queue_p50_us': pct(queue_us, 0.5), 'queue_p99_us': pct(queue_us, 0.99),
+        'run_p50_us': pct(run_us, 0.5), 'run_p99_us': pct(run_us, 0.99),
+    }
 
 def physics_calc(player_id: int) -> dict:
     """Simulate physics calculation."""
@@ -46,11 +301,11 @@ def physics_calc(player_id: int) -> dict:
     return {"player": player_id, "collision": False}
 
 if __name__ == "__main__":
-    pool = GameThreadPool(num_workers=8)
-    start = time.time()
-
-    for i in range(100):
-        pool.submit(f"physics_{i}", physics_calc, i)
-
-    pool.wait_all()
-    print(f"Processed 100 physics tasks in {time.time()-start:.3f}s")
+    with GameThreadPool(num_workers=8) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(physics_calc, i) for i in range(100)]
+        pool.wait_all()
+        print(f"Processed 100 physics tasks in {time.perf_counter()-start:.3f}s")
+        print(f"Collisions: {sum(f.result()['collision'] for f in futures)}")
+        print(f"Timing: {task_timing_summary(futures)}")
+        print(f"Pool: {pool.stats()}")
@@ -1,38 +1,32 @@
 #!/usr/bin/env python3
-"""Secure token generation for game authentication."""
+"""Secure token generation for game authentication.
+
+Tokens are issued and checked by TokenService (token_service.py): compact
+binary payloads with an expiry, key ids for rotation and a verified-token
+cache. Use verify_tokens() for batches during login bursts.
+"""
 import hashlib
-import hmac
 import secrets
-import time
-import base64
-import json
+from typing import Iterable, List, Optional
+
+from token_service import KeyRing, TokenService
 
 SECRET_KEY = secrets.token_bytes(32)
+SESSION_TTL = 3600  # Seconds
+
+SERVICE = TokenService(KeyRing(SECRET_KEY), ttl=SESSION_TTL)
+
+def generate_session_token(player_id: str, ttl: Optional[int] = None) -> str:
+    """Generate a secure session token that expires after ttl seconds."""
+    return SERVICE.issue(player_id, ttl)
+
+def verify_token(token: str) -> Optional[dict]:
+    """Verify and decode a session token; None if forged, malformed or expired."""
+    return SERVICE.verify(token)
 
-def generate_session_token(player_id: str) -> str:
-    """Generate a secure session token."""
-    payload = {
-        "player_id": player_id,
-        "created_at": int(time.time()),
-        "nonce": secrets.token_hex(16)
-    }
-    payload_bytes = json.dumps(payload).encode()
-    signature = hmac.new(SECRET_KEY, payload_bytes, hashlib.sha256).digest()
-    token = base64.urlsafe_b64encode(payload_bytes + signature).decode()
-    return token
-
-def verify_token(token: str) -> dict:
-    """Verify and decode a session token."""
-    try:
-        decoded = base64.urlsafe_b64decode(token)
-        payload_bytes = decoded[:-32]
-        signature = decoded[-32:]
-        expected_sig = hmac.new(SECRET_KEY, payload_bytes, hashlib.sha256).digest()
-        if hmac.compare_digest(signature, expected_sig):
-            return json.loads(payload_bytes)
-        return None
-    except Exception:
-        return None
+def verify_tokens(tokens: Iterable[str]) -> List[Optional[dict]]:
+    """verify_token() for a batch of tokens."""
+    return SERVICE.verify_many(tokens)
 
 def generate_match_key(match_id: str) -> str:
     """Generate encryption key for match data."""
@@ -43,3 +37,5 @@ if __name__ == "__main__":
     print(f"Token: {token[:50]}...")
     verified = verify_token(token)
     print(f"Verified: {verified}")
+    expired = generate_session_token("player_456", ttl=-60)
+    print(f"Expired token verified: {verify_token(expired)}")
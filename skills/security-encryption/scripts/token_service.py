@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Session token service: compact binary tokens, expiry, key rotation and a
+verified-token cache, built for login storms.
+
+Token layout (base64url, no padding):
+
+    version u8 | key id u8 | issued_at u32 | expires_at u32 | nonce 8B |
+    player id length u8 | player id (utf-8) | HMAC-SHA256 truncated to 16B
+
+    KeyRing      - signing keys by id; rotate() signs with a new key while
+                   older ones keep verifying until retire()
+    TokenService - issue(), verify(), verify_many(); verified tokens are kept
+                   in a bounded LRU (never past their expiry or cache_ttl), so
+                   the retries and follow-up calls of a login burst skip the
+                   HMAC and the decode
+
+Usage:
+    python token_service.py --logins 50000
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+VERSION = 1
+HEADER = struct.Struct("!BBII8sB")
+MAC_SIZE = 16
+MAX_TOKEN_LENGTH = 512  # Longest token issue() can produce is ~390 chars
+
+class KeyRing:
+    """Signing keys by one-byte id; the active key signs, any present key verifies."""
+
+    def __init__(self, secret: Optional[bytes] = None, key_id: int = 0):
+        self.keys: Dict[int, bytes] = {}
+        self.macs: Dict[int, object] = {}  # Keyed HMAC state per id, copied per token
+        self.active = key_id
+        self.add(key_id, secret or secrets.token_bytes(32))
+
+    def add(self, key_id: int, secret: bytes):
+        if not 0 <= key_id <= 255:
+            raise ValueError(f"key id must fit in a byte: {key_id}")
+        if len(secret) < 16:
+            raise ValueError("secret must be at least 16 bytes")
+        self.keys[key_id] = secret
+        self.macs[key_id] = hmac.new(secret, digestmod=hashlib.sha256)
+
+    def rotate(self, secret: Optional[bytes] = None) -> int:
+        """Start signing with a new key; returns its id. Old keys still verify."""
+        key_id = (self.active + 1) % 256
+        if key_id in self.keys:
+            raise ValueError(f"key id {key_id} still present; retire() it first")
+        self.add(key_id, secret or secrets.token_bytes(32))
+        self.active = key_id
+        return key_id
+
+    def retire(self, key_id: int):
+        if key_id == self.active:
+            raise ValueError("cannot retire the active key")
+        self.keys.pop(key_id, None)
+        self.macs.pop(key_id, None)
+
+    def mac(self, key_id: int, data: bytes) -> Optional[bytes]:
+        base = self.macs.get(key_id)
+        if base is None:
+            return None
+        h = base.copy()  # Skips re-deriving the inner/outer pads from the key
+        h.update(data)
+        return h.digest()[:MAC_SIZE]
+
+class TokenService:
+    """Issue and verify session tokens; verified tokens are cached until they expire.
+
+    verify() returns the claims dict or None; stats counts why tokens failed.
+    """
+
+    def __init__(self, keys: Optional[KeyRing] = None, ttl: int = 3600, cache_size: int = 100000,
+                 cache_ttl: float = 300.0, leeway: int = 5, clock: Callable[[], float] = time.time):
+        self.keys = keys or KeyRing()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.leeway = leeway
+        self.clock = clock
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (claims, valid_until, key id)
+        self.stats = {'verified': 0, 'cache_hits': 0, 'expired': 0, 'bad_signature': 0,
+                      'unknown_key': 0, 'malformed': 0}
+
+    def issue(self, player_id: str, ttl: Optional[int] = None) -> str:
+        name = player_id.encode()
+        if len(name) > 255:
+            raise ValueError("player id longer than 255 bytes")
+        now = int(self.clock())
+        key_id = self.keys.active
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + int(ttl)
+        if not 0 <= expires <= 0xFFFFFFFF:
+            raise ValueError(f"ttl {ttl} puts the expiry outside the token's 32-bit timestamp")
+        body = HEADER.pack(VERSION, key_id, now, expires, secrets.token_bytes(8), len(name)) + name
+        return base64.urlsafe_b64encode(body + self.keys.mac(key_id, body)).rstrip(b'=').decode()
+
+    def _decode(self, token: str, now: float) -> Optional[dict]:
+        """Full check of one token; counts the failure reason in stats."""
+        return self._decode_many((token,), now)[0]
+
+    def _decode_many(self, tokens: Iterable[str], now: float) -> List[Optional[dict]]:
+        """Full check of each token, with lookups hoisted out of the loop; counts failure reasons in stats."""
+        unpack, header_size = HEADER.unpack_from, HEADER.size
+        b64decode, compare, macs = base64.urlsafe_b64decode, hmac.compare_digest, self.keys.macs
+        deadline = now - self.leeway
+        stats = self.stats
+        verified = 0
+        out: List[Optional[dict]] = []
+        append = out.append
+        for token in tokens:
+            if len(token) > MAX_TOKEN_LENGTH:
+                stats['malformed'] += 1
+                append(None)
+                continue
+            try:
+                raw = b64decode(token + '=' * (-len(token) % 4))
+                version, key_id, issued, expires, nonce, length = unpack(raw)
+            except (ValueError, struct.error):
+                stats['malformed'] += 1
+                append(None)
+                continue
+            body_end = header_size + length
+            if version != VERSION or len(raw) != body_end + MAC_SIZE:
+                stats['malformed'] += 1
+                append(None)
+                continue
+            base = macs.get(key_id)
+            if base is None:
+                stats['unknown_key'] += 1
+                append(None)
+                continue
+            h = base.copy()
+            h.update(raw[:body_end])
+            if not compare(h.digest()[:MAC_SIZE], raw[body_end:]):
+                stats['bad_signature'] += 1
+                append(None)
+                continue
+            if expires < deadline:
+                stats['expired'] += 1
+                append(None)
+                continue
+            try:
+                player_id = raw[header_size:body_end].decode()
+            except UnicodeDecodeError:
+                stats['malformed'] += 1
+                append(None)
+                continue
+            verified += 1
+            append({'player_id': player_id, 'created_at': issued, 'expires_at': expires,
+                    'nonce': nonce.hex(), 'key_id': key_id})
+        stats['verified'] += verified
+        return out
+
+    def _cached(self, token: str, now: float) -> Optional[dict]:
+        entry = self._cache.get(token)
+        if entry is None:
+            return None
+        if entry[1] < now:
+            del self._cache[token]
+            return None
+        self._cache.move_to_end(token)
+        self.stats['cache_hits'] += 1
+        return entry[0]
+
+    def _remember(self, token: str, claims: dict, now: float):
+        if not self.cache_size:
+            return
+        cache = self._cache
+        cache[token] = (claims, min(now + self.cache_ttl, claims['expires_at'] + self.leeway), claims['key_id'])
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Claims for a valid, unexpired token signed by a known key; otherwise None.
+
+        The returned dict is shared with the cache; do not modify it.
+        """
+        now = self.clock()
+        claims = self._cached(token, now)
+        if claims is None:
+            claims = self._decode(token, now)
+            if claims is not None:
+                self._remember(token, claims, now)
+        return claims
+
+    def verify_many(self, tokens: Iterable[str]) -> List[Optional[dict]]:
+        """verify() for a batch: one clock read, duplicates checked once, cache
+        probed in one pass and the misses decoded together by _decode_many().
+        """
+        tokens = tokens if isinstance(tokens, list) else list(tokens)
+        now = self.clock()
+        cache = self._cache
+        found: Dict[str, Optional[dict]] = {}
+        misses = []
+        hits = 0
+        for token in tokens:
+            if token in found:
+                continue
+            entry = cache.get(token)
+            if entry is not None:
+                if entry[1] >= now:
+                    cache.move_to_end(token)
+                    found[token] = entry[0]
+                    hits += 1
+                    continue
+                del cache[token]
+            found[token] = None
+            misses.append(token)
+        self.stats['cache_hits'] += hits
+        if misses:
+            remember = self._remember
+            for token, claims in zip(misses, self._decode_many(misses, now)):
+                if claims is not None:
+                    found[token] = claims
+                    remember(token, claims, now)
+        return [found[token] for token in tokens]
+
+    def rotate_key(self, secret: Optional[bytes] = None) -> int:
+        return self.keys.rotate(secret)
+
+    def retire_key(self, key_id: int):
+        """Stop accepting tokens signed by key_id, including cached ones."""
+        self.keys.retire(key_id)
+        for token in [t for t, entry in self._cache.items() if entry[2] == key_id]:
+            del self._cache[token]
+
+    def revoke(self, token: str):
+        """Drop one token from the cache (pair with a deny list for real revocation)."""
+        self._cache.pop(token, None)
+
+# ----- Benchmark -----
+
+def _json_token(secret: bytes, player_id: str) -> str:
+    """The previous JSON + base64 + full HMAC token format, for comparison."""
+    import json
+    payload = json.dumps({"player_id": player_id, "created_at": int(time.time()),
+                          "nonce": secrets.token_hex(16)}).encode()
+    return base64.urlsafe_b64encode(payload + hmac.new(secret, payload, hashlib.sha256).digest()).decode()
+
+def _json_verify(secret: bytes, token: str) -> Optional[dict]:
+    import json
+    decoded = base64.urlsafe_b64decode(token)
+    payload, signature = decoded[:-32], decoded[-32:]
+    if hmac.compare_digest(signature, hmac.new(secret, payload, hashlib.sha256).digest()):
+        return json.loads(payload)
+    return None
+
+def run_benchmark(logins: int = 50000, requests_per_login: int = 4, batch: int = 256, seed: int = 11) -> Dict:
+    """A login burst: each player presents its token requests_per_login times
+    (login, then matchmaking, lobby, join), interleaved across players.
+    """
+    import random
+    rng = random.Random(seed)
+    secret = secrets.token_bytes(32)
+    players = [f"player_{i}" for i in range(logins)]
+    stream = [i for i in range(logins) for _ in range(requests_per_login)]
+    # Each player's first request is its login; later ones trail behind within a short window
+    order = sorted(range(len(stream)), key=lambda n: stream[n] + rng.random() * 2000 * (n % requests_per_login))
+    stream = [stream[n] for n in order]
+    results = {}
+
+    json_tokens = [_json_token(secret, p) for p in players]
+    start = time.perf_counter()
+    for i in stream:
+        _json_verify(secret, json_tokens[i])
+    results['json, no cache'] = len(stream) / (time.perf_counter() - start)
+
+    for label, cache_size, batched in (('binary, no cache', 0, False), ('binary + LRU cache', 100000, False),
+                                       ('binary + LRU, batches', 100000, True)):
+        service = TokenService(KeyRing(secret), cache_size=cache_size)
+        tokens = [service.issue(p) for p in players]
+        requests = [tokens[i] for i in stream]
+        start = time.perf_counter()
+        if batched:
+            for n in range(0, len(requests), batch):
+                service.verify_many(requests[n:n + batch])
+        else:
+            verify = service.verify
+            for token in requests:
+                verify(token)
+        elapsed = time.perf_counter() - start
+        results[label] = len(requests) / elapsed
+        results[label + ' stats'] = dict(service.stats)
+
+    results['token_bytes'] = (len(json_tokens[0]), len(tokens[0]))
+    results['requests'] = len(stream)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Token verification during a login burst")
+    parser.add_argument('--logins', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=4, help="Token checks per login")
+    parser.add_argument('--batch', type=int, default=256)
+    args = parser.parse_args()
+
+    r = run_benchmark(args.logins, args.requests, args.batch)
+    print("\n" + "=" * 70)
+    print(f"LOGIN BURST: {args.logins:,} logins x {args.requests} token checks = {r['requests']:,} verifications")
+    print(f"Token size: JSON {r['token_bytes'][0]} chars, binary {r['token_bytes'][1]} chars")
+    print("=" * 70)
+    baseline = r['json, no cache']
+    for label in ('json, no cache', 'binary, no cache', 'binary + LRU cache', 'binary + LRU, batches'):
+        print(f"  {label:24} {r[label]:>12,.0f} verifications/s  ({r[label] / baseline:4.1f}x)")
+    stats = r['binary + LRU cache stats']
+    print(f"  Cache: {stats['cache_hits']:,} hits, {stats['verified']:,} full verifications")
+    print()
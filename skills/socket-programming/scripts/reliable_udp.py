@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+Reliable UDP Channel Layer
+Sequence numbers, 32-bit ack bitfields, selectable delivery channels,
+RTT estimation and a simple congestion window on top of plain UDP.
+
+Usage:
+    python reliable_udp.py --loss 0.05 --latency-ms 40 --channel ordered
+"""
+
+import argparse
+import heapq
+import os
+import random
+import socket
+import struct
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'io-multiplexing', 'scripts'))
+from timer_wheel import TimerWheel  # noqa: E402
+
+RETRANSMIT_TICK = 0.005  # Timer wheel resolution for RTO timers (seconds)
+
+# Packet header: sequence (2), ack (2), ack_bits (4), message count (1)
+HEADER_FORMAT = "!HHIB"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Message header: channel (1), message id (2), payload length (2)
+MESSAGE_FORMAT = "!BHH"
+MESSAGE_SIZE = struct.calcsize(MESSAGE_FORMAT)
+
+MAX_PACKET_SIZE = 1200  # Stay below typical path MTU
+SEQ_MODULO = 1 << 16
+ACK_WINDOW = 32
+
+UNRELIABLE = 0
+RELIABLE_UNORDERED = 1
+RELIABLE_ORDERED = 2
+
+CHANNEL_NAMES = {
+    'unreliable': UNRELIABLE,
+    'unordered': RELIABLE_UNORDERED,
+    'ordered': RELIABLE_ORDERED,
+}
+
+_header = struct.Struct(HEADER_FORMAT)
+_message = struct.Struct(MESSAGE_FORMAT)
+
+
+def seq_greater_than(a: int, b: int) -> bool:
+    """Compare 16-bit sequence numbers with wraparound."""
+    return ((a > b) and (a - b <= 32768)) or ((a < b) and (b - a > 32768))
+
+
+def seq_distance(newer: int, older: int) -> int:
+    """Distance from older to newer sequence number with wraparound."""
+    return (newer - older) % SEQ_MODULO
+
+
+class RttEstimator:
+    """Smoothed RTT and retransmission timeout (RFC 6298)"""
+
+    ALPHA = 0.125
+    BETA = 0.25
+
+    def __init__(self, initial_rto: float = 0.2, min_rto: float = 0.05, max_rto: float = 2.0):
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+
+    def sample(self, rtt: float):
+        """Feed one RTT measurement (seconds)"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+    def backoff(self):
+        """Double the RTO after a retransmission timeout"""
+        self.rto = min(self.rto * 2, self.max_rto)
+
+
+class CongestionWindow:
+    """AIMD congestion window over bytes of reliable data in flight"""
+
+    def __init__(self, initial_packets: float = 4.0, ssthresh_packets: float = 64.0,
+                 max_packets: float = 256.0, mss: int = MAX_PACKET_SIZE):
+        self.mss = mss
+        self.cwnd = initial_packets * mss
+        self.ssthresh = ssthresh_packets * mss
+        self.minimum = initial_packets * mss
+        self.maximum = max_packets * mss
+        self.recovery_until = 0.0
+
+    def on_ack(self, acked_bytes: int):
+        """Slow start below ssthresh, additive increase above it"""
+        if self.cwnd < self.ssthresh:
+            self.cwnd += acked_bytes
+        else:
+            self.cwnd += self.mss * acked_bytes / self.cwnd
+        self.cwnd = min(self.cwnd, self.maximum)
+
+    def on_loss(self, now: float, rtt: float) -> bool:
+        """Multiplicative decrease, at most once per round trip"""
+        if now < self.recovery_until:
+            return False
+        self.ssthresh = max(self.cwnd / 2, self.minimum)
+        self.cwnd = self.ssthresh
+        self.recovery_until = now + rtt
+        return True
+
+    def can_send(self, bytes_in_flight: int) -> bool:
+        return bytes_in_flight < self.cwnd
+
+    @property
+    def packets(self) -> float:
+        return self.cwnd / self.mss
+
+
+class PendingMessage:
+    """Reliable message awaiting acknowledgement"""
+
+    __slots__ = ('msg_id', 'payload', 'first_sent', 'last_sent', 'transmissions', 'queued', 'timer')
+
+    def __init__(self, msg_id: int, payload: bytes):
+        self.msg_id = msg_id
+        self.payload = payload
+        self.queued = True
+        self.first_sent = 0.0
+        self.last_sent = 0.0
+        self.transmissions = 0
+        self.timer = None
+
+
+class SendChannel:
+    """Outgoing state for one reliable channel"""
+
+    def __init__(self, channel: int):
+        self.channel = channel
+        self.next_msg_id = 0
+        self.queue: Deque[PendingMessage] = deque()  # Waiting for (re)transmission
+        self.unacked: Dict[int, PendingMessage] = {}
+
+    def enqueue(self, payload: bytes) -> int:
+        msg = PendingMessage(self.next_msg_id, payload)
+        self.next_msg_id = (self.next_msg_id + 1) % SEQ_MODULO
+        self.unacked[msg.msg_id] = msg
+        self.queue.append(msg)
+        return msg.msg_id
+
+
+class ReceiveChannel:
+    """Incoming state for one reliable channel (dedupe and ordering)"""
+
+    DEDUPE_WINDOW = 4096
+
+    def __init__(self, ordered: bool):
+        self.ordered = ordered
+        self.expected_id = 0
+        self.buffered: Dict[int, bytes] = {}
+        self.seen: set = set()
+        self.seen_order: Deque[int] = deque()
+
+    def accept(self, msg_id: int, payload: bytes) -> List[bytes]:
+        """Return payloads that are now deliverable to the application"""
+        if self.ordered:
+            if msg_id != self.expected_id and not seq_greater_than(msg_id, self.expected_id):
+                return []  # Already delivered
+            self.buffered[msg_id] = payload
+            delivered = []
+            while self.expected_id in self.buffered:
+                delivered.append(self.buffered.pop(self.expected_id))
+                self.expected_id = (self.expected_id + 1) % SEQ_MODULO
+            return delivered
+
+        if msg_id in self.seen:
+            return []
+        self.seen.add(msg_id)
+        self.seen_order.append(msg_id)
+        if len(self.seen_order) > self.DEDUPE_WINDOW:
+            self.seen.discard(self.seen_order.popleft())
+        return [payload]
+
+
+class ReliableConnection:
+    """
+    Per-peer reliability state.
+
+    Transport-agnostic: feed datagrams in with receive(), pull datagrams
+    to send out with poll(). Retransmission and packet-loss timers run on a
+    TimerWheel, which may be shared by every connection of an endpoint.
+    """
+
+    def __init__(self, initial_rto: float = 0.2, timers: Optional[TimerWheel] = None):
+        self.local_seq = 0
+        self.remote_seq = 0
+        self.ack_bits = 0
+        self.has_received = False
+        self.ack_pending = False
+
+        self.rtt = RttEstimator(initial_rto=initial_rto)
+        self.congestion = CongestionWindow()
+        self.timers = timers if timers is not None else TimerWheel(tick=RETRANSMIT_TICK)
+
+        self.send_channels = {
+            RELIABLE_UNORDERED: SendChannel(RELIABLE_UNORDERED),
+            RELIABLE_ORDERED: SendChannel(RELIABLE_ORDERED),
+        }
+        self.recv_channels = {
+            RELIABLE_UNORDERED: ReceiveChannel(ordered=False),
+            RELIABLE_ORDERED: ReceiveChannel(ordered=True),
+        }
+        self.unreliable_queue: Deque[bytes] = deque()
+
+        # seq -> (send_time, size, [(channel, msg_id), ...], loss_timer) for packets with reliable data
+        self.in_flight: Dict[int, tuple] = {}
+        self.bytes_in_flight = 0
+
+        self.stats = {
+            'packets_sent': 0,
+            'packets_received': 0,
+            'retransmits': 0,
+            'loss_events': 0,
+        }
+
+    # ----- Sending -----
+
+    def send(self, payload: bytes, channel: int = UNRELIABLE):
+        """Queue a message on the given channel"""
+        if len(payload) + HEADER_SIZE + MESSAGE_SIZE > MAX_PACKET_SIZE:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds packet budget")
+        if channel == UNRELIABLE:
+            self.unreliable_queue.append(payload)
+        else:
+            self.send_channels[channel].enqueue(payload)
+
+    def _on_retransmit_timeout(self, chan: SendChannel, msg: PendingMessage):
+        """RTO expired for a reliable message: queue it again"""
+        if msg.msg_id not in chan.unacked or msg.queued:
+            return
+        msg.queued = True
+        chan.queue.appendleft(msg)
+        self.stats['retransmits'] += 1
+        now = self.timers.now()
+        if self.congestion.on_loss(now, self.rtt.srtt or self.rtt.rto):
+            self.rtt.backoff()
+            self.stats['loss_events'] += 1
+
+    def _on_packet_lost(self, seq: int):
+        """Packets older than the RTO are presumed lost; stop counting them in flight"""
+        entry = self.in_flight.pop(seq, None)
+        if entry is not None:
+            self.bytes_in_flight -= entry[1]
+
+    def poll(self, now: Optional[float] = None) -> List[bytes]:
+        """Build datagrams to transmit right now"""
+        if now is None:
+            now = time.monotonic()
+        self.timers.advance(now)
+
+        packets = []
+        while True:
+            body = bytearray()
+            count = 0
+            reliable_refs: List[Tuple[int, int]] = []
+            budget = MAX_PACKET_SIZE - HEADER_SIZE
+
+            while self.unreliable_queue and count < 255:
+                payload = self.unreliable_queue[0]
+                if MESSAGE_SIZE + len(payload) > budget - len(body):
+                    break
+                self.unreliable_queue.popleft()
+                body += _message.pack(UNRELIABLE, 0, len(payload)) + payload
+                count += 1
+
+            if self.congestion.can_send(self.bytes_in_flight):
+                for chan in self.send_channels.values():
+                    while chan.queue and count < 255:
+                        msg = chan.queue[0]
+                        if msg.msg_id not in chan.unacked:
+                            chan.queue.popleft()  # Acked while waiting for retransmit
+                            continue
+                        if MESSAGE_SIZE + len(msg.payload) > budget - len(body):
+                            break
+                        chan.queue.popleft()
+                        msg.queued = False
+                        body += _message.pack(chan.channel, msg.msg_id, len(msg.payload)) + msg.payload
+                        if not msg.transmissions:
+                            msg.first_sent = now
+                        msg.last_sent = now
+                        msg.transmissions += 1
+                        if msg.timer is None:
+                            msg.timer = self.timers.schedule(self.rtt.rto, self._on_retransmit_timeout, chan, msg)
+                        else:
+                            self.timers.reschedule(msg.timer, self.rtt.rto)
+                        reliable_refs.append((chan.channel, msg.msg_id))
+                        count += 1
+
+            if not count and not self.ack_pending:
+                break
+
+            seq = self.local_seq
+            self.local_seq = (self.local_seq + 1) % SEQ_MODULO
+            packet = _header.pack(seq, self.remote_seq, self.ack_bits, count) + body
+            if reliable_refs:
+                loss_timer = self.timers.schedule(self.rtt.rto, self._on_packet_lost, seq)
+                self.in_flight[seq] = (now, len(packet), reliable_refs, loss_timer)
+                self.bytes_in_flight += len(packet)
+            packets.append(packet)
+            self.ack_pending = False
+            self.stats['packets_sent'] += 1
+
+            if not count:
+                break
+        return packets
+
+    # ----- Receiving -----
+
+    def _record_remote_seq(self, seq: int) -> bool:
+        """Update ack state; returns False for duplicate packets"""
+        if not self.has_received:
+            self.has_received = True
+            self.remote_seq = seq
+            self.ack_bits = 0
+            return True
+        if seq_greater_than(seq, self.remote_seq):
+            shift = seq_distance(seq, self.remote_seq)
+            if shift > ACK_WINDOW:
+                self.ack_bits = 0
+            else:
+                self.ack_bits = ((self.ack_bits << shift) | (1 << (shift - 1))) & 0xFFFFFFFF
+            self.remote_seq = seq
+            return True
+        diff = seq_distance(self.remote_seq, seq)
+        if diff == 0 or diff > ACK_WINDOW:
+            return False
+        bit = 1 << (diff - 1)
+        if self.ack_bits & bit:
+            return False
+        self.ack_bits |= bit
+        return True
+
+    def _process_ack(self, ack: int, ack_bits: int, now: float):
+        acked = [ack] + [(ack - i - 1) % SEQ_MODULO for i in range(ACK_WINDOW) if ack_bits & (1 << i)]
+        for seq in acked:
+            entry = self.in_flight.pop(seq, None)
+            if entry is None:
+                continue
+            sent_at, size, refs, loss_timer = entry
+            self.timers.cancel(loss_timer)
+            self.bytes_in_flight -= size
+            self.rtt.sample(now - sent_at)
+            self.congestion.on_ack(size)
+            for channel, msg_id in refs:
+                msg = self.send_channels[channel].unacked.pop(msg_id, None)
+                if msg is not None:
+                    self.timers.cancel(msg.timer)
+
+    def receive(self, data: bytes, now: Optional[float] = None) -> List[Tuple[int, bytes]]:
+        """Process a datagram, returning (channel, payload) messages to deliver"""
+        if len(data) < HEADER_SIZE:
+            return []
+        if now is None:
+            now = time.monotonic()
+        seq, ack, ack_bits, count = _header.unpack_from(data)
+        self.stats['packets_received'] += 1
+        self._process_ack(ack, ack_bits, now)
+        if not self._record_remote_seq(seq):
+            return []
+        if count:
+            self.ack_pending = True
+
+        delivered = []
+        offset = HEADER_SIZE
+        view = memoryview(data)
+        for _ in range(count):
+            if offset + MESSAGE_SIZE > len(data):
+                break
+            channel, msg_id, length = _message.unpack_from(data, offset)
+            offset += MESSAGE_SIZE
+            payload = bytes(view[offset:offset + length])
+            offset += length
+            if channel == UNRELIABLE:
+                delivered.append((channel, payload))
+            elif channel in self.recv_channels:
+                for item in self.recv_channels[channel].accept(msg_id, payload):
+                    delivered.append((channel, item))
+        return delivered
+
+    def unacked_count(self) -> int:
+        return sum(len(c.unacked) for c in self.send_channels.values())
+
+
+class ReliableEndpoint:
+    """Non-blocking UDP socket with one ReliableConnection per peer address"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 0, transport=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.transport = transport  # Optional LossyLink for testing
+        self.connections: Dict[Tuple[str, int], ReliableConnection] = {}
+        self.timers = TimerWheel(tick=RETRANSMIT_TICK)  # Shared by all connections
+
+    def connection(self, addr) -> ReliableConnection:
+        conn = self.connections.get(addr)
+        if conn is None:
+            conn = self.connections[addr] = ReliableConnection(timers=self.timers)
+        return conn
+
+    def send(self, addr, payload: bytes, channel: int = UNRELIABLE):
+        self.connection(addr).send(payload, channel)
+
+    def _sendto(self, packet: bytes, addr, now: float):
+        if self.transport is not None:
+            self.transport.sendto(self.sock, packet, addr, now)
+        else:
+            try:
+                self.sock.sendto(packet, addr)
+            except (BlockingIOError, ConnectionRefusedError):
+                pass  # Treated as loss; reliable channels retransmit
+
+    def recv_all(self, now: Optional[float] = None) -> List[Tuple[Tuple[str, int], int, bytes]]:
+        """Drain the socket, returning (addr, channel, payload) tuples"""
+        if now is None:
+            now = time.monotonic()
+        messages = []
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+            for channel, payload in self.connection(addr).receive(data, now):
+                messages.append((addr, channel, payload))
+        return messages
+
+    def flush(self, now: Optional[float] = None):
+        """Transmit queued messages, acks and retransmissions"""
+        if now is None:
+            now = time.monotonic()
+        self.timers.advance(now)
+        for addr, conn in self.connections.items():
+            for packet in conn.poll(now):
+                self._sendto(packet, addr, now)
+        if self.transport is not None:
+            self.transport.flush(now)
+
+    def close(self):
+        self.sock.close()
+
+
+class LossyLink:
+    """Loss and latency injection applied on the sending side"""
+
+    def __init__(self, loss: float = 0.0, latency: float = 0.0, jitter: float = 0.0, seed: int = 1):
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.pending: List[Tuple[float, int, socket.socket, bytes, tuple]] = []
+        self.counter = 0
+        self.dropped = 0
+
+    def sendto(self, sock: socket.socket, packet: bytes, addr, now: float):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        deliver_at = now + self.latency + self.rng.uniform(0, self.jitter)
+        self.counter += 1
+        heapq.heappush(self.pending, (deliver_at, self.counter, sock, packet, addr))
+
+    def flush(self, now: float):
+        while self.pending and self.pending[0][0] <= now:
+            _, _, sock, packet, addr = heapq.heappop(self.pending)
+            try:
+                sock.sendto(packet, addr)
+            except (BlockingIOError, ConnectionRefusedError):
+                self.dropped += 1
+
+
+def run_loopback_harness(messages: int = 5000, payload_size: int = 64, channel: int = RELIABLE_ORDERED,
+                         loss: float = 0.05, latency: float = 0.02, jitter: float = 0.005,
+                         send_rate: float = 2000.0, timeout: float = 30.0) -> Dict:
+    """Send messages across a lossy loopback link and measure delivery"""
+    link = LossyLink(loss=loss, latency=latency / 2, jitter=jitter)
+    sender = ReliableEndpoint('127.0.0.1', 0, transport=link)
+    receiver = ReliableEndpoint('127.0.0.1', 0, transport=link)
+    peer = receiver.address
+
+    ts = struct.Struct("!Id")
+    padding = b'\x00' * max(0, payload_size - ts.size)
+    latencies: List[float] = []
+    received_ids = set()
+    sent = 0
+    interval = 1.0 / send_rate
+
+    start = time.monotonic()
+    next_send = start
+    deadline = start + timeout
+    while time.monotonic() < deadline:
+        now = time.monotonic()
+        while sent < messages and next_send <= now:
+            sender.send(peer, ts.pack(sent, now) + padding, channel)
+            sent += 1
+            next_send += interval
+
+        sender.flush(now)
+        for _, _, payload in receiver.recv_all(now):
+            msg_id, sent_at = ts.unpack_from(payload)
+            if msg_id not in received_ids:
+                received_ids.add(msg_id)
+                latencies.append(now - sent_at)
+        receiver.flush(now)
+        sender.recv_all(now)
+
+        if sent == messages and (len(received_ids) == messages or channel == UNRELIABLE and not link.pending):
+            if channel == UNRELIABLE or not sender.connection(peer).unacked_count():
+                break
+        time.sleep(0.0005)
+    elapsed = time.monotonic() - start
+
+    conn = sender.connection(peer)
+    latencies.sort()
+    n = len(latencies)
+    results = {
+        'sent': sent,
+        'delivered': n,
+        'elapsed_s': elapsed,
+        'goodput_kbps': n * payload_size * 8 / elapsed / 1000 if elapsed else 0.0,
+        'p50_ms': latencies[n // 2] * 1000 if n else 0.0,
+        'p99_ms': latencies[min(n - 1, int(n * 0.99))] * 1000 if n else 0.0,
+        'max_ms': latencies[-1] * 1000 if n else 0.0,
+        'retransmits': conn.stats['retransmits'],
+        'loss_events': conn.stats['loss_events'],
+        'dropped_packets': link.dropped,
+        'cwnd': conn.congestion.packets,
+        'srtt_ms': (conn.rtt.srtt or 0.0) * 1000,
+    }
+    sender.close()
+    receiver.close()
+    return results
+
+
+def print_results(results: Dict, channel_name: str, loss: float, latency_ms: float):
+    """Print harness results"""
+    print("\n" + "=" * 60)
+    print(f"RELIABLE UDP LOOPBACK ({channel_name}, loss={loss:.0%}, latency={latency_ms:.0f}ms)")
+    print("=" * 60)
+    print(f"Delivered:      {results['delivered']}/{results['sent']} messages")
+    print(f"Elapsed:        {results['elapsed_s']:.2f} s")
+    print(f"Goodput:        {results['goodput_kbps']:.1f} kbit/s")
+    print(f"P50 Latency:    {results['p50_ms']:.2f} ms")
+    print(f"P99 Latency:    {results['p99_ms']:.2f} ms")
+    print(f"Max Latency:    {results['max_ms']:.2f} ms")
+    print(f"Retransmits:    {results['retransmits']} ({results['loss_events']} loss events)")
+    print(f"Dropped:        {results['dropped_packets']} packets")
+    print(f"Final cwnd:     {results['cwnd']:.1f} packets, SRTT {results['srtt_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reliable UDP loopback harness")
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--payload', type=int, default=64, help="Payload size in bytes")
+    parser.add_argument('--channel', choices=sorted(CHANNEL_NAMES), default='ordered')
+    parser.add_argument('--loss', type=float, default=0.05, help="Packet loss probability")
+    parser.add_argument('--latency-ms', type=float, default=40.0, help="Round-trip latency")
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--rate', type=float, default=2000.0, help="Messages per second")
+    args = parser.parse_args()
+
+    results = run_loopback_harness(
+        messages=args.messages,
+        payload_size=args.payload,
+        channel=CHANNEL_NAMES[args.channel],
+        loss=args.loss,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        send_rate=args.rate,
+    )
+    print_results(results, args.channel, args.loss, args.latency_ms)
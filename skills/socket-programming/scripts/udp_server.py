@@ -1,13 +1,32 @@
 #!/usr/bin/env python3
 """UDP game server for low-latency player updates."""
+import os
 import socket
 import struct
+import sys
 import time
 
+from reliable_udp import ReliableEndpoint, UNRELIABLE
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'io-multiplexing', 'scripts'))
+from timer_wheel import TimerWheel  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'security-encryption', 'scripts'))
+from packet_crypto import OVERHEAD, TICKET_SIZE, PacketBuffer, SessionTable, coalesce, is_ticket  # noqa: E402
+
 # Packet format: player_id (4), x (4), y (4), timestamp (8)
 PACKET_FORMAT = "!IffQ"
 PACKET_SIZE = struct.calcsize(PACKET_FORMAT)
 
+# Heartbeat format: magic (4), server time in ms (8)
+HEARTBEAT_FORMAT = "!4sQ"
+HEARTBEAT_MAGIC = b"HBT1"
+
+IDLE_TIMEOUT = 30.0       # Seconds without packets before a player is dropped
+HEARTBEAT_INTERVAL = 5.0  # Seconds between server keepalives per player
+
 def run_udp_server(host='0.0.0.0', port=9999):
     """Run UDP game server."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -15,19 +34,52 @@ def run_udp_server(host='0.0.0.0', port=9999):
     sock.setblocking(False)
 
     players = {}
+    timers = TimerWheel(tick=0.01, wheel_bits=12)  # Level 0 spans 41s
     print(f"UDP Server running on {host}:{port}")
 
+    def expire_player(player_id):
+        # Lazy reset: packets only bump last_update, the timer re-arms itself
+        pdata = players.get(player_id)
+        if pdata is None:
+            return
+        idle = time.monotonic() - pdata['last_update']
+        if idle < IDLE_TIMEOUT:
+            timers.reschedule(pdata['idle_timer'], IDLE_TIMEOUT - idle)
+            return
+        timers.cancel(pdata['heartbeat_timer'])
+        del players[player_id]
+
+    def send_heartbeat(player_id):
+        pdata = players.get(player_id)
+        if pdata is None:
+            return
+        try:
+            sock.sendto(struct.pack(HEARTBEAT_FORMAT, HEARTBEAT_MAGIC, int(time.time() * 1000)),
+                        pdata['addr'])
+        except OSError:
+            pass
+        timers.reschedule(pdata['heartbeat_timer'], HEARTBEAT_INTERVAL)
+
     try:
         while True:
             try:
                 data, addr = sock.recvfrom(PACKET_SIZE)
                 if len(data) == PACKET_SIZE:
                     player_id, x, y, timestamp = struct.unpack(PACKET_FORMAT, data)
-                    players[player_id] = {
-                        'x': x, 'y': y,
-                        'addr': addr,
-                        'last_update': time.time()
-                    }
+                    pdata = players.get(player_id)
+                    if pdata is None:
+                        players[player_id] = {
+                            'x': x, 'y': y,
+                            'addr': addr,
+                            'last_update': time.monotonic(),
+                            'idle_timer': timers.schedule(IDLE_TIMEOUT, expire_player, player_id),
+                            'heartbeat_timer': timers.schedule(HEARTBEAT_INTERVAL, send_heartbeat, player_id),
+                        }
+                    else:
+                        pdata['x'] = x
+                        pdata['y'] = y
+                        pdata['addr'] = addr
+                        pdata['last_update'] = time.monotonic()
                     # Broadcast to other players
                     for pid, pdata in players.items():
                         if pid != player_id:
@@ -38,10 +90,139 @@ def run_udp_server(host='0.0.0.0', port=9999):
             except Exception as e:
                 print(f"Error: {e}")
 
-            # Cleanup inactive players
-            current = time.time()
-            players = {k: v for k, v in players.items()
-                      if current - v['last_update'] < 30}
+            # Fire due idle and heartbeat timers
+            timers.advance()
+
+            time.sleep(0.001)  # 1ms tick
+    except KeyboardInterrupt:
+        print("Server shutdown")
+    finally:
+        sock.close()
+
+def run_reliable_udp_server(host='0.0.0.0', port=9999):
+    """Run UDP game server with reliable channels for events.
+
+    Position updates stay on the unreliable channel; messages arriving on a
+    reliable channel (match events, inventory changes) are relayed on the
+    same channel so they are retransmitted and, if ordered, kept in order.
+    Idle peers are expired from the endpoint's shared timer wheel.
+    """
+    endpoint = ReliableEndpoint(host, port)
+    timers = endpoint.timers
+    last_seen = {}
+    idle_timers = {}
+    print(f"Reliable UDP Server running on {host}:{port}")
+
+    def expire_peer(addr):
+        idle = time.monotonic() - last_seen[addr]
+        if idle < IDLE_TIMEOUT:
+            timers.reschedule(idle_timers[addr], IDLE_TIMEOUT - idle)
+            return
+        del last_seen[addr]
+        del idle_timers[addr]
+        endpoint.connections.pop(addr, None)
+
+    try:
+        while True:
+            now = time.monotonic()
+            for addr, channel, payload in endpoint.recv_all(now):
+                last_seen[addr] = now
+                if addr not in idle_timers:
+                    idle_timers[addr] = timers.schedule(IDLE_TIMEOUT, expire_peer, addr)
+                if channel == UNRELIABLE and len(payload) != PACKET_SIZE:
+                    continue
+                for peer in last_seen:
+                    if peer != addr:
+                        endpoint.send(peer, payload, channel)
+
+            # Advances the shared wheel: retransmits and idle expiry
+            endpoint.flush(now)
+            time.sleep(0.001)  # 1ms tick
+    except KeyboardInterrupt:
+        print("Server shutdown")
+    finally:
+        endpoint.close()
+
+def run_secure_udp_server(secret: bytes, host='0.0.0.0', port=9999, cipher=None, max_payload=1200):
+    """Run UDP game server with per-packet authenticated encryption.
+
+    A client first sends the ticket it got from the login service and gets
+    a welcome back; only then are its sealed packets opened (see
+    packet_crypto.py). Forged, replayed and unknown-session packets are
+    dropped before parsing, and an idle session must log in again. Updates
+    received during a tick are coalesced into as few packets per recipient
+    as fit max_payload and sealed in one seal_many() batch.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    sock.setblocking(False)
+
+    sessions = SessionTable(secret, cipher)
+    buffer = PacketBuffer(max_packets=64, max_payload=max_payload)
+    players = {}  # session id -> {'addr', 'last_update', 'idle_timer'}
+    timers = TimerWheel(tick=0.01, wheel_bits=12)  # Level 0 spans 41s
+    print(f"Secure UDP Server ({sessions.cipher}) running on {host}:{port}")
+
+    def expire_session(session_id):
+        # Lazy reset, as in run_udp_server: packets only bump last_update
+        pdata = players.get(session_id)
+        if pdata is None:
+            return
+        idle = time.monotonic() - pdata['last_update']
+        if idle < IDLE_TIMEOUT:
+            timers.reschedule(pdata['idle_timer'], IDLE_TIMEOUT - idle)
+            return
+        del players[session_id]
+        sessions.drop(session_id)
+
+    def add_player(session_id, addr):
+        players[session_id] = {'addr': addr, 'last_update': time.monotonic(),
+                               'idle_timer': timers.schedule(IDLE_TIMEOUT, expire_session, session_id)}
+
+    try:
+        while True:
+            updates = {}
+            while True:
+                try:
+                    data, addr = sock.recvfrom(max(PACKET_SIZE + OVERHEAD, TICKET_SIZE))
+                except BlockingIOError:
+                    break
+                if is_ticket(data):
+                    redeemed = sessions.redeem(data)
+                    if redeemed is not None:
+                        session_id, welcome = redeemed
+                        if session_id not in players:  # Only sealed packets move a player to a new address
+                            add_player(session_id, addr)
+                        try:
+                            sock.sendto(welcome, addr)
+                        except OSError:
+                            pass
+                    continue
+                opened = sessions.open(data)
+                if opened is None or len(opened[1]) != PACKET_SIZE:
+                    continue
+                session_id, payload = opened
+                pdata = players.get(session_id)
+                if pdata is None:
+                    add_player(session_id, addr)
+                else:
+                    pdata['addr'] = addr
+                    pdata['last_update'] = time.monotonic()
+                updates[session_id] = payload  # Latest update per player this tick
+
+            if updates:
+                for session_id, pdata in players.items():
+                    frames = coalesce([u for sid, u in updates.items() if sid != session_id], max_payload)
+                    for i in range(0, len(frames), buffer.max_packets):
+                        for packet in sessions.channels[session_id].seal_many(frames[i:i + buffer.max_packets],
+                                                                              buffer):
+                            try:
+                                sock.sendto(packet, pdata['addr'])
+                            except OSError:
+                                pass
+
+            # Fire due idle timers
+            timers.advance()
 
             time.sleep(0.001)  # 1ms tick
     except KeyboardInterrupt:
@@ -50,4 +231,10 @@ def run_udp_server(host='0.0.0.0', port=9999):
         sock.close()
 
 if __name__ == "__main__":
-    run_udp_server()
+    if "--reliable" in sys.argv:
+        run_reliable_udp_server()
+    elif "--secure" in sys.argv:
+        # Shared with the login service, which hands each client a ticket (issue_ticket)
+        run_secure_udp_server(bytes.fromhex(os.environ['UDP_SESSION_SECRET']))
+    else:
+        run_udp_server()